@@ -0,0 +1,322 @@
+"""媒体后端 - 探测、直接封装、重新编码和提取画面的可替换实现
+
+默认的 ffmpeg 后端就是引擎中的命令行实现：每个文件启动一个ffmpeg子进程（可合并转换），
+出错时只能得到退出码。pyav 后端通过PyAV在进程内调用libav*，省去进程创建、命令行解析和管道传输，
+出错时抛出带有libav错误信息的异常。
+PyAV是可选依赖。未安装PyAV，或后端不支持某项操作时（硬件编码器、PyAV自带的libav中没有的编码器、
+由多个图块组成的HEIC等），该操作仍由ffmpeg子进程完成。
+"""
+import os
+from fractions import Fraction
+
+from profiles import animation_filters, palette_filters, max_resolution_filters
+
+try:
+    import av
+except ImportError:
+    av = None
+
+# 可选的媒体后端，ffmpeg 为子进程实现
+MEDIA_BACKENDS = ["ffmpeg", "pyav"]
+DEFAULT_MEDIA_BACKEND = "ffmpeg"
+
+# MP4输出的封装选项（与命令行的 -movflags +faststart 相同）
+MP4_OPTIONS = {"movflags": "+faststart"}
+
+# 复制元数据时不保留的键（与ffmpeg命令行默认复制元数据时的处理相同，编码器标签由输出重新写入）
+DROPPED_METADATA = {"creation_time", "encoder", "company_name", "product_name", "product_version"}
+
+
+class UnsupportedOperation(Exception):
+    """后端不支持该操作，调用方改用ffmpeg子进程"""
+
+
+class MediaBackend:
+    """进程内媒体后端接口
+
+    input_path 为文件路径、ffmpeg的subfile地址或可定位的文件对象；输出写入 output_path
+    （由调用方写入临时文件后重命名）；threads 为CPU预算分配的线程数。
+    不支持的操作抛出 UnsupportedOperation，处理失败时抛出说明原因的其他异常。
+    """
+
+    name = None
+
+    def probe(self, input_path):
+        """返回 {'video': 编码名称, 'audio': 编码名称或None}，没有视频流时返回None"""
+        raise UnsupportedOperation
+
+    def remux(self, input_path, output_path, codecs):
+        """复制第一路视频和音频流封装为MP4（不重新编码），codecs 为 probe() 的结果"""
+        raise UnsupportedOperation
+
+    def transcode(self, input_path, output_path, profile, max_resolution, threads):
+        """按MP4编码配置（profiles.MP4_PROFILES 中的一项）重新编码"""
+        raise UnsupportedOperation
+
+    def animate(self, input_path, output_path, output_format, profile, threads):
+        """按动图配置（profiles.ANIMATION_PROFILES 中的一项）转换为GIF或WebP动图"""
+        raise UnsupportedOperation
+
+    def extract_frame(self, input_path, max_size=None):
+        """把第一帧解码为PIL图像，max_size 为 (宽, 高) 时等比缩小到不超过该尺寸"""
+        raise UnsupportedOperation
+
+
+def is_backend_available(name):
+    """后端所需的库是否已安装"""
+    return name == "ffmpeg" or (name == "pyav" and av is not None)
+
+
+def create_media_backend(name):
+    """按名称创建进程内后端；ffmpeg（子进程）或所需的库未安装时返回None"""
+    if name == "pyav" and av is not None:
+        return PyAVBackend()
+    return None
+
+
+def copy_metadata(target, source, dropped=DROPPED_METADATA):
+    """按ffmpeg命令行的默认规则复制容器或流的元数据"""
+    target.metadata.update({key: value for key, value in source.metadata.items() if key not in dropped})
+
+
+def parse_codec_args(args):
+    """把命令行编码参数（如 ["-c:a", "aac", "-crf", "23", "-tag:v", "hvc1"]）转换为 (编码器, 标签, 选项)"""
+    codec, tag, options = None, None, {}
+    for flag, value in zip(args[::2], args[1::2]):
+        key = flag.lstrip("-").split(":")[0]
+        if key == "c":
+            codec = value
+        elif key == "tag":
+            tag = value
+        else:
+            options[key] = value
+    return codec, tag, options
+
+
+class FilterPipeline:
+    """进程内滤镜图：buffer -> 滤镜链 -> buffersink
+
+    palette 为 (palettegen参数, paletteuse参数) 时在滤镜链后生成并映射调色板，
+    与命令行中 split[s0][s1];[s0]palettegen[p];[s1][p]paletteuse 的连接方式相同。
+    """
+
+    def __init__(self, stream, filters, threads, palette=None):
+        self.graph = av.filter.Graph()
+        # 线程数必须在添加滤镜之前设置
+        self.graph.threads = threads
+        last = self.graph.add_buffer(template=stream)
+        for name, args in filters:
+            node = self.graph.add(name, args)
+            last.link_to(node)
+            last = node
+
+        if palette is not None:
+            palettegen, paletteuse = palette
+            split = self.graph.add("split")
+            generate = self.graph.add("palettegen", palettegen)
+            apply = self.graph.add("paletteuse", paletteuse)
+            last.link_to(split)
+            split.link_to(generate, 0, 0)
+            split.link_to(apply, 1, 0)
+            generate.link_to(apply, 0, 1)
+            last = apply
+
+        sink = self.graph.add("buffersink")
+        last.link_to(sink)
+        self.graph.configure()
+
+    def process(self, frame):
+        """送入一帧（None表示输入结束），返回此时能取出的全部输出帧"""
+        self.graph.push(frame)
+        frames = []
+        while True:
+            try:
+                frames.append(self.graph.vpull())
+            except (BlockingIOError, EOFError):
+                # 需要更多输入（调色板要等全部帧统计完），或已全部输出
+                return frames
+
+
+class PyAVBackend(MediaBackend):
+    """通过PyAV在进程内调用libav*"""
+
+    name = "pyav"
+
+    def __init__(self):
+        self.encoder_cache = {}
+        # SVT-AV1在进程内运行时把配置信息直接打印到标准错误，只保留错误信息
+        os.environ.setdefault("SVT_LOG", "1")
+
+    def has_encoder(self, name):
+        """PyAV自带的libav中是否有该编码器（与ffmpeg可执行文件中的编码器可能不同）"""
+        if name not in self.encoder_cache:
+            try:
+                av.Codec(name, "w")
+                self.encoder_cache[name] = True
+            except Exception:
+                self.encoder_cache[name] = False
+        return self.encoder_cache[name]
+
+    def probe(self, input_path):
+        with av.open(input_path) as source:
+            if not source.streams.video:
+                return None
+            audio = source.streams.audio[0].codec_context.name if source.streams.audio else None
+            return {'video': source.streams.video[0].codec_context.name, 'audio': audio}
+
+    def remux(self, input_path, output_path, codecs):
+        with av.open(input_path) as source, \
+                av.open(output_path, "w", format="mp4", container_options=MP4_OPTIONS) as output:
+            streams = [source.streams.video[0], *source.streams.audio[:1]]
+            outputs = {}
+            for stream in streams:
+                outputs[stream.index] = output.add_stream_from_template(stream)
+                # 直接复制的流保留原编码器标签
+                copy_metadata(outputs[stream.index], stream, DROPPED_METADATA - {"encoder"})
+            if codecs['video'] == 'hevc':
+                # 苹果设备只识别hvc1标签的HEVC
+                outputs[streams[0].index].codec_tag = "hvc1"
+            copy_metadata(output, source)
+
+            for packet in source.demux(streams):
+                # 跳过解复用结束时的空包
+                if packet.dts is None:
+                    continue
+                packet.stream = outputs[packet.stream.index]
+                output.mux(packet)
+
+    def transcode(self, input_path, output_path, profile, max_resolution, threads):
+        encoder = next((name for name, _ in profile['encoders'] if self.has_encoder(name)), None)
+        if encoder is None:
+            raise UnsupportedOperation
+        _, tag, options = parse_codec_args(dict(profile['encoders'])[encoder])
+        audio_codec, _, audio_options = parse_codec_args(profile['audio'])
+
+        with av.open(input_path) as source, \
+                av.open(output_path, "w", format="mp4", container_options=MP4_OPTIONS) as output:
+            video, audio = self.open_streams(source, threads, with_audio=True)
+            filters = max_resolution_filters(max_resolution)
+            pipeline = FilterPipeline(video, filters, threads) if filters else None
+            copy_metadata(output, source)
+
+            def add_streams(frame):
+                out_video = self.add_video_stream(output, encoder, frame, video.average_rate, options, threads)
+                if tag:
+                    out_video.codec_tag = tag
+                copy_metadata(out_video, video)
+                out_audio = None
+                if audio is not None:
+                    out_audio = output.add_stream(audio_codec, rate=audio.rate)
+                    out_audio.layout = audio.layout
+                    out_audio.codec_context.options = audio_options
+                    copy_metadata(out_audio, audio)
+                return out_video, out_audio
+
+            self.encode_frames(source, output, video, audio, pipeline, add_streams)
+
+    def animate(self, input_path, output_path, output_format, profile, threads):
+        if output_format == "gif":
+            encoder, container_options, options = "gif", {}, {}
+            palette = palette_filters(profile)
+        elif output_format == "webp":
+            encoder, container_options, palette = "libwebp_anim", {"loop": "0"}, None
+            options = {
+                "lossless": "0",
+                "quality": str(profile['webp_quality']),
+                "compression_level": str(profile['webp_compression']),
+            }
+        else:
+            raise UnsupportedOperation
+        if not self.has_encoder(encoder):
+            raise UnsupportedOperation
+
+        with av.open(input_path) as source, \
+                av.open(output_path, "w", format=output_format, container_options=container_options) as output:
+            video, _ = self.open_streams(source, threads, with_audio=False)
+            pipeline = FilterPipeline(video, animation_filters(profile), threads, palette)
+            copy_metadata(output, source)
+
+            def add_streams(frame):
+                out_video = self.add_video_stream(output, encoder, frame, Fraction(profile['fps']), options, threads)
+                return out_video, None
+
+            self.encode_frames(source, output, video, None, pipeline, add_streams)
+
+    def extract_frame(self, input_path, max_size=None):
+        with av.open(input_path) as source:
+            # HEIC的网格图像由多路图块组成，拼接交给ffmpeg
+            if len(source.streams.video) != 1:
+                raise UnsupportedOperation
+            for frame in source.decode(source.streams.video[0]):
+                img = frame.to_image()
+                if max_size:
+                    img.thumbnail(max_size)
+                return img
+        raise ValueError("没有可解码的画面")
+
+    def open_streams(self, source, threads, with_audio):
+        """返回第一路视频流和（需要时）第一路音频流，视频解码使用分配的线程数"""
+        if not source.streams.video:
+            raise ValueError("没有视频流")
+        video = source.streams.video[0]
+        video.codec_context.thread_count = threads
+        video.thread_type = "AUTO"
+        audio = source.streams.audio[0] if with_audio and source.streams.audio else None
+        return video, audio
+
+    def add_video_stream(self, output, encoder, frame, rate, options, threads):
+        """按第一帧的尺寸、像素格式和时间基添加视频输出流"""
+        stream = output.add_stream(encoder, rate=rate)
+        stream.width = frame.width
+        stream.height = frame.height
+        formats = [pix_fmt.name for pix_fmt in av.Codec(encoder, "w").video_formats or []]
+        stream.pix_fmt = frame.format.name if not formats or frame.format.name in formats else formats[0]
+        stream.codec_context.time_base = frame.time_base
+        stream.codec_context.thread_count = threads
+        stream.codec_context.options = options
+        return stream
+
+    def encode_frames(self, source, output, video, audio, pipeline, add_streams):
+        """解码、（经滤镜图）编码并封装全部帧
+
+        输出流在得到第一帧视频后由 add_streams(frame) 添加（需要滤镜输出的尺寸），
+        此前解码出的音频帧先暂存。
+        """
+        out_video = out_audio = None
+        pending_audio = []
+
+        def write(stream, frame):
+            for packet in stream.encode(frame):
+                output.mux(packet)
+
+        def write_video(frames):
+            nonlocal out_video, out_audio
+            for frame in frames:
+                if out_video is None:
+                    out_video, out_audio = add_streams(frame)
+                    for audio_frame in pending_audio:
+                        write(out_audio, audio_frame)
+                    pending_audio.clear()
+                # 不沿用源视频的帧类型，由编码器决定关键帧（与命令行相同）
+                frame.pict_type = av.video.frame.PictureType.NONE
+                write(out_video, frame)
+
+        streams = [video] if audio is None else [video, audio]
+        for packet in source.demux(streams):
+            for frame in packet.decode():
+                if packet.stream.type == "audio":
+                    if out_audio is None:
+                        pending_audio.append(frame)
+                    else:
+                        write(out_audio, frame)
+                else:
+                    write_video(pipeline.process(frame) if pipeline else [frame])
+
+        if pipeline is not None:
+            write_video(pipeline.process(None))
+        if out_video is None:
+            raise ValueError("没有可解码的视频帧")
+
+        write(out_video, None)
+        if out_audio is not None:
+            write(out_audio, None)
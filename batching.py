@@ -0,0 +1,106 @@
+"""合并转换 - 让一个ffmpeg进程同时转换多段独立的短视频（多个输入、多个输出）
+
+Live Photo的视频只有约3秒，每段视频单独启动ffmpeg时，进程启动和编解码器初始化占了耗时的很大一部分。
+处理线程提交转换请求后等待结果；第一个等待的线程负责收集请求，凑满 batch_size 个或等待
+BATCH_WAIT 秒后把这一批交给 run_batch 执行，其他线程在此期间继续排队，组成下一批。
+每段视频在命令中有独立的输入、流映射和输出参数，输出与单独转换时完全相同；
+合并转换失败时由 run_batch 逐个重新转换，只有真正出错的视频记为失败。
+"""
+import time
+import threading
+
+# 默认每批的视频数（1表示不合并）
+DEFAULT_BATCH_SIZE = 1
+
+# 收集一批请求的最长等待时间（秒）
+BATCH_WAIT = 0.1
+
+
+class ClipRequest:
+    """一段视频的转换请求
+
+    streams 为输出中要映射的输入流（如 ["v:0", "a:0?"]），None 表示由ffmpeg自动选择（不能合并转换）。
+    转换完成后 success 为是否成功，各耗时字段供调用方计入阶段耗时。
+    """
+
+    def __init__(self, input_path, output_args, output_file, streams=None):
+        self.input_path = input_path
+        self.output_args = output_args
+        self.output_file = output_file
+        self.streams = streams
+        self.success = None
+        self.queued = time.perf_counter()
+        # 等待凑成一批、等待CPU预算、ffmpeg运行的耗时（秒）
+        self.batch_wait = 0.0
+        self.cpu_wait = 0.0
+        self.ffmpeg_seconds = 0.0
+
+
+class ClipBatcher:
+    """收集各处理线程的转换请求，按批交给 run_batch(requests) 执行
+
+    run_batch 需为每个请求设置 success。
+    """
+
+    def __init__(self, run_batch, batch_size, wait=BATCH_WAIT):
+        self.run_batch = run_batch
+        self.batch_size = max(1, batch_size)
+        self.wait = wait
+        self.cond = threading.Condition()
+        self.queue = []
+        # 是否有线程正在收集一批请求
+        self.collecting = False
+
+    def run(self, request):
+        """提交请求并等待完成，返回是否成功"""
+        with self.cond:
+            self.queue.append(request)
+            self.cond.notify_all()
+
+        while True:
+            with self.cond:
+                # 其他线程正在收集时等待，请求被收入其他批次时等待该批完成
+                while request.success is None and (self.collecting or request not in self.queue):
+                    self.cond.wait()
+                if request.success is not None:
+                    return request.success
+
+                # 由当前线程收集下一批（不一定包含自己的请求，执行完后再继续等待）
+                self.collecting = True
+                deadline = time.monotonic() + self.wait
+                while len(self.queue) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+                batch = self.take_batch()
+                self.collecting = False
+                self.cond.notify_all()
+
+            self.execute(batch)
+
+    def take_batch(self):
+        """从队列中取出一批请求（输出到同一文件的请求不放在同一批）"""
+        batch, outputs, rest = [], set(), []
+        for request in self.queue:
+            if len(batch) < self.batch_size and request.output_file not in outputs:
+                batch.append(request)
+                outputs.add(request.output_file)
+            else:
+                rest.append(request)
+        self.queue = rest
+
+        taken = time.perf_counter()
+        for request in batch:
+            request.batch_wait += taken - request.queued
+        return batch
+
+    def execute(self, batch):
+        try:
+            self.run_batch(batch)
+        finally:
+            with self.cond:
+                for request in batch:
+                    if request.success is None:
+                        request.success = False
+                self.cond.notify_all()
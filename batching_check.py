@@ -0,0 +1,122 @@
+"""合并转换检查 - 逐个转换与合并转换的输出应逐字节相同
+
+用lavfi测试源生成几组带音频的Live Photo，按相同的处理线程数和CPU预算分别以批大小1和N
+转换为MP4、GIF和WebP，逐个比较输出文件。需要系统中的ffmpeg。
+
+用法示例:
+    python batching_check.py
+    python batching_check.py --batch-size 4 -w 4 --cpu-budget 8 --formats mp4
+"""
+import os
+import sys
+import shutil
+import filecmp
+import argparse
+import tempfile
+
+from engine import LivePhotoEngine, ANIMATION_FORMATS
+from media import run_command
+
+# 各组Live Photo使用的lavfi测试源（内容不同，避免只比较相同的文件）
+LAVFI_SOURCES = ["testsrc2", "mandelbrot", "smptehdbars", "rgbtestsrc", "testsrc", "life"]
+
+CHECK_FORMATS = ["mp4", *ANIMATION_FORMATS]
+
+
+def make_clips(input_dir, ffmpeg_path, count):
+    """生成 count 组Live Photo（JPG + 带音频的MOV）"""
+    os.makedirs(input_dir)
+    for i in range(count):
+        source = LAVFI_SOURCES[i % len(LAVFI_SOURCES)]
+        image = os.path.join(input_dir, f"IMG_{i + 1:04d}.JPG")
+        video = os.path.join(input_dir, f"IMG_{i + 1:04d}.MOV")
+        for args in (
+            ["-f", "lavfi", "-i", f"{source}=size=320x240:rate=1", "-frames:v", "1", image],
+            ["-f", "lavfi", "-i", f"{source}=size=320x240:rate=30",
+             "-f", "lavfi", "-i", f"sine=frequency={220 * (i + 1)}:sample_rate=44100",
+             "-t", "1", "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p",
+             "-c:a", "aac", "-shortest", video],
+        ):
+            result = run_command([ffmpeg_path, "-v", "error", "-y", *args])
+            if result.returncode != 0:
+                raise RuntimeError(f"ffmpeg生成测试文件失败: {result.stderr.strip()}")
+
+
+def convert(ffmpeg_path, input_dir, output_dir, output_format, batch_size, args):
+    """转换全部Live Photo，返回引擎的汇总"""
+    engine = LivePhotoEngine(
+        ffmpeg_path, None, output_format=output_format, thread_count=args.workers,
+        incremental=False, cpu_cores=args.cpu_budget, batch_size=batch_size,
+        log_callback=lambda message: None
+    )
+    return engine.run(input_dir, output_dir)
+
+
+def compare_outputs(single_dir, batch_dir, extension):
+    """返回 (比较的文件数, 不同或缺少的文件名列表)"""
+    names = sorted(name for name in os.listdir(single_dir) if name.endswith(extension))
+    different = [name for name in names
+                 if not os.path.exists(os.path.join(batch_dir, name))
+                 or not filecmp.cmp(os.path.join(single_dir, name), os.path.join(batch_dir, name), shallow=False)]
+    return len(names), different
+
+
+def build_parser():
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(description="检查合并转换的输出与逐个转换逐字节相同")
+    parser.add_argument("--clips", type=int, default=6, help="Live Photo数量")
+    parser.add_argument("--batch-size", type=int, default=3, help="合并转换的批大小")
+    parser.add_argument("-w", "--workers", type=int, default=3, help="处理线程数")
+    parser.add_argument("--cpu-budget", type=int, default=8, help="ffmpeg可使用的CPU核心总数")
+    parser.add_argument("--formats", default=",".join(CHECK_FORMATS),
+                        help=f"要检查的输出格式，逗号分隔（默认: {','.join(CHECK_FORMATS)}）")
+    parser.add_argument("--ffmpeg", default=None, help="FFmpeg可执行文件路径（默认在PATH中查找）")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    ffmpeg_path = shutil.which(args.ffmpeg or "ffmpeg")
+    if ffmpeg_path is None:
+        print("错误: 未找到FFmpeg", file=sys.stderr)
+        return 2
+
+    formats = [fmt.strip() for fmt in args.formats.split(",") if fmt.strip()]
+    for fmt in formats:
+        if fmt not in CHECK_FORMATS:
+            print(f"错误: 不支持检查的格式: {fmt}", file=sys.stderr)
+            return 2
+
+    work_dir = tempfile.mkdtemp(prefix="livephoto_batching_")
+    try:
+        input_dir = os.path.join(work_dir, "input")
+        make_clips(input_dir, ffmpeg_path, args.clips)
+
+        failed = False
+        for fmt in formats:
+            single_dir = os.path.join(work_dir, f"{fmt}_single")
+            batch_dir = os.path.join(work_dir, f"{fmt}_batch")
+            summaries = [convert(ffmpeg_path, input_dir, single_dir, fmt, 1, args),
+                         convert(ffmpeg_path, input_dir, batch_dir, fmt, args.batch_size, args)]
+            compared, different = compare_outputs(single_dir, batch_dir, f".{fmt}")
+
+            problems = [f"{name} 不同" for name in different]
+            for label, summary in zip(("逐个转换", "合并转换"), summaries):
+                if summary['errors'] or summary['processed'] != args.clips:
+                    problems.append(f"{label}成功 {summary['processed']}/{args.clips} 个，{summary['errors']} 个错误")
+            if compared != args.clips:
+                problems.append(f"逐个转换只生成了 {compared}/{args.clips} 个输出")
+
+            print(f"{fmt:<6} 批大小 1 与 {args.batch_size}：比较 {compared} 个文件，"
+                  f"{len(different)} 个不同：{'通过' if not problems else '失败'}")
+            for problem in problems:
+                print(f"  - {problem}")
+            failed = failed or bool(problems)
+        return 1 if failed else 0
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
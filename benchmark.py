@@ -0,0 +1,460 @@
+"""性能基准 - 生成可复现的合成Live Photo语料并测量端到端吞吐量
+
+语料完全离线生成：图片和视频由ffmpeg的lavfi测试源渲染为少量模板，再按固定规则复制成
+Live Photo（图片+MOV）、IMG_E编辑版本、.livp文件、普通图片和其他文件，分布在不同形状的目录树中。
+基准依次测量扫描、分类以及每种输出格式经 process_task/process_file_task 的处理耗时，
+报告每秒文件数和每秒MB数；GIF/WebP按每个动图配置、MP4按每个编码配置分别测量，便于比较编码耗时和输出大小。
+指定多个合并转换批大小或媒体后端时，视频格式按每个组合分别测量，比较合并转换和进程内处理（PyAV）
+节省的每段视频开销；"毫秒/段" 为每段视频在ffmpeg/libav中的平均耗时（不含排队等待）。
+
+用法示例:
+    python benchmark.py --live-photos 40 --shape nested --formats original,mp4,gif,jpg
+    python benchmark.py --corpus /tmp/lp_corpus --json results.json
+    python benchmark.py --formats gif,mp4 --animation-profiles fast --batch-sizes 1,4
+    python benchmark.py --formats mp4 --remux --media-backends ffmpeg,pyav
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import zipfile
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from engine import LivePhotoEngine, OUTPUT_FORMATS, ANIMATION_FORMATS, detect_ffmpeg
+from profiles import ANIMATION_PROFILES, MP4_PROFILES, DEFAULT_MP4_PROFILE
+from backends import MEDIA_BACKENDS, DEFAULT_MEDIA_BACKEND, is_backend_available
+from livp import add_file_to_zip
+from media import run_command
+from scanner import scan_tree, DEFAULT_SCAN_WORKERS
+
+try:
+    import pillow_heif
+    pillow_heif.register_heif_opener()
+except ImportError:
+    pillow_heif = None
+
+CORPUS_SHAPES = ["flat", "nested", "wide"]
+CORPUS_MANIFEST = "corpus.json"
+
+# 模板使用的lavfi测试源，按变体编号轮换
+LAVFI_SOURCES = ["testsrc2", "mandelbrot", "smptehdbars", "rgbtestsrc", "testsrc"]
+
+# 语料文件统一的修改时间，保证多次生成的结果完全相同
+CORPUS_MTIME = 1700000000
+
+
+def get_app_path():
+    """获取应用程序路径"""
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_size(text):
+    """解析 "宽x高" 格式的尺寸"""
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def folder_for(index, shape):
+    """第index个条目所在的相对目录"""
+    if shape == "flat":
+        return ""
+    if shape == "nested":
+        return os.path.join(str(2020 + index % 3), f"{index % 12 + 1:02d}")
+    # wide: 类似相机DCIM目录，每个目录只有少量条目
+    return os.path.join("DCIM", f"{100 + index // 5}APPLE")
+
+
+class CorpusBuilder:
+    """合成语料生成器"""
+
+    def __init__(self, corpus_dir, options, ffmpeg_path="ffmpeg", log=print):
+        self.corpus_dir = corpus_dir
+        self.options = options
+        self.ffmpeg_path = ffmpeg_path
+        self.log = log
+        self.template_dir = os.path.join(corpus_dir, ".templates")
+        self.rng = random.Random(options['seed'])
+
+    def is_current(self):
+        """已存在参数相同的语料时无需重新生成"""
+        try:
+            with open(os.path.join(self.corpus_dir, CORPUS_MANIFEST), encoding="utf-8") as f:
+                return json.load(f) == self.options
+        except (OSError, ValueError):
+            return False
+
+    def build(self):
+        """生成语料，返回语料目录"""
+        if self.is_current():
+            self.log(f"复用已有语料: {self.corpus_dir}")
+            return self.corpus_dir
+
+        if os.path.exists(self.corpus_dir):
+            shutil.rmtree(self.corpus_dir)
+        os.makedirs(self.template_dir)
+
+        if self.options['heic'] and pillow_heif is None:
+            raise RuntimeError("生成HEIC语料需要安装 pillow-heif")
+
+        self.log("正在渲染模板...")
+        templates = [self.render_templates(variant) for variant in range(self.options['variants'])]
+
+        self.log("正在生成语料...")
+        options = self.options
+        image_ext = ".HEIC" if options['heic'] else ".JPG"
+        edited_every = round(1 / options['edited']) if options['edited'] else 0
+
+        for i in range(options['live_photos']):
+            image, video, _ = templates[i % len(templates)]
+            folder = folder_for(i, options['shape'])
+            number = f"{i + 1:04d}"
+            self.copy(image, folder, f"IMG_{number}{image_ext}")
+            self.copy(video, folder, f"IMG_{number}.MOV")
+
+            # IMG_E编辑版本：编辑后的图片与原始的MOV配对，并附带.AAE编辑记录
+            if edited_every and i % edited_every == 0:
+                self.copy(image, folder, f"IMG_E{number}{image_ext}")
+                self.write_bytes(folder, f"IMG_{number}.AAE", self.aae_sidecar(number))
+
+        for i in range(options['livp']):
+            image, video, _ = templates[i % len(templates)]
+            folder = folder_for(options['live_photos'] + i, options['shape'])
+            number = f"{5000 + i:04d}"
+            target = self.target(folder, f"IMG_{number}.livp")
+            with zipfile.ZipFile(target, 'w', compression=zipfile.ZIP_STORED) as zipf:
+                add_file_to_zip(zipf, image, f"IMG_{number}{image_ext}")
+                add_file_to_zip(zipf, video, f"IMG_{number}.MOV")
+            os.utime(target, (CORPUS_MTIME, CORPUS_MTIME))
+
+        for i in range(options['images']):
+            image, _, screenshot = templates[i % len(templates)]
+            folder = folder_for(i, options['shape'])
+            if i % 2:
+                self.copy(screenshot, folder, f"Screenshot_{i + 1:04d}.PNG")
+            else:
+                self.copy(image, folder, f"DSC_{i + 1:04d}.JPG" if not options['heic'] else f"DSC_{i + 1:04d}.HEIC")
+
+        for i in range(options['others']):
+            folder = folder_for(i, options['shape'])
+            if i % 2:
+                self.write_bytes(folder, f"notes_{i + 1:04d}.txt", f"note {i}\n".encode() * 64)
+            else:
+                self.write_bytes(folder, f"data_{i + 1:04d}.bin", self.rng.randbytes(256 * 1024))
+
+        shutil.rmtree(self.template_dir)
+        with open(os.path.join(self.corpus_dir, CORPUS_MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(self.options, f, indent=2)
+        return self.corpus_dir
+
+    def render_templates(self, variant):
+        """渲染一组模板：照片、3秒左右的MOV、截图PNG"""
+        options = self.options
+        source = LAVFI_SOURCES[variant % len(LAVFI_SOURCES)]
+        hue = f"hue=h={variant * 37 % 360}"
+        image_width, image_height = options['image_size']
+        video_width, video_height = options['video_size']
+
+        image = os.path.join(self.template_dir, f"image_{variant}.jpg")
+        self.ffmpeg([
+            "-f", "lavfi", "-i", f"{source}=size={image_width}x{image_height}:rate=1",
+            "-vf", hue, "-frames:v", "1", "-q:v", "3", image
+        ])
+        if options['heic']:
+            heic = os.path.join(self.template_dir, f"image_{variant}.heic")
+            with Image.open(image) as img:
+                img.save(heic, quality=80)
+            image = heic
+
+        video = os.path.join(self.template_dir, f"video_{variant}.mov")
+        self.ffmpeg([
+            "-f", "lavfi", "-i", f"{source}=size={video_width}x{video_height}:rate=30",
+            "-f", "lavfi", "-i", f"sine=frequency={220 * (variant + 1)}:sample_rate=44100",
+            "-t", str(options['duration']), "-vf", hue,
+            "-c:v", options['video_codec'], "-preset", "veryfast", "-pix_fmt", "yuv420p",
+            *(["-tag:v", "hvc1"] if options['video_codec'] == "libx265" else []),
+            "-c:a", "aac", "-b:a", "96k", "-shortest", video
+        ])
+
+        screenshot = os.path.join(self.template_dir, f"screenshot_{variant}.png")
+        with Image.open(os.path.join(self.template_dir, f"image_{variant}.jpg")) as img:
+            img.resize((video_height * 9 // 16, video_height)).save(screenshot)
+
+        # 固定模板的修改时间，.livp中成员的时间戳也随之固定
+        for path in (image, video, screenshot):
+            os.utime(path, (CORPUS_MTIME, CORPUS_MTIME))
+        return image, video, screenshot
+
+    def ffmpeg(self, args):
+        result = run_command([self.ffmpeg_path, "-v", "error", "-y", *args])
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg生成模板失败: {result.stderr.strip()}")
+
+    def target(self, folder, name):
+        target_dir = os.path.join(self.corpus_dir, folder)
+        os.makedirs(target_dir, exist_ok=True)
+        return os.path.join(target_dir, name)
+
+    def copy(self, source, folder, name):
+        target = self.target(folder, name)
+        shutil.copyfile(source, target)
+        os.utime(target, (CORPUS_MTIME, CORPUS_MTIME))
+
+    def write_bytes(self, folder, name, data):
+        target = self.target(folder, name)
+        with open(target, "wb") as f:
+            f.write(data)
+        os.utime(target, (CORPUS_MTIME, CORPUS_MTIME))
+
+    def aae_sidecar(self, number):
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<plist version="1.0"><dict>'
+            f'<key>adjustmentBaseVersion</key><integer>0</integer>'
+            f'<key>adjustmentFormatIdentifier</key><string>com.apple.photo</string>'
+            f'<key>source</key><string>IMG_{number}</string>'
+            '</dict></plist>\n'
+        ).encode("utf-8")
+
+
+def collect_tasks(engine, corpus_dir, scan_workers):
+    """扫描并分类语料，返回 (任务列表, 扫描秒数, 分类秒数, 文件数)"""
+    start = time.perf_counter()
+    index = scan_tree(corpus_dir, workers=scan_workers)
+    scan_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tasks = []
+    for dir_path, files in index.iter_folders():
+        # 语料清单和模板不是备份对象
+        files = [name for name in files if name != CORPUS_MANIFEST]
+        file_types = engine.classify_files([os.path.join(dir_path, name) for name in files])
+        tasks.extend(engine.build_tasks(file_types, corpus_dir))
+    classify_seconds = time.perf_counter() - start
+
+    return tasks, scan_seconds, classify_seconds, index.file_count() - 1
+
+
+def run_format(engine, tasks, output_dir, workers):
+    """用引擎的真实处理路径处理全部任务，返回统计"""
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+    os.makedirs(output_dir)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda task: engine.process_task(task, output_dir), tasks))
+    seconds = time.perf_counter() - start
+
+    output_bytes = 0
+    for result in results:
+        for path in result.get('outputs', []):
+            try:
+                output_bytes += os.path.getsize(path)
+            except OSError:
+                pass
+
+    # 每段视频在ffmpeg/libav中的平均耗时
+    media = engine.timing.summary()['stages'].get('ffmpeg')
+
+    return {
+        'seconds': seconds,
+        'media_seconds_per_clip': media['mean'] if media else None,
+        'succeeded': sum(1 for result in results if result['success']),
+        'failed': sum(1 for result in results if not result['success']),
+        'output_bytes': output_bytes,
+        'remuxed': engine.conversion_stats['remux'],
+        'transcoded': engine.conversion_stats['transcode'],
+    }
+
+
+def rate(amount, seconds):
+    return amount / seconds if seconds > 0 else 0.0
+
+
+def build_parser():
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(description="Live Photo备份工具性能基准")
+    parser.add_argument("--corpus", default=os.path.join(tempfile.gettempdir(), "livephoto_bench_corpus"),
+                        help="语料目录（参数不变时复用）")
+    parser.add_argument("--output", default=None, help="输出目录（默认在临时目录中）")
+    parser.add_argument("--live-photos", type=int, default=40, help="Live Photo数量")
+    parser.add_argument("--edited", type=float, default=0.25, help="带IMG_E编辑版本的Live Photo比例")
+    parser.add_argument("--livp", type=int, default=10, help=".livp文件数量")
+    parser.add_argument("--images", type=int, default=20, help="普通图片数量")
+    parser.add_argument("--others", type=int, default=10, help="其他文件数量")
+    parser.add_argument("--shape", choices=CORPUS_SHAPES, default="nested", help="目录树形状")
+    parser.add_argument("--image-size", type=parse_size, default=(4032, 3024), help="照片尺寸（默认: 4032x3024）")
+    parser.add_argument("--video-size", type=parse_size, default=(1440, 1080), help="视频尺寸（默认: 1440x1080）")
+    parser.add_argument("--duration", type=float, default=3.0, help="视频时长（秒）")
+    parser.add_argument("--video-codec", choices=["libx264", "libx265"], default="libx264", help="语料视频编码")
+    parser.add_argument("--heic", action="store_true", help="照片使用HEIC（需要pillow-heif）")
+    parser.add_argument("--variants", type=int, default=6, help="不同内容的模板数量")
+    parser.add_argument("--seed", type=int, default=1, help="随机种子")
+    parser.add_argument("--formats", default=",".join(OUTPUT_FORMATS),
+                        help=f"要测量的输出格式，逗号分隔（默认: {','.join(OUTPUT_FORMATS)}）")
+    parser.add_argument("--animation-profiles", default=",".join(ANIMATION_PROFILES),
+                        help=f"GIF/WebP要测量的动图配置，逗号分隔（默认: {','.join(ANIMATION_PROFILES)}）")
+    parser.add_argument("--mp4-profiles", default=DEFAULT_MP4_PROFILE,
+                        help=f"MP4要测量的编码配置，逗号分隔（可选: {','.join(MP4_PROFILES)}；默认: {DEFAULT_MP4_PROFILE}）")
+    parser.add_argument("--max-resolution", type=int, default=None, help="MP4输出的最大分辨率（短边像素数）")
+    parser.add_argument("--batch-sizes", default="1",
+                        help="MP4/GIF/WebP要测量的合并转换批大小（每个ffmpeg进程的视频数），逗号分隔（默认: 1）")
+    parser.add_argument("--media-backends", default=DEFAULT_MEDIA_BACKEND,
+                        help=f"MP4/GIF/WebP要测量的媒体后端，逗号分隔（可选: {','.join(MEDIA_BACKENDS)}；"
+                             f"默认: {DEFAULT_MEDIA_BACKEND}）")
+    parser.add_argument("-w", "--workers", type=int, default=multiprocessing.cpu_count(), help="处理线程数")
+    parser.add_argument("--scan-workers", type=int, default=DEFAULT_SCAN_WORKERS, help="扫描线程数")
+    parser.add_argument("--remux", action="store_true", help="MP4输出时直接封装兼容的视频")
+    parser.add_argument("--ffmpeg", default=None, help="FFmpeg可执行文件路径（默认自动查找）")
+    parser.add_argument("--json", dest="json_path", default=None, help="把结果写入JSON文件")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    formats = [fmt.strip() for fmt in args.formats.split(",") if fmt.strip()]
+    for fmt in formats:
+        if fmt not in OUTPUT_FORMATS:
+            print(f"错误: 未知的输出格式: {fmt}", file=sys.stderr)
+            return 2
+    profiles = [name.strip() for name in args.animation_profiles.split(",") if name.strip()]
+    for name in profiles:
+        if name not in ANIMATION_PROFILES:
+            print(f"错误: 未知的动图配置: {name}", file=sys.stderr)
+            return 2
+    mp4_profiles = [name.strip() for name in args.mp4_profiles.split(",") if name.strip()]
+    for name in mp4_profiles:
+        if name not in MP4_PROFILES:
+            print(f"错误: 未知的MP4编码配置: {name}", file=sys.stderr)
+            return 2
+
+    try:
+        batch_sizes = [int(size) for size in args.batch_sizes.split(",") if size.strip()]
+    except ValueError:
+        batch_sizes = []
+    if not batch_sizes or min(batch_sizes) < 1:
+        print(f"错误: 无效的合并转换批大小: {args.batch_sizes}", file=sys.stderr)
+        return 2
+
+    backends = [name.strip() for name in args.media_backends.split(",") if name.strip()]
+    for name in backends:
+        if name not in MEDIA_BACKENDS:
+            print(f"错误: 未知的媒体后端: {name}", file=sys.stderr)
+            return 2
+        if not is_backend_available(name):
+            print(f"错误: 媒体后端 {name} 所需的库未安装", file=sys.stderr)
+            return 2
+
+    if args.ffmpeg:
+        ffmpeg_path = args.ffmpeg
+        ffprobe_path = os.path.join(os.path.dirname(args.ffmpeg), "ffprobe" + os.path.splitext(args.ffmpeg)[1])
+    else:
+        try:
+            ffmpeg_info = detect_ffmpeg(os.path.join(get_app_path(), 'dependencies'))
+        except FileNotFoundError:
+            print("错误: 未找到FFmpeg，无法生成语料", file=sys.stderr)
+            return 2
+        ffmpeg_path = ffmpeg_info['ffmpeg_path']
+        ffprobe_path = ffmpeg_info['ffprobe_path']
+
+    corpus_options = {
+        'live_photos': args.live_photos, 'edited': args.edited, 'livp': args.livp,
+        'images': args.images, 'others': args.others, 'shape': args.shape,
+        'image_size': list(args.image_size), 'video_size': list(args.video_size),
+        'duration': args.duration, 'video_codec': args.video_codec, 'heic': args.heic,
+        'variants': max(1, args.variants), 'seed': args.seed,
+    }
+    corpus_dir = CorpusBuilder(args.corpus, corpus_options, ffmpeg_path).build()
+    output_root = args.output or tempfile.mkdtemp(prefix="livephoto_bench_out_")
+
+    def quiet(message):
+        pass
+
+    def make_engine(output_format, profile=None, batch_size=1, backend=DEFAULT_MEDIA_BACKEND):
+        options = {'batch_size': batch_size, 'media_backend': backend}
+        if output_format in ANIMATION_FORMATS and profile:
+            options['animation_profile'] = profile
+        elif output_format == "mp4" and profile:
+            options['mp4_profile'] = profile
+        return LivePhotoEngine(ffmpeg_path=ffmpeg_path, ffprobe_path=ffprobe_path,
+                               output_format=output_format, thread_count=args.workers,
+                               incremental=False, mp4_remux=args.remux,
+                               mp4_max_resolution=args.max_resolution,
+                               scan_workers=args.scan_workers, log_callback=quiet, **options)
+
+    tasks, scan_seconds, classify_seconds, file_count = collect_tasks(make_engine("original"), corpus_dir,
+                                                                      args.scan_workers)
+    engine = make_engine("original")
+    input_bytes = sum(os.path.getsize(path) for task in tasks for path in engine.task_sources(task))
+    source_files = sum(len(engine.task_sources(task)) for task in tasks)
+
+    results = {
+        'corpus': dict(corpus_options, path=corpus_dir, files=file_count, tasks=len(tasks),
+                       bytes=input_bytes),
+        'scan': {'seconds': scan_seconds, 'files_per_second': rate(file_count, scan_seconds)},
+        'classify': {'seconds': classify_seconds, 'files_per_second': rate(file_count, classify_seconds)},
+        'formats': {},
+    }
+
+    print(f"语料: {file_count} 个文件，{len(tasks)} 个任务，{input_bytes / 1024 / 1024:.1f} MB ({corpus_dir})")
+    print(f"扫描: {scan_seconds:.3f} 秒，{rate(file_count, scan_seconds):.0f} 文件/秒")
+    print(f"分类: {classify_seconds:.3f} 秒，{rate(file_count, classify_seconds):.0f} 文件/秒")
+    print(f"{'格式':<24}{'秒':>9}{'文件/秒':>10}{'MB/秒':>9}{'输出MB':>9}{'毫秒/段':>9}{'失败':>6}")
+
+    # GIF/WebP每个动图配置、MP4每个编码配置单独测量，结果键为 "格式:配置"；
+    # 测量多个批大小或媒体后端时，视频格式的键再加上 "@批大小" 和 "/后端"
+    runs = []
+    for fmt in formats:
+        if fmt in ANIMATION_FORMATS:
+            names = profiles
+        elif fmt == "mp4":
+            names = mp4_profiles
+        else:
+            runs.append((fmt, fmt, None, 1, DEFAULT_MEDIA_BACKEND))
+            continue
+        for name in names:
+            for backend in backends:
+                for batch_size in batch_sizes:
+                    label = f"{fmt}:{name}"
+                    if len(batch_sizes) > 1:
+                        label += f"@{batch_size}"
+                    if len(backends) > 1:
+                        label += f"/{backend}"
+                    runs.append((label, fmt, name, batch_size, backend))
+
+    for label, fmt, profile, batch_size, backend in runs:
+        engine = make_engine(fmt, profile, batch_size, backend)
+        output_dir = os.path.join(output_root, label.replace(":", "_").replace("@", "_b").replace("/", "_"))
+        stats = run_format(engine, tasks, output_dir, engine.worker_count())
+        stats['batch_size'] = batch_size
+        stats['media_backend'] = backend
+        stats['files_per_second'] = rate(source_files, stats['seconds'])
+        stats['mb_per_second'] = rate(input_bytes / 1024 / 1024, stats['seconds'])
+        results['formats'][label] = stats
+        per_clip = stats['media_seconds_per_clip']
+        per_clip = f"{per_clip * 1000:.1f}" if per_clip is not None else "-"
+        print(f"{label:<24}{stats['seconds']:>9.2f}{stats['files_per_second']:>10.1f}"
+              f"{stats['mb_per_second']:>9.1f}{stats['output_bytes'] / 1024 / 1024:>9.1f}{per_clip:>9}"
+              f"{stats['failed']:>6}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+    if not args.output:
+        shutil.rmtree(output_root, ignore_errors=True)
+    return 1 if any(stats['failed'] for stats in results['formats'].values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,7 +13,7 @@ a = Analysis(
         # 如果你有图标文件，也可以添加
         # ('icon.ico', '.'),
     ],
-    hiddenimports=['PIL', 'pillow_heif'],
+    hiddenimports=['PIL', 'pillow_heif', 'av'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
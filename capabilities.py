@@ -0,0 +1,135 @@
+"""FFmpeg能力探测 - 可用的编码器和硬件加速方式
+
+每个FFmpeg可执行文件只探测一次：读取 -encoders / -hwaccels 列表，
+对需要使用的编码器运行一次极小的测试编码确认确实可用（编译进FFmpeg不代表有对应的显卡和驱动）。
+运行中某个编码器失败后将其标记为不可用，后续任务不再尝试。
+"""
+import os
+import re
+import shutil
+import threading
+
+from media import run_command
+
+# 按优先顺序尝试的H.264硬件编码器，以及各自的质量参数
+GPU_H264_ENCODERS = ["h264_nvenc", "h264_qsv", "h264_videotoolbox", "h264_amf"]
+GPU_ENCODER_ARGS = {
+    "h264_nvenc": ["-preset", "medium"],
+    "h264_qsv": ["-preset", "medium"],
+    "h264_videotoolbox": [],
+    "h264_amf": ["-quality", "balanced"],
+}
+
+# -encoders 输出中的编码器行，例如 " V....D libx264   libx264 H.264 ..."
+ENCODER_LINE = re.compile(r"^\s*([VAS][A-Z.]{5})\s+(\S+)")
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def binary_key(ffmpeg_path):
+    """FFmpeg可执行文件的缓存键：实际路径、大小和修改时间（替换文件后重新探测）"""
+    resolved = shutil.which(ffmpeg_path) or ffmpeg_path
+    try:
+        st = os.stat(resolved)
+        return os.path.realpath(resolved), st.st_size, st.st_mtime
+    except OSError:
+        return resolved, None, None
+
+
+def get_capabilities(ffmpeg_path):
+    """返回FFmpeg可执行文件对应的能力记录（同一文件只探测一次）"""
+    key = binary_key(ffmpeg_path)
+    with _registry_lock:
+        capabilities = _registry.get(key)
+        if capabilities is None:
+            capabilities = FFmpegCapabilities(ffmpeg_path)
+            _registry[key] = capabilities
+        return capabilities
+
+
+class FFmpegCapabilities:
+    """一个FFmpeg可执行文件支持的编码器和硬件加速方式"""
+
+    def __init__(self, ffmpeg_path):
+        self.ffmpeg_path = ffmpeg_path
+        self.lock = threading.Lock()
+        self.probed = False
+        self.encoders = set()
+        self.hwaccels = []
+        # 编码器 -> 测试编码是否成功
+        self.verified = {}
+        # 运行中失败过的编码器
+        self.failed = set()
+
+    def probe(self):
+        """读取编码器和硬件加速列表（只执行一次）"""
+        with self.lock:
+            if self.probed:
+                return
+            self.probed = True
+
+            try:
+                result = run_command([self.ffmpeg_path, "-hide_banner", "-encoders"])
+                if result.returncode == 0:
+                    for line in result.stdout.splitlines():
+                        match = ENCODER_LINE.match(line)
+                        if match and match.group(2) != "=":
+                            self.encoders.add(match.group(2))
+
+                result = run_command([self.ffmpeg_path, "-hide_banner", "-hwaccels"])
+                if result.returncode == 0:
+                    lines = [line.strip() for line in result.stdout.splitlines()]
+                    self.hwaccels = [line for line in lines if line and not line.endswith(":")]
+            except OSError:
+                pass
+
+    def has_encoder(self, encoder):
+        """FFmpeg是否编译了该编码器"""
+        self.probe()
+        return encoder in self.encoders
+
+    def is_usable(self, encoder):
+        """编码器是否可用：已编译、测试编码成功且运行中没有失败过"""
+        if not self.has_encoder(encoder):
+            return False
+
+        with self.lock:
+            if encoder in self.failed:
+                return False
+            verified = self.verified.get(encoder)
+            if verified is None:
+                verified = self.test_encode(encoder)
+                self.verified[encoder] = verified
+            return verified
+
+    def test_encode(self, encoder):
+        """用一帧很小的测试画面确认编码器能实际工作"""
+        try:
+            result = run_command([
+                self.ffmpeg_path, "-hide_banner", "-v", "error",
+                "-f", "lavfi", "-i", "color=c=black:s=256x256:r=1:d=1",
+                "-frames:v", "1", "-c:v", encoder, "-f", "null", "-"
+            ])
+        except OSError:
+            return False
+        return result.returncode == 0
+
+    def mark_failed(self, encoder):
+        """运行中编码器失败，后续不再使用；返回是否为首次标记"""
+        with self.lock:
+            if encoder in self.failed:
+                return False
+            self.failed.add(encoder)
+            return True
+
+    def pick_encoder(self, candidates):
+        """返回候选中第一个可用的编码器，都不可用时返回None"""
+        for encoder in candidates:
+            if self.is_usable(encoder):
+                return encoder
+        return None
+
+    def gpu_encoders(self):
+        """可用的H.264硬件编码器列表"""
+        return [encoder for encoder in GPU_H264_ENCODERS if self.is_usable(encoder)]
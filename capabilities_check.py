@@ -0,0 +1,173 @@
+"""编码器能力检查 - 用模拟的FFmpeg验证硬件编码器的探测和失败缓存
+
+生成一个包装真实ffmpeg的脚本：-encoders 列表中多出 h264_nvenc，使用 h264_nvenc 的命令按场景失败
+并记录调用，其余命令交给真实的ffmpeg执行。然后开启GPU加速把几组Live Photo转换为MP4，检查：
+  no_device      编译了nvenc但没有显卡：只有测试编码调用nvenc（整个进程一次），每段视频直接使用CPU编码
+  runtime_fail   测试编码成功但实际编码失败：nvenc最多被每个处理线程尝试一次，之后不再使用
+两种场景下所有文件都应转换成功。需要系统中的ffmpeg，不支持Windows（模拟脚本依赖shebang）。
+
+用法示例:
+    python capabilities_check.py
+    python capabilities_check.py --clips 16 -w 4
+"""
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+
+from engine import LivePhotoEngine
+from capabilities import get_capabilities
+from media import run_command
+
+SCENARIOS = ["no_device", "runtime_fail"]
+
+# 模拟的ffmpeg：REAL、MODE、LOG由生成时填入
+FAKE_FFMPEG = '''#!{python}
+import subprocess
+import sys
+
+REAL, MODE, LOG = {real!r}, {mode!r}, {log!r}
+args = sys.argv[1:]
+
+if "-encoders" in args:
+    result = subprocess.run([REAL, *args], capture_output=True, text=True)
+    sys.stdout.write(result.stdout)
+    sys.stdout.write(" V....D h264_nvenc           NVIDIA NVENC H.264 encoder (codec h264)\\n")
+    sys.exit(result.returncode)
+
+if "h264_nvenc" in args:
+    test = args[-3:] == ["-f", "null", "-"]
+    with open(LOG, "a") as f:
+        f.write("test\\n" if test else "encode\\n")
+    if MODE == "no_device" or not test:
+        sys.stderr.write("Cannot load libcuda.so.1\\n")
+        sys.exit(1)
+    sys.exit(0)
+
+sys.exit(subprocess.call([REAL, *args]))
+'''
+
+
+def write_fake_ffmpeg(directory, real_ffmpeg, mode, log_path):
+    """生成模拟的ffmpeg脚本，返回其路径"""
+    path = os.path.join(directory, "ffmpeg")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(FAKE_FFMPEG.format(python=sys.executable, real=real_ffmpeg, mode=mode, log=log_path))
+    os.chmod(path, 0o755)
+    return path
+
+
+def make_clips(input_dir, real_ffmpeg, count):
+    """用lavfi测试源生成 count 组极小的Live Photo（JPG+MOV）"""
+    os.makedirs(input_dir)
+    image = os.path.join(input_dir, "IMG_0001.JPG")
+    video = os.path.join(input_dir, "IMG_0001.MOV")
+    for args in (
+        ["-f", "lavfi", "-i", "testsrc2=size=160x120:rate=1", "-frames:v", "1", image],
+        ["-f", "lavfi", "-i", "testsrc2=size=160x120:rate=15", "-t", "0.5",
+         "-c:v", "libx264", "-pix_fmt", "yuv420p", video],
+    ):
+        result = run_command([real_ffmpeg, "-v", "error", "-y", *args])
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg生成测试文件失败: {result.stderr.strip()}")
+
+    for i in range(2, count + 1):
+        shutil.copyfile(image, os.path.join(input_dir, f"IMG_{i:04d}.JPG"))
+        shutil.copyfile(video, os.path.join(input_dir, f"IMG_{i:04d}.MOV"))
+
+
+def read_calls(log_path):
+    """返回 (测试编码次数, 实际编码次数)"""
+    try:
+        with open(log_path, encoding="utf-8") as f:
+            calls = f.read().split()
+    except OSError:
+        calls = []
+    return calls.count("test"), calls.count("encode")
+
+
+def run_scenario(mode, work_dir, real_ffmpeg, input_dir, clips, workers):
+    """运行一个场景，返回问题列表（为空表示通过）"""
+    scenario_dir = os.path.join(work_dir, mode)
+    os.makedirs(scenario_dir)
+    log_path = os.path.join(scenario_dir, "nvenc_calls.log")
+    ffmpeg_path = write_fake_ffmpeg(scenario_dir, real_ffmpeg, mode, log_path)
+
+    engine = LivePhotoEngine(
+        ffmpeg_path, None, output_format="mp4", thread_count=workers, use_gpu=True,
+        incremental=False, mp4_profile="fastest", log_callback=lambda message: None
+    )
+    summary = engine.run(input_dir, os.path.join(scenario_dir, "output"))
+    tests, encodes = read_calls(log_path)
+
+    problems = []
+    if summary['errors'] or summary['processed'] != clips:
+        problems.append(f"转换成功 {summary['processed']}/{clips} 个，{summary['errors']} 个错误")
+    if tests != 1:
+        problems.append(f"测试编码调用nvenc {tests} 次（应为1次）")
+
+    gpu_encoders = get_capabilities(ffmpeg_path).gpu_encoders()
+    if mode == "no_device":
+        if encodes:
+            problems.append(f"测试编码失败后仍有 {encodes} 段视频调用nvenc")
+        if gpu_encoders:
+            problems.append(f"报告了不可用的GPU编码器: {gpu_encoders}")
+    else:
+        if not 1 <= encodes <= workers:
+            problems.append(f"实际编码调用nvenc {encodes} 次（应为1到{workers}次）")
+        if gpu_encoders:
+            problems.append(f"运行失败后仍报告GPU编码器: {gpu_encoders}")
+
+    print(f"{mode:<14} 测试编码 {tests} 次，实际编码 {encodes} 次，"
+          f"转换成功 {summary['processed']}/{clips}：{'通过' if not problems else '失败'}")
+    for problem in problems:
+        print(f"  - {problem}")
+    return problems
+
+
+def build_parser():
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(description="用模拟的FFmpeg检查硬件编码器的探测和失败缓存")
+    parser.add_argument("--clips", type=int, default=8, help="Live Photo数量")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="处理线程数")
+    parser.add_argument("--ffmpeg", default=None, help="真实的FFmpeg可执行文件路径（默认在PATH中查找）")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"要运行的场景，逗号分隔（默认: {','.join(SCENARIOS)}）")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if os.name == "nt":
+        print("错误: 模拟的ffmpeg脚本不支持Windows", file=sys.stderr)
+        return 2
+
+    real_ffmpeg = shutil.which(args.ffmpeg or "ffmpeg")
+    if real_ffmpeg is None:
+        print("错误: 未找到FFmpeg", file=sys.stderr)
+        return 2
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    for name in scenarios:
+        if name not in SCENARIOS:
+            print(f"错误: 未知的场景: {name}", file=sys.stderr)
+            return 2
+
+    work_dir = tempfile.mkdtemp(prefix="livephoto_capabilities_")
+    try:
+        input_dir = os.path.join(work_dir, "input")
+        make_clips(input_dir, real_ffmpeg, args.clips)
+
+        failed = False
+        for mode in scenarios:
+            if run_scenario(mode, work_dir, real_ffmpeg, input_dir, args.clips, args.workers):
+                failed = True
+        return 1 if failed else 0
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
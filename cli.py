@@ -0,0 +1,130 @@
+"""LivePhoto备份工具命令行入口 - 适用于无显示环境的服务器批量备份
+
+用法示例:
+    python cli.py /photos /backup --format mp4 --workers 8
+"""
+import os
+import sys
+import time
+import argparse
+import signal
+import multiprocessing
+
+from engine import LivePhotoEngine, OUTPUT_FORMATS, detect_ffmpeg
+from scanner import DEFAULT_SCAN_WORKERS
+from batching import DEFAULT_BATCH_SIZE
+from backends import MEDIA_BACKENDS, DEFAULT_MEDIA_BACKEND
+from profiles import ANIMATION_PROFILES, DEFAULT_ANIMATION_PROFILE, MP4_PROFILES, DEFAULT_MP4_PROFILE
+
+
+def get_app_path():
+    """获取应用程序路径"""
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+def build_parser():
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(description="Live Photo备份工具（命令行版）")
+    parser.add_argument("input_dir", help="源文件夹")
+    parser.add_argument("output_dir", help="输出目录")
+    parser.add_argument("-f", "--format", dest="output_format", choices=OUTPUT_FORMATS,
+                        default="mp4", help="LivePhoto输出格式（默认: mp4）")
+    parser.add_argument("--mp4-profile", choices=list(MP4_PROFILES), default=DEFAULT_MP4_PROFILE,
+                        help=f"MP4编码配置：archive、standard、fast/fastest、hevc/av1（默认: {DEFAULT_MP4_PROFILE}）")
+    parser.add_argument("--max-resolution", type=int, default=None, metavar="N",
+                        help="MP4输出的最大分辨率（视频短边像素数，例如 720），默认保持原始分辨率")
+    parser.add_argument("--animation-profile", choices=list(ANIMATION_PROFILES), default=DEFAULT_ANIMATION_PROFILE,
+                        help=f"GIF/WebP动图配置：速度、质量与大小的取舍（默认: {DEFAULT_ANIMATION_PROFILE}）")
+    parser.add_argument("-w", "--workers", type=int, default=multiprocessing.cpu_count(),
+                        help="并行处理的线程数（默认: CPU核心数）")
+    parser.add_argument("--cpu-budget", type=int, default=None,
+                        help="ffmpeg可使用的CPU核心总数，每个任务使用 核心数/线程数 个线程（默认: CPU核心数）")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, metavar="N",
+                        help="合并转换：每个ffmpeg进程同时转换最多N个视频，减少进程启动开销（默认: 1，不合并）")
+    parser.add_argument("--media-backend", choices=MEDIA_BACKENDS, default=DEFAULT_MEDIA_BACKEND,
+                        help="媒体后端：ffmpeg 每个文件启动一个ffmpeg进程；pyav 通过PyAV在进程内处理（需安装PyAV），"
+                             f"不支持的操作仍使用ffmpeg（默认: {DEFAULT_MEDIA_BACKEND}）")
+    parser.add_argument("--scan-workers", type=int, default=DEFAULT_SCAN_WORKERS,
+                        help=f"扫描目录树时同时列出的目录数，网络共享上可调大（默认: {DEFAULT_SCAN_WORKERS}）")
+    parser.add_argument("--flat", action="store_true",
+                        help="不保留子文件夹结构，所有文件输出到同一目录")
+    parser.add_argument("--preserve-livp", action="store_true",
+                        help="为每个Live Photo额外创建.livp文件")
+    parser.add_argument("--gpu", action="store_true",
+                        help="使用GPU加速（如果可用）")
+    parser.add_argument("--full", action="store_true",
+                        help="完整备份：不检查输出目录中的处理清单，重新处理所有文件（清单仍会更新）")
+    parser.add_argument("--resume", action="store_true",
+                        help="继续输出目录中上次中断（取消、关闭或被终止）的作业，只处理未完成的任务")
+    parser.add_argument("--dedup", action="store_true",
+                        help="内容相同的文件只处理一次，其余输出使用硬链接（不支持时复制）")
+    parser.add_argument("--remux", action="store_true",
+                        help="MP4输出时，H.264/HEVC视频直接封装而不重新编码")
+    parser.add_argument("--ffmpeg", default=None,
+                        help="FFmpeg可执行文件路径（默认自动查找）")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="只输出错误和最终摘要")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if not os.path.isdir(args.input_dir):
+        print(f"错误: 输入目录不存在: {args.input_dir}", file=sys.stderr)
+        return 2
+
+    def log(message):
+        if not args.quiet or message.startswith(("处理失败", "处理任务时出错", "处理完成", "操作已取消")):
+            print(f"{time.strftime('%H:%M:%S')} - {message}", flush=True)
+
+    # 确定FFmpeg路径
+    if args.ffmpeg:
+        ffmpeg_path = args.ffmpeg
+        ffprobe_path = os.path.join(os.path.dirname(args.ffmpeg), "ffprobe" + os.path.splitext(args.ffmpeg)[1])
+    else:
+        try:
+            ffmpeg_info = detect_ffmpeg(os.path.join(get_app_path(), 'dependencies'))
+            ffmpeg_path = ffmpeg_info['ffmpeg_path']
+            ffprobe_path = ffmpeg_info['ffprobe_path']
+        except FileNotFoundError:
+            log("警告: 未找到FFmpeg，LivePhoto视频部分将无法转换")
+            ffmpeg_path = "ffmpeg"
+            ffprobe_path = "ffprobe"
+
+    engine = LivePhotoEngine(
+        ffmpeg_path=ffmpeg_path,
+        ffprobe_path=ffprobe_path,
+        output_format=args.output_format,
+        preserve_structure=not args.flat,
+        preserve_livp=args.preserve_livp,
+        thread_count=max(1, args.workers),
+        use_gpu=args.gpu,
+        incremental=not args.full,
+        deduplicate=args.dedup,
+        mp4_remux=args.remux,
+        cpu_cores=args.cpu_budget,
+        scan_workers=max(1, args.scan_workers),
+        resume=args.resume,
+        animation_profile=args.animation_profile,
+        mp4_profile=args.mp4_profile,
+        mp4_max_resolution=args.max_resolution,
+        batch_size=max(1, args.batch_size),
+        media_backend=args.media_backend,
+        log_callback=log
+    )
+
+    # Ctrl+C 时设置取消标志，让正在运行的任务尽快结束
+    signal.signal(signal.SIGINT, lambda signum, frame: engine.cancel_flag.set())
+
+    summary = engine.run(args.input_dir, args.output_dir)
+
+    if summary['cancelled']:
+        return 130
+    return 1 if summary['errors'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
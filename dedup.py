@@ -0,0 +1,89 @@
+"""重复输入检测 - 相同内容的文件（或Live Photo图片+视频对）只处理一次
+
+先按文件大小分组，只有大小完全相同的任务才计算内容哈希，避免读取绝大多数文件。
+重复任务的输出通过硬链接（不支持时复制）指向首个任务的输出。
+"""
+import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from outputs import atomic_copy
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path):
+    """计算文件内容哈希"""
+    digest = hashlib.blake2b(digest_size=32)
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def find_duplicates(tasks, sources_of, size_of, max_workers=4, cancel_flag=None, extra_key=None):
+    """查找内容相同的任务
+
+    sources_of(task) 返回任务的源文件列表，size_of(path) 返回文件大小。
+    extra_key(task) 可返回额外的分组条件（例如输出内容依赖源文件名时返回文件名）。
+    返回去重后的任务列表（保持原有顺序），重复任务挂在首个任务的 'duplicates' 列表中。
+    """
+    # 第一步：按任务类型和各源文件大小分组
+    size_groups = {}
+    for task in tasks:
+        try:
+            key = (task['type'], tuple(size_of(path) for path in sources_of(task)),
+                   extra_key(task) if extra_key else None)
+        except OSError:
+            key = (task['type'], id(task))
+        size_groups.setdefault(key, []).append(task)
+
+    # 第二步：只对大小相同的候选任务计算内容哈希
+    candidates = [task for group in size_groups.values() if len(group) > 1 for task in group]
+    if not candidates:
+        return list(tasks)
+
+    paths = sorted({path for task in candidates for path in sources_of(task)})
+
+    def safe_hash(path):
+        if cancel_flag is not None and cancel_flag.is_set():
+            return None
+        try:
+            return hash_file(path)
+        except OSError:
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        hashes = dict(zip(paths, executor.map(safe_hash, paths)))
+
+    # 第三步：按内容哈希合并重复任务
+    canonical = {}
+    duplicate_ids = set()
+    for task in candidates:
+        content = tuple(hashes.get(path) for path in sources_of(task))
+        if None in content:
+            continue
+        key = (task['type'], content, extra_key(task) if extra_key else None)
+        first = canonical.get(key)
+        if first is None:
+            canonical[key] = task
+        else:
+            first.setdefault('duplicates', []).append(task)
+            duplicate_ids.add(id(task))
+
+    return [task for task in tasks if id(task) not in duplicate_ids]
+
+
+def link_or_copy(source, target):
+    """创建硬链接，跨设备或文件系统不支持时改为复制"""
+    if os.path.abspath(source) == os.path.abspath(target):
+        return
+    if os.path.lexists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        atomic_copy(source, target)
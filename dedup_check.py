@@ -0,0 +1,185 @@
+"""重复文件检查 - 去重后链接的输出应与逐个处理时完全相同
+
+生成包含重复内容的Live Photo、.livp文件和普通图片（包括包内成员名与.livp文件名相同、
+内容相同但文件名不同的.livp），分别开启和关闭 --dedup 处理，比较两个输出目录中的文件名和内容。
+新建的LIVP中 metadata.json 记录了创建时间，比较LIVP时只比较其他成员。需要系统中的ffmpeg。
+
+用法示例:
+    python dedup_check.py
+    python dedup_check.py --formats mp4 --no-preserve-livp
+"""
+import os
+import sys
+import shutil
+import filecmp
+import zipfile
+import argparse
+import tempfile
+
+from engine import LivePhotoEngine, OUTPUT_FORMATS
+from livp import add_file_to_zip
+from manifest import MANIFEST_NAME
+from journal import JOURNAL_NAME
+from timing import REPORT_NAME
+from media import run_command
+
+# 生成文件统一的修改时间，新建的LIVP中成员的时间戳也随之固定
+CHECK_MTIME = 1700000000
+
+# 源文件布局: (目录, 文件名, 模板)；相同模板的文件内容相同
+LAYOUT = [
+    # Live Photo：文件名相同、位于不同目录的重复
+    ("photos/a", "IMG_0001.JPG", "image"), ("photos/a", "IMG_0001.MOV", "video"),
+    ("photos/b", "IMG_0001.JPG", "image"), ("photos/b", "IMG_0001.MOV", "video"),
+    # Live Photo：内容相同、文件名不同
+    ("photos/c", "IMG_0101.JPG", "image"), ("photos/c", "IMG_0101.MOV", "video"),
+    # .livp：成员名与.livp文件名相同，以及内容相同、文件名不同的副本。
+    # 每组中最先处理的是哪个文件取决于目录的遍历顺序，两组的文件名在两个目录中交换，
+    # 无论哪个目录在前，总有一组以成员名相同的.livp为首个任务
+    ("livp/a", "IMG_0001.livp", "livp"), ("livp/b", "IMG_0002.livp", "livp"),
+    ("livp/a", "IMG_0004.livp", "livp2"), ("livp/b", "IMG_0003.livp", "livp2"),
+    ("livp/c", "IMG_0001.livp", "livp"), ("livp/c", "export.livp", "livp"),
+    # 普通图片
+    ("images/a", "DSC_0001.JPG", "image"),
+    ("images/b", "DSC_0002.JPG", "image"),
+]
+
+# 不参与比较的输出（清单、任务日志和耗时报告）
+IGNORED_OUTPUTS = {MANIFEST_NAME, JOURNAL_NAME, REPORT_NAME + ".json", REPORT_NAME + ".csv"}
+
+
+def make_templates(template_dir, ffmpeg_path):
+    """生成图片、视频和.livp模板"""
+    os.makedirs(template_dir)
+    templates = {
+        'image': os.path.join(template_dir, "image.jpg"),
+        'video': os.path.join(template_dir, "video.mov"),
+        'video2': os.path.join(template_dir, "video2.mov"),
+        'livp': os.path.join(template_dir, "live.livp"),
+        'livp2': os.path.join(template_dir, "live2.livp"),
+    }
+    args_list = [["-f", "lavfi", "-i", "testsrc2=size=320x240:rate=1", "-frames:v", "1", templates['image']]]
+    for video, source in ((templates['video'], "testsrc2"), (templates['video2'], "mandelbrot")):
+        args_list.append([
+            "-f", "lavfi", "-i", f"{source}=size=320x240:rate=30",
+            "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=44100",
+            "-t", "1", "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p",
+            "-c:a", "aac", "-shortest", video
+        ])
+    for args in args_list:
+        result = run_command([ffmpeg_path, "-v", "error", "-y", *args])
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg生成测试文件失败: {result.stderr.strip()}")
+
+    for path in (templates['image'], templates['video'], templates['video2']):
+        os.utime(path, (CHECK_MTIME, CHECK_MTIME))
+    for livp, video, stem in ((templates['livp'], templates['video'], "IMG_0001"),
+                              (templates['livp2'], templates['video2'], "IMG_0003")):
+        with zipfile.ZipFile(livp, 'w', compression=zipfile.ZIP_STORED) as zipf:
+            add_file_to_zip(zipf, templates['image'], f"{stem}.JPG")
+            add_file_to_zip(zipf, video, f"{stem}.MOV")
+    return templates
+
+
+def make_sources(input_dir, templates):
+    """按 LAYOUT 复制模板"""
+    for folder, name, template in LAYOUT:
+        target_dir = os.path.join(input_dir, folder)
+        os.makedirs(target_dir, exist_ok=True)
+        target = os.path.join(target_dir, name)
+        shutil.copyfile(templates[template], target)
+        os.utime(target, (CHECK_MTIME, CHECK_MTIME))
+
+
+def same_output(path, other):
+    """两个输出是否相同；新建的LIVP中 metadata.json 记录了创建时间，只比较其他成员"""
+    if path.lower().endswith(".livp") and zipfile.is_zipfile(path) and zipfile.is_zipfile(other):
+        with zipfile.ZipFile(path) as first, zipfile.ZipFile(other) as second:
+            names = [name for name in first.namelist() if name != "metadata.json"]
+            if names != [name for name in second.namelist() if name != "metadata.json"]:
+                return False
+            return all(first.read(name) == second.read(name) for name in names)
+    return filecmp.cmp(path, other, shallow=False)
+
+
+def list_outputs(output_dir):
+    """返回输出目录中的文件（相对路径）"""
+    outputs = set()
+    for dir_path, _, names in os.walk(output_dir):
+        for name in names:
+            if name not in IGNORED_OUTPUTS:
+                outputs.add(os.path.relpath(os.path.join(dir_path, name), output_dir))
+    return outputs
+
+
+def run_format(ffmpeg_path, input_dir, work_dir, output_format, preserve_livp):
+    """分别开启和关闭去重处理，返回问题列表（为空表示通过）"""
+    problems = []
+    output_dirs = []
+    for deduplicate in (False, True):
+        output_dir = os.path.join(work_dir, f"{output_format}_{'dedup' if deduplicate else 'plain'}")
+        engine = LivePhotoEngine(
+            ffmpeg_path, None, output_format=output_format, preserve_livp=preserve_livp,
+            incremental=False, deduplicate=deduplicate, log_callback=lambda message: None
+        )
+        summary = engine.run(input_dir, output_dir)
+        if summary['errors']:
+            problems.append(f"{'去重' if deduplicate else '逐个'}处理有 {summary['errors']} 个错误")
+        output_dirs.append(output_dir)
+
+    plain, dedup = (list_outputs(path) for path in output_dirs)
+    for name in sorted(plain - dedup):
+        problems.append(f"去重后缺少 {name}")
+    for name in sorted(dedup - plain):
+        problems.append(f"去重后多出 {name}")
+    for name in sorted(plain & dedup):
+        if not same_output(os.path.join(output_dirs[0], name), os.path.join(output_dirs[1], name)):
+            problems.append(f"{name} 内容不同")
+
+    print(f"{output_format:<9} 比较 {len(plain)} 个输出：{'通过' if not problems else '失败'}")
+    for problem in problems:
+        print(f"  - {problem}")
+    return problems
+
+
+def build_parser():
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(description="检查去重后链接的输出与逐个处理时相同")
+    parser.add_argument("--formats", default="mp4,original",
+                        help=f"要检查的输出格式，逗号分隔（可选: {','.join(OUTPUT_FORMATS)}；默认: mp4,original）")
+    parser.add_argument("--no-preserve-livp", dest="preserve_livp", action="store_false",
+                        help="不同时创建LIVP文件")
+    parser.add_argument("--ffmpeg", default=None, help="FFmpeg可执行文件路径（默认在PATH中查找）")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    ffmpeg_path = shutil.which(args.ffmpeg or "ffmpeg")
+    if ffmpeg_path is None:
+        print("错误: 未找到FFmpeg", file=sys.stderr)
+        return 2
+
+    formats = [fmt.strip() for fmt in args.formats.split(",") if fmt.strip()]
+    for fmt in formats:
+        if fmt not in OUTPUT_FORMATS:
+            print(f"错误: 未知的输出格式: {fmt}", file=sys.stderr)
+            return 2
+
+    work_dir = tempfile.mkdtemp(prefix="livephoto_dedup_")
+    try:
+        input_dir = os.path.join(work_dir, "input")
+        make_sources(input_dir, make_templates(os.path.join(work_dir, "templates"), ffmpeg_path))
+
+        failed = False
+        for fmt in formats:
+            if run_format(ffmpeg_path, input_dir, work_dir, fmt, args.preserve_livp):
+                failed = True
+        return 1 if failed else 0
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1253 @@
+"""LivePhoto备份引擎 - 与界面无关的扫描、分类与转换逻辑
+
+图形界面(main.py)与命令行(cli.py)共用此模块，保证两者输出一致。
+"""
+import os
+import threading
+import re
+import zipfile
+import tempfile
+import json
+import multiprocessing
+import time
+from contextlib import contextmanager, ExitStack
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from PIL import Image
+
+from pairing import IMAGE_EXTENSIONS, VIDEO_EXTENSIONS, pair_live_photos
+from scanner import scan_tree, iter_tree, DEFAULT_SCAN_WORKERS
+from manifest import BackupManifest, file_fingerprint
+from dedup import find_duplicates, link_or_copy
+from media import run_command, probe_codecs, subfile_url
+from scheduler import CpuBudget
+from capabilities import get_capabilities, GPU_H264_ENCODERS, GPU_ENCODER_ARGS
+from livp import write_livp, find_livp_members, member_data_range, extract_member
+from timing import TimingReport, REPORT_NAME, stage, add_stage, format_summary
+from outputs import AtomicOutput, atomic_copy, remove_stale_partials
+from journal import JobJournal, RUNNING, DONE, FAILED
+from batching import ClipBatcher, ClipRequest, DEFAULT_BATCH_SIZE
+from backends import create_media_backend, UnsupportedOperation, DEFAULT_MEDIA_BACKEND
+from profiles import (ANIMATION_PROFILES, DEFAULT_ANIMATION_PROFILE, gif_args, webp_args,
+                      MP4_PROFILES, DEFAULT_MP4_PROFILE, max_resolution_args)
+
+# 尝试导入HEIC支持
+try:
+    import pillow_heif
+    pillow_heif.register_heif_opener()
+except ImportError:
+    pass  # 如果没有安装pillow_heif，则使用备用方法
+
+# 支持的输出格式
+OUTPUT_FORMATS = ["original", "mp4", "gif", "webp", "jpg"]
+
+# 动图输出格式（按动图配置转换）
+ANIMATION_FORMATS = ("gif", "webp")
+
+# 可直接封装进MP4的编码（音频为None表示没有音轨）
+REMUX_VIDEO_CODECS = {'h264', 'hevc'}
+REMUX_AUDIO_CODECS = {None, 'aac'}
+
+# 视频转换时映射的输入流：MP4保留第一路视频和第一路音频（如有），动图只用视频
+MP4_STREAMS = ["v:0", "a:0?"]
+VIDEO_STREAMS = ["v:0"]
+
+def detect_ffmpeg(dependencies_path):
+    """查找可用的FFmpeg，优先使用依赖目录中的版本
+
+    返回包含 ffmpeg_path、ffprobe_path、version、local、gpu_support、gpu_encoders、hwaccels 的字典；
+    GPU支持以实际测试编码为准。未找到FFmpeg时抛出 FileNotFoundError。
+    """
+    local_ffmpeg = os.path.join(dependencies_path, 'ffmpeg.exe')
+    if os.path.exists(local_ffmpeg):
+        ffmpeg_path = local_ffmpeg
+        ffprobe_path = os.path.join(dependencies_path, 'ffprobe.exe')
+        local = True
+    else:
+        ffmpeg_path = "ffmpeg"
+        ffprobe_path = "ffprobe"
+        local = False
+
+    result = run_command([ffmpeg_path, "-version"])
+
+    ffmpeg_version = re.search(r"ffmpeg version ([^\s]+)", result.stdout)
+    capabilities = get_capabilities(ffmpeg_path)
+    gpu_encoders = capabilities.gpu_encoders()
+
+    return {
+        'ffmpeg_path': ffmpeg_path,
+        'ffprobe_path': ffprobe_path,
+        'version': ffmpeg_version.group(1) if ffmpeg_version else None,
+        'local': local,
+        'gpu_support': bool(gpu_encoders),
+        'gpu_encoders': gpu_encoders,
+        'hwaccels': list(capabilities.hwaccels)
+    }
+
+
+class LivePhotoEngine:
+    """LivePhoto备份引擎 - 不依赖图形界面，可在无显示环境下运行"""
+
+    def __init__(self, ffmpeg_path="ffmpeg", ffprobe_path="ffprobe", output_format="mp4",
+                 preserve_structure=True, preserve_livp=False, thread_count=None,
+                 use_gpu=False, incremental=True, deduplicate=False, mp4_remux=False,
+                 cpu_cores=None, max_in_flight=None, scan_workers=DEFAULT_SCAN_WORKERS,
+                 resume=False, animation_profile=DEFAULT_ANIMATION_PROFILE,
+                 mp4_profile=DEFAULT_MP4_PROFILE, mp4_max_resolution=None, batch_size=DEFAULT_BATCH_SIZE,
+                 media_backend=DEFAULT_MEDIA_BACKEND, log_callback=None, progress_callback=None, cancel_flag=None):
+        self.ffmpeg_path = ffmpeg_path
+        self.ffprobe_path = ffprobe_path
+        self.output_format = output_format
+        self.preserve_structure = preserve_structure
+        self.preserve_livp = preserve_livp
+        self.thread_count = thread_count or multiprocessing.cpu_count()
+        self.use_gpu = use_gpu
+        # 增量备份：跳过清单中记录为已完成且未变化的文件
+        self.incremental = incremental
+        # 重复输入检测：内容相同的文件只处理一次，其余输出使用硬链接
+        self.deduplicate = deduplicate
+        # MP4输出时，H.264/HEVC视频直接封装而不重新编码
+        self.mp4_remux = mp4_remux
+        # MP4编码配置（profiles.MP4_PROFILES）和最大分辨率（短边像素数，None为原始分辨率）
+        self.mp4_profile = mp4_profile
+        self.mp4_max_resolution = mp4_max_resolution
+        # GIF/WebP动图的速度与质量配置（profiles.ANIMATION_PROFILES）
+        self.animation_profile = animation_profile
+        # 继续上次中断的作业：只处理任务日志中未完成或失败的任务
+        self.resume = resume
+        # 当前运行的任务日志（run()期间有效）
+        self.journal = None
+        # 合并转换：每个ffmpeg进程同时转换的视频数（1为每段视频单独启动ffmpeg）
+        self.batch_size = max(1, batch_size)
+        self.batcher = ClipBatcher(self.run_clip_batch, self.batch_size) if self.batch_size > 1 else None
+        # 媒体后端（backends.MEDIA_BACKENDS）：pyav 在进程内处理视频，不支持或出错的操作仍使用ffmpeg子进程
+        self.media_backend_name = media_backend
+        self.media_backend = create_media_backend(media_backend)
+
+        # 同时提交到线程池的任务上限（默认线程数的4倍）
+        self.max_in_flight = max_in_flight
+
+        # 扫描目录树时同时列出的目录数（网络文件系统上可调大）
+        self.scan_workers = scan_workers
+
+        # 全局CPU预算：每个ffmpeg任务使用固定的线程数，并行任务的线程总数不超过核心数
+        self.cpu_budget = CpuBudget(cpu_cores, self.thread_count)
+
+        # FFmpeg可用的编码器（每个可执行文件只探测一次，使用GPU时才会探测）
+        self.capabilities = get_capabilities(ffmpeg_path)
+
+        # MP4转换方式统计（直接封装/重新编码）
+        self.stats_lock = threading.Lock()
+        self.conversion_stats = {'remux': 0, 'transcode': 0}
+
+        # 各阶段耗时统计，每次运行重新开始
+        self.timing = TimingReport()
+
+        # 本次运行中已清理过临时文件的输出目录
+        self.prepared_dirs = set()
+        self.prepared_dirs_lock = threading.Lock()
+
+        # 回调：日志消息和进度（已完成数, 总数）
+        self.log_callback = log_callback
+        self.progress_callback = progress_callback
+
+        # 取消标志，可由调用方共享
+        self.cancel_flag = cancel_flag or threading.Event()
+
+
+    def log(self, message):
+        """输出日志消息"""
+        if self.log_callback:
+            self.log_callback(message)
+
+    def report_progress(self, done, total):
+        """报告处理进度"""
+        if self.progress_callback:
+            self.progress_callback(done, total)
+
+    def run(self, input_dir, output_dir, scan_index=None):
+        """扫描、分类并处理输入目录中的所有文件
+
+        扫描、分类和提交以流水线方式进行：每扫描完一个目录就分类并提交其任务，
+        同时在途的任务数不超过 max_in_flight，内存占用与文件总数无关。
+        scan_index 为之前对同一目录的扫描结果(scanner.ScanIndex)，仍然有效时直接复用，
+        不再重新遍历目录树。返回包含 total、processed、skipped、duplicates、errors、cancelled、
+        MP4直接封装/重新编码数量(remuxed/transcoded)以及耗时汇总(timing)的运行摘要。
+        各任务的阶段耗时写入输出目录中的 livephoto_timing.csv，汇总写入 livephoto_timing.json。
+        任务状态记录在输出目录中的任务日志里，resume 为True时只处理上次作业未完成的任务。
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        self.conversion_stats = {'remux': 0, 'transcode': 0}
+        self.prepared_dirs = set()
+        self.timing = TimingReport()
+        report_path = os.path.join(output_dir, REPORT_NAME)
+        try:
+            self.timing.open_csv(report_path + ".csv")
+        except OSError as e:
+            self.log(f"无法写入耗时报告: {str(e)}")
+
+        # 输出目录中的处理清单：增量备份据此跳过未变化的任务，完整备份也会更新清单
+        manifest = BackupManifest(output_dir)
+        self.journal = JobJournal(output_dir)
+
+        # 使用线程池处理文件
+        max_workers = self.worker_count()
+        max_in_flight = self.max_in_flight or max_workers * 4
+        counts = {'total': 0, 'processed': 0, 'skipped': 0, 'duplicates': 0, 'errors': 0, 'done': 0}
+
+        if self.media_backend is not None:
+            self.log(f"媒体后端: {self.media_backend.name}（进程内处理，不支持的操作使用ffmpeg）")
+        elif self.media_backend_name != "ffmpeg":
+            self.log(f"警告: 媒体后端 {self.media_backend_name} 所需的库未安装，使用ffmpeg")
+        if self.output_format == "mp4":
+            self.log_mp4_settings()
+        if self.output_format in ANIMATION_FORMATS:
+            self.log(f"动图配置: {self.animation_profile}")
+        if self.output_format == "webp" and not self.capabilities.has_encoder("libwebp_anim"):
+            self.log("警告: 当前FFmpeg不支持WebP动图编码(libwebp_anim)，转换将会失败")
+
+        try:
+            # 目录树是否已全部遍历（被取消时为False）
+            scan = {'complete': False}
+            tasks, planned = self.job_tasks(input_dir, scan_index, counts, scan)
+
+            # 跳过源文件和设置都未变化、输出仍完整的任务
+            if self.incremental:
+                tasks = self.filter_current_tasks(tasks, manifest, counts)
+            else:
+                tasks = self.fingerprint_tasks(tasks)
+
+            # 内容相同的输入只处理一次（需要全部任务才能分组，此时无法边扫描边处理）
+            # 继续上次的作业时，任务日志中的任务已经分好组
+            if self.deduplicate and not planned:
+                tasks = list(tasks)
+                if not self.cancel_flag.is_set():
+                    self.log("正在查找重复文件...")
+                    with self.timing.run_stage('dedup'):
+                        tasks = find_duplicates(tasks, self.task_sources, self.get_file_size,
+                                                max_workers, self.cancel_flag, self.dedup_name_key)
+
+            self.log(f"使用 {max_workers} 个线程进行处理，ffmpeg共享 {self.cpu_budget.total} 个核心，"
+                     f"每个任务 {self.cpu_budget.job_threads} 个线程")
+            if self.batcher is not None and self.output_format in ('mp4', *ANIMATION_FORMATS):
+                self.log(f"合并转换: 每个ffmpeg进程最多同时转换 {self.batch_size} 个视频")
+
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                in_flight = {}
+
+                # 边扫描边提交，在途任务达到上限时先等待部分任务完成
+                for task in tasks:
+                    if self.cancel_flag.is_set():
+                        break
+
+                    while len(in_flight) >= max_in_flight and not self.cancel_flag.is_set():
+                        self.collect_finished(in_flight, manifest, counts)
+                    if self.cancel_flag.is_set():
+                        break
+
+                    self.journal.plan(self.task_sources(task)[0], self.journal_entry(task))
+                    future = executor.submit(self.process_task, task, output_dir)
+                    in_flight[future] = task
+                else:
+                    # 全部任务都已登记且目录树已遍历完，任务列表完整，之后继续作业时无需重新扫描
+                    if scan['complete']:
+                        self.journal.finish_scan()
+
+                # 处理剩余的任务
+                while in_flight and not self.cancel_flag.is_set():
+                    self.collect_finished(in_flight, manifest, counts)
+        finally:
+            manifest.close()
+            self.journal.close()
+            self.journal = None
+            self.timing.close()
+
+        if counts['duplicates']:
+            self.log(f"{counts['duplicates']} 个重复文件已链接到相同内容的输出")
+        if self.output_format == "mp4" and any(self.conversion_stats.values()):
+            self.log(f"MP4转换: {self.conversion_stats['remux']} 个直接封装，"
+                     f"{self.conversion_stats['transcode']} 个重新编码")
+        if counts['skipped']:
+            self.log(f"跳过 {counts['skipped']} 个已备份且未变化的文件")
+
+        cancelled = self.cancel_flag.is_set()
+        if cancelled:
+            self.log(f"操作已取消。已处理 {counts['processed']} 个文件，{counts['errors']} 个错误。")
+        else:
+            self.log(f"处理完成！已处理 {counts['processed']} 个文件，{counts['errors']} 个错误。")
+
+        timing = self.write_timing_report(report_path)
+
+        return {
+            'total': counts['total'],
+            'processed': counts['processed'],
+            'skipped': counts['skipped'],
+            'duplicates': counts['duplicates'],
+            'remuxed': self.conversion_stats['remux'],
+            'transcoded': self.conversion_stats['transcode'],
+            'errors': counts['errors'],
+            'cancelled': cancelled,
+            'timing': timing
+        }
+
+    def write_timing_report(self, report_path):
+        """输出耗时汇总并保存为JSON，返回汇总"""
+        timing = self.timing.summary()
+        for line in format_summary(timing):
+            self.log(line)
+
+        try:
+            self.timing.write_json(report_path + ".json", timing, extra={
+                'output_format': self.output_format,
+                'animation_profile': self.animation_profile if self.output_format in ANIMATION_FORMATS else None,
+                'mp4_profile': self.mp4_profile if self.output_format == "mp4" else None,
+                'mp4_max_resolution': self.mp4_max_resolution if self.output_format == "mp4" else None,
+                'mp4_remux': self.mp4_remux if self.output_format == "mp4" else None,
+                'threads': self.thread_count,
+                'batch_size': self.batch_size,
+                'media_backend': self.media_backend.name if self.media_backend is not None else "ffmpeg",
+                'cpu_cores': self.cpu_budget.total,
+                'job_threads': self.cpu_budget.job_threads,
+            })
+            self.log(f"耗时报告已保存: {report_path}.json / .csv")
+        except OSError as e:
+            self.log(f"无法写入耗时报告: {str(e)}")
+        return timing
+
+    def worker_count(self):
+        """处理线程数：合并转换时每个视频请求占用一个等待中的线程，至少要能凑满一批"""
+        if self.batcher is not None:
+            return max(self.thread_count, self.batch_size)
+        return self.thread_count
+
+    def job_settings(self, input_dir):
+        """作业的设置，只有设置相同时才能继续上次的作业"""
+        return json.dumps({
+            'input_dir': os.path.abspath(input_dir),
+            'settings': json.loads(self.settings_signature('livephoto')),
+            'deduplicate': self.deduplicate
+        }, sort_keys=True)
+
+    def job_tasks(self, input_dir, scan_index, counts, scan):
+        """开始新作业或继续上次的作业，返回 (任务迭代器, 任务是否来自任务日志中完整的任务列表)
+
+        任务来源完整地返回全部任务后 scan['complete'] 为True。
+        """
+        settings = self.job_settings(input_dir)
+        job = self.journal.find_resumable(settings) if self.resume else None
+        if job is None:
+            if self.resume:
+                self.log("没有可以继续的作业（已全部完成或设置不同），开始新的作业")
+            self.journal.start_job(settings)
+            return self.iter_tasks(input_dir, scan_index, counts, scan), False
+
+        self.journal.resume_job(job['id'])
+        done = job['states'].get(DONE, 0)
+        unfinished = sum(job['states'].values()) - done
+
+        if job['scan_complete']:
+            self.log(f"继续上次的作业：已完成 {done} 个任务，剩余 {unfinished} 个")
+            counts['total'] += unfinished
+            scan['complete'] = True
+            return self.journal.iter_unfinished(), True
+
+        # 上次在扫描完成前中断，重新扫描并跳过已完成的任务
+        self.log(f"继续上次的作业：已完成 {done} 个任务，重新扫描以查找其余的文件")
+        return self.skip_done_tasks(self.iter_tasks(input_dir, scan_index, counts, scan), counts), False
+
+    def skip_done_tasks(self, tasks, counts):
+        """跳过任务日志中已完成的任务"""
+        for task in tasks:
+            if self.journal.is_done(self.task_sources(task)[0]):
+                counts['total'] -= 1
+            else:
+                yield task
+
+    def journal_entry(self, task):
+        """任务在任务日志中保存的内容（可还原为任务）"""
+        entry = {key: task[key] for key in ('type', 'data', 'input_dir', 'fingerprint') if key in task}
+        if task.get('duplicates'):
+            entry['duplicates'] = [self.journal_entry(duplicate) for duplicate in task['duplicates']]
+        return entry
+
+    def iter_folders(self, input_dir, scan_index=None):
+        """逐个目录返回 (目录路径, {文件名: (大小, 修改时间)或None})"""
+        if scan_index is not None and scan_index.is_valid(input_dir):
+            self.log("目录自上次扫描后未变化，复用扫描结果")
+            for dir_path, names in scan_index.iter_folders():
+                # 目录修改时间无法反映文件内容的原地修改，复用的索引不提供文件stat
+                yield dir_path, dict.fromkeys(names)
+        else:
+            # 查找所有文件
+            self.log("正在扫描文件...")
+            walk = iter_tree(input_dir, self.cancel_flag, self.scan_workers)
+            for dir_path, _, files in self.timing.timed_iter(walk, 'scan'):
+                yield dir_path, files
+
+    def iter_tasks(self, input_dir, scan_index=None, counts=None, scan=None):
+        """边扫描边分类，逐个返回处理任务
+
+        Live Photo只在同一目录内配对，因此每个目录可独立分类，无需等待整棵树扫描完成。
+        counts 不为None时，其中的 total 随发现的任务数累加；
+        scan 不为None时，整棵目录树遍历完（未被取消）后 scan['complete'] 设为True。
+        """
+        file_counts = {'files': 0, 'live_photos': 0, 'livp_files': 0, 'images': 0, 'others': 0}
+
+        for dir_path, files in self.iter_folders(input_dir, scan_index):
+            if self.cancel_flag.is_set():
+                return
+
+            # 分类文件
+            with self.timing.run_stage('classify'):
+                file_types = self.classify_files([os.path.join(dir_path, name) for name in files])
+
+            file_counts['files'] += len(files)
+            for key in ('live_photos', 'livp_files', 'images', 'others'):
+                file_counts[key] += len(file_types[key])
+
+            # 创建处理任务，附带扫描时得到的源文件stat
+            for task in self.build_tasks(file_types, input_dir):
+                task['stats'] = {}
+                for path in self.task_sources(task):
+                    stat = files.get(os.path.basename(path))
+                    if stat is not None:
+                        task['stats'][path] = stat
+                if counts is not None:
+                    counts['total'] += 1
+                yield task
+
+        # 取消时目录遍历会提前结束，此时任务列表不完整
+        if self.cancel_flag.is_set():
+            return
+        if scan is not None:
+            scan['complete'] = True
+
+        self.log(f"找到 {file_counts['files']} 个文件")
+
+        if file_counts['live_photos']:
+            self.log(f"其中包含 {file_counts['live_photos']} 组Live Photos")
+        if file_counts['livp_files']:
+            self.log(f"其中包含 {file_counts['livp_files']} 个.livp文件")
+        if file_counts['images']:
+            self.log(f"其中包含 {file_counts['images']} 个普通图片")
+        if file_counts['others']:
+            self.log(f"其中包含 {file_counts['others']} 个其他文件")
+
+    def filter_current_tasks(self, tasks, manifest, counts):
+        """跳过清单中记录为已完成且未变化的任务"""
+        for task in tasks:
+            with self.timing.run_stage('manifest'):
+                current = self.is_task_current(manifest, task)
+            if current:
+                self.journal.mark(self.task_sources(task)[0], DONE)
+                counts['skipped'] += 1
+                counts['done'] += 1
+                self.report_progress(counts['done'], counts['total'])
+            else:
+                yield task
+
+    def fingerprint_tasks(self, tasks):
+        """完整备份不跳过任务，但仍记录源文件指纹，处理完成后写入清单供之后的增量备份使用"""
+        for task in tasks:
+            with self.timing.run_stage('manifest'):
+                self.add_fingerprint(task)
+            yield task
+
+    def collect_finished(self, in_flight, manifest, counts):
+        """等待至少一个在途任务完成并汇总其结果"""
+        finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+
+        for future in finished:
+            task = in_flight.pop(future)
+            state = DONE
+            try:
+                result = future.result()
+                if result['success']:
+                    counts['processed'] += 1
+                    self.record_task(manifest, task, result['outputs'])
+                else:
+                    counts['errors'] += 1
+                    state = FAILED
+                    self.log(f"处理失败: {result['message']}")
+            except Exception as e:
+                counts['errors'] += 1
+                state = FAILED
+                result = {}
+                self.log(f"处理任务时出错: {str(e)}")
+
+            # 重复任务的输出已链接到首个任务的输出
+            for duplicate, outputs, message in result.get('duplicates', []):
+                if outputs is not None:
+                    counts['duplicates'] += 1
+                    self.record_task(manifest, duplicate, outputs)
+                else:
+                    counts['errors'] += 1
+                    state = FAILED
+                    self.log(f"处理失败: {message}")
+
+            self.journal.mark(self.task_sources(task)[0], state)
+
+            # 更新进度
+            counts['done'] += 1 + len(task.get('duplicates', []))
+            self.report_progress(counts['done'], counts['total'])
+
+    def process_task(self, task, output_dir):
+        """处理任务，并把结果链接给内容相同的重复任务（在线程池中执行）"""
+        if self.journal is not None:
+            self.journal.mark(self.task_sources(task)[0], RUNNING)
+
+        with self.timing.task(task['type'], self.task_sources(task)[0]) as timing:
+            result = self.process_file_task(task['type'], task['data'], task['input_dir'], output_dir)
+            timing['success'] = result['success']
+
+            if task.get('duplicates'):
+                result['duplicates'] = []
+                for duplicate in task['duplicates']:
+                    if not result['success']:
+                        result['duplicates'].append((duplicate, None, result['message']))
+                        continue
+                    try:
+                        with stage('link'):
+                            outputs = self.link_duplicate_outputs(task, duplicate, result, output_dir)
+                        result['duplicates'].append((duplicate, outputs, None))
+                    except Exception as e:
+                        result['duplicates'].append((duplicate, None, str(e)))
+
+        return result
+
+    def link_duplicate_outputs(self, task, duplicate, result, output_dir):
+        """为重复任务创建指向已有输出的硬链接，返回重复任务的输出路径
+
+        输出文件名按处理时的规则由重复任务的源文件生成：Live Photo、普通图片和其他文件的输出
+        都以源文件命名；.livp只有原样复制的输出（result['source_copies']）以.livp文件命名，
+        从包内成员生成的输出以成员命名，内容相同的.livp成员名也相同，文件名不变。
+        """
+        duplicate_sources = self.task_sources(duplicate)
+        target_dir = self.get_target_dir(duplicate_sources[0], duplicate['input_dir'], output_dir)
+        if task['type'] == 'livp':
+            source_named = result.get('source_copies', [])
+        else:
+            source_named = result['outputs']
+
+        duplicate_outputs = []
+        for output_path in result['outputs']:
+            name = os.path.basename(output_path)
+            if output_path in source_named:
+                name = self.source_output_name(task, duplicate, name)
+            duplicate_output = os.path.join(target_dir, name)
+            link_or_copy(output_path, duplicate_output)
+            duplicate_outputs.append(duplicate_output)
+
+        return duplicate_outputs
+
+    def source_output_name(self, task, duplicate, name):
+        """以源文件命名的输出在重复任务中的文件名
+
+        原样复制的源文件保持源文件名；Live Photo的转换输出和新建的LIVP以图片的文件名（不含扩展名）
+        加输出扩展名命名（与 process_live_photo 相同）。
+        """
+        sources = self.task_sources(task)
+        duplicate_sources = self.task_sources(duplicate)
+        for source, duplicate_source in zip(sources, duplicate_sources):
+            if name == os.path.basename(source):
+                return os.path.basename(duplicate_source)
+
+        stem = os.path.splitext(os.path.basename(sources[0]))[0]
+        duplicate_stem = os.path.splitext(os.path.basename(duplicate_sources[0]))[0]
+        return duplicate_stem + name[len(stem):]
+
+    def dedup_name_key(self, task):
+        """新建的LIVP文件内记录了源文件名，此时只有文件名也相同的Live Photo才视为重复"""
+        if task['type'] == 'livephoto' and self.preserve_livp:
+            return tuple(os.path.basename(path) for path in self.task_sources(task))
+        return None
+
+    def record_task(self, manifest, task, outputs):
+        """在清单中记录已完成的任务"""
+        if manifest is not None and 'fingerprint' in task:
+            manifest.record(self.task_sources(task)[0], task['fingerprint'],
+                            self.settings_signature(task['type']), outputs)
+
+    def get_file_size(self, path):
+        """返回文件大小"""
+        return os.path.getsize(path)
+
+    def task_sources(self, task):
+        """返回任务的源文件列表，第一个为清单中的键"""
+        if task['type'] == 'livephoto':
+            return [task['data']['image'], task['data']['video']]
+        return [task['data']]
+
+    def settings_signature(self, file_type):
+        """返回影响该类任务输出的设置，用于判断清单记录是否仍然适用"""
+        settings = {'preserve_structure': self.preserve_structure}
+        if file_type in ('livephoto', 'livp'):
+            settings['output_format'] = self.output_format
+            settings['preserve_livp'] = self.preserve_livp
+            if self.output_format == "mp4":
+                settings['mp4_remux'] = self.mp4_remux
+                # 默认配置与之前固定的编码参数相同，不写入签名，已有的清单记录仍然有效
+                if self.mp4_profile != DEFAULT_MP4_PROFILE:
+                    settings['mp4_profile'] = self.mp4_profile
+                if self.mp4_max_resolution:
+                    settings['mp4_max_resolution'] = self.mp4_max_resolution
+            if self.output_format in ANIMATION_FORMATS:
+                settings['animation_profile'] = self.animation_profile
+        return json.dumps(settings, sort_keys=True)
+
+    def is_task_current(self, manifest, task):
+        """检查任务是否已按当前设置处理过；同时把源文件指纹记录到任务中"""
+        if not self.add_fingerprint(task):
+            return False
+        return manifest.is_current(self.task_sources(task)[0], task['fingerprint'],
+                                   self.settings_signature(task['type']))
+
+    def add_fingerprint(self, task):
+        """把源文件指纹记录到任务中，无法读取源文件时返回False"""
+        try:
+            task['fingerprint'] = file_fingerprint(self.task_sources(task), task.get('stats', {}).get)
+        except OSError:
+            return False
+        return True
+
+    def build_tasks(self, file_types, input_dir):
+        """根据分类结果创建处理任务列表"""
+        task_queue = []
+
+        # 添加Live Photos处理任务
+        for live_photo in file_types['live_photos']:
+            task_queue.append({'type': 'livephoto', 'data': live_photo, 'input_dir': input_dir})
+
+        # 添加.livp文件处理任务
+        for livp_file in file_types['livp_files']:
+            task_queue.append({'type': 'livp', 'data': livp_file, 'input_dir': input_dir})
+
+        # 添加普通图片处理任务
+        for image_file in file_types['images']:
+            task_queue.append({'type': 'image', 'data': image_file, 'input_dir': input_dir})
+
+        # 添加其他文件处理任务
+        for other_file in file_types['others']:
+            task_queue.append({'type': 'other', 'data': other_file, 'input_dir': input_dir})
+
+        return task_queue
+
+    def get_target_dir(self, source_file, input_dir, output_dir):
+        """确定源文件对应的输出目录并确保其存在"""
+        rel_path = os.path.relpath(os.path.dirname(source_file), input_dir) if self.preserve_structure else ""
+        target_dir = os.path.join(output_dir, rel_path)
+        os.makedirs(target_dir, exist_ok=True)
+        self.prepare_target_dir(target_dir)
+        return target_dir
+
+    def prepare_target_dir(self, target_dir):
+        """首次写入输出目录时，删除之前被终止的运行留下的临时文件"""
+        with self.prepared_dirs_lock:
+            if target_dir in self.prepared_dirs:
+                return
+            self.prepared_dirs.add(target_dir)
+
+        removed = remove_stale_partials(target_dir)
+        if removed:
+            self.log(f"已删除 {removed} 个中断时未写完的临时文件: {target_dir}")
+
+    def process_file_task(self, file_type, file_data, input_dir, output_dir):
+        """处理单个文件任务（在线程池中执行）
+
+        返回结果字典，成功时 outputs 为本任务写出的文件路径列表。
+        """
+        outputs = []
+        try:
+            if self.cancel_flag.is_set():
+                return {'success': False, 'message': "操作已取消"}
+
+            if file_type == 'livephoto':
+                # 处理Live Photo
+                image_file = file_data['image']
+                video_file = file_data['video']
+                target_dir = self.get_target_dir(image_file, input_dir, output_dir)
+
+                success = self.process_live_photo(image_file, video_file, target_dir, outputs)
+                if success:
+                    return {'success': True, 'outputs': outputs}
+                else:
+                    return {'success': False, 'message': f"处理Live Photo失败: {os.path.basename(image_file)}"}
+
+            elif file_type == 'livp':
+                # 处理.livp文件
+                livp_file = file_data
+                target_dir = self.get_target_dir(livp_file, input_dir, output_dir)
+
+                source_copies = []
+                success = self.process_livp_file(livp_file, target_dir, outputs, source_copies)
+                if success:
+                    return {'success': True, 'outputs': outputs, 'source_copies': source_copies}
+                else:
+                    return {'success': False, 'message': f"处理.livp文件失败: {os.path.basename(livp_file)}"}
+
+            elif file_type in ('image', 'other'):
+                # 普通图片和其他文件直接复制
+                source_file = file_data
+                target_dir = self.get_target_dir(source_file, input_dir, output_dir)
+
+                target_file = os.path.join(target_dir, os.path.basename(source_file))
+                with stage('copy'):
+                    atomic_copy(source_file, target_file)
+                return {'success': True, 'outputs': [target_file]}
+
+            return {'success': False, 'message': f"未知文件类型: {file_type}"}
+
+        except Exception as e:
+            return {'success': False, 'message': str(e)}
+
+    def scan_all_files(self, directory):
+        """递归扫描目录中的所有文件"""
+        return scan_tree(directory, self.cancel_flag, workers=self.scan_workers).all_files()
+
+    def classify_files(self, files):
+        """将文件分为Live Photos、.livp文件、普通图片和其他文件"""
+        # 初始化结果分类
+        result = {
+            'live_photos': [],  # 包含图片和视频路径的字典列表
+            'livp_files': [],   # .livp文件路径列表
+            'images': [],       # 普通图片路径列表
+            'others': []        # 其他文件路径列表
+        }
+
+        # 先收集所有图片和视频文件
+        images = []
+        videos = []
+
+        for file_path in files:
+            ext = os.path.splitext(file_path)[1].lower()
+
+            if ext == '.livp':
+                result['livp_files'].append(file_path)
+            elif ext in IMAGE_EXTENSIONS:
+                images.append(file_path)
+            elif ext in VIDEO_EXTENSIONS:
+                videos.append(file_path)
+            else:
+                result['others'].append(file_path)
+
+        # 配对Live Photos（哈希索引，线性时间）
+        live_photos, unpaired_images, unpaired_videos = pair_live_photos(images, videos)
+        result['live_photos'] = live_photos
+        result['images'] = unpaired_images
+
+        # 添加未匹配的视频到其他文件
+        result['others'].extend(unpaired_videos)
+
+        return result
+
+    def process_live_photo(self, image_file, video_file, target_dir, outputs=None):
+        """处理单个Live Photo，成功写出的文件路径追加到outputs"""
+        if outputs is None:
+            outputs = []
+
+        try:
+            output_format = self.output_format
+            filename = os.path.basename(image_file)
+            name_no_ext = os.path.splitext(filename)[0]
+
+            # 如果需要保留/创建LIVP文件
+            if self.preserve_livp:
+                livp_file = os.path.join(target_dir, f"{name_no_ext}.livp")
+                if not self.create_livp_file(image_file, video_file, livp_file):
+                    # 没有写出要求的LIVP时任务记为失败，不写入清单，下次运行会重新处理
+                    return False
+                outputs.append(livp_file)
+
+            if output_format == "original":
+                # 仅复制原始文件
+                target_image = os.path.join(target_dir, filename)
+                target_video = os.path.join(target_dir, os.path.basename(video_file))
+
+                with stage('copy'):
+                    atomic_copy(image_file, target_image)
+                    atomic_copy(video_file, target_video)
+                outputs.extend([target_image, target_video])
+
+                return True
+
+            elif output_format == "mp4":
+                # 转换为MP4
+                target_file = os.path.join(target_dir, f"{name_no_ext}.mp4")
+                success = self.convert_to_mp4(video_file, target_file)
+
+            elif output_format == "gif":
+                # 转换为GIF
+                target_file = os.path.join(target_dir, f"{name_no_ext}.gif")
+                success = self.convert_to_gif(video_file, target_file)
+
+            elif output_format == "webp":
+                # 转换为WebP动图
+                target_file = os.path.join(target_dir, f"{name_no_ext}.webp")
+                success = self.convert_to_webp(video_file, target_file)
+
+            elif output_format == "jpg":
+                # 仅保存静态图像
+                target_file = os.path.join(target_dir, f"{name_no_ext}.jpg")
+
+                # 如果原图是HEIC，需要转换为JPG
+                if image_file.lower().endswith('.heic'):
+                    success = self.convert_heic_to_jpg(image_file, target_file)
+                else:
+                    with stage('copy'):
+                        atomic_copy(image_file, target_file)
+                    success = True
+
+            else:
+                return False
+
+            if success:
+                outputs.append(target_file)
+            return success
+
+        except Exception as e:
+            self.log(f"处理 Live Photo 时出错: {str(e)}")
+            return False
+
+    def create_livp_file(self, image_file, video_file, output_livp, source_zip=None):
+        """从图片和视频创建LIVP文件（source_zip不为None时从该ZIP的成员创建）"""
+        try:
+            # 源文件直接流式写入ZIP，不经过临时目录
+            with stage('livp'):
+                write_livp(image_file, video_file, output_livp, source_zip=source_zip)
+
+            self.log(f"已创建LIVP文件: {os.path.basename(output_livp)}")
+            return True
+
+        except Exception as e:
+            self.log(f"创建LIVP文件时出错: {str(e)}")
+            return False
+
+    def process_livp_file(self, livp_path, target_dir, outputs=None, source_copies=None):
+        """处理.livp文件，按输出格式只读取需要的成员，成功写出的文件路径追加到outputs
+
+        原样复制的.livp文件（以.livp文件命名，其他输出以包内成员命名）另外追加到 source_copies。
+        """
+        if outputs is None:
+            outputs = []
+        if source_copies is None:
+            source_copies = []
+
+        try:
+            try:
+                # 尝试以ZIP格式打开.livp文件（只读取中央目录，不解压成员）
+                with stage('zip'):
+                    zip_ref = zipfile.ZipFile(livp_path, 'r')
+                with zip_ref:
+                    image_member, video_member = find_livp_members(zip_ref)
+
+                    # 如果找到了图片和视频，则按照Live Photo处理
+                    if image_member and video_member:
+                        if self.output_format == "original":
+                            # 复制原始.livp文件
+                            return self.copy_livp_file(livp_path, target_dir, outputs, source_copies)
+
+                        # 按照指定格式处理
+                        return self.process_livp_members(livp_path, zip_ref, image_member, video_member,
+                                                         target_dir, outputs)
+
+                    # 如果只找到了图片
+                    if image_member:
+                        target_file = os.path.join(target_dir, os.path.basename(image_member))
+                        with stage('zip'):
+                            extract_member(zip_ref, image_member, target_file)
+                        outputs.append(target_file)
+                        return True
+
+                    # 无法提取内容，只复制原始文件
+                    return self.copy_livp_file(livp_path, target_dir, outputs, source_copies)
+
+            except zipfile.BadZipFile:
+                # 如果不是ZIP格式，复制原始文件
+                return self.copy_livp_file(livp_path, target_dir, outputs, source_copies)
+
+        except Exception as e:
+            return False
+
+    def copy_livp_file(self, livp_path, target_dir, outputs, source_copies):
+        """原样复制.livp文件"""
+        target_file = os.path.join(target_dir, os.path.basename(livp_path))
+        with stage('copy'):
+            atomic_copy(livp_path, target_file)
+        outputs.append(target_file)
+        source_copies.append(target_file)
+        return True
+
+    def process_livp_members(self, livp_path, zip_ref, image_member, video_member, target_dir, outputs):
+        """直接从.livp成员生成输出（与process_live_photo的输出一致）"""
+        try:
+            output_format = self.output_format
+            name_no_ext = os.path.splitext(os.path.basename(image_member))[0]
+
+            # 如果需要保留/创建LIVP文件，成员直接从原ZIP流式写入
+            if self.preserve_livp:
+                livp_file = os.path.join(target_dir, f"{name_no_ext}.livp")
+                if not self.create_livp_file(image_member, video_member, livp_file, source_zip=zip_ref):
+                    # 没有写出要求的LIVP时任务记为失败，不写入清单，下次运行会重新处理
+                    return False
+                outputs.append(livp_file)
+
+            if output_format == "mp4":
+                target_file = os.path.join(target_dir, f"{name_no_ext}.mp4")
+                with self.member_input(livp_path, zip_ref, video_member) as (video_path, data_range):
+                    success = self.convert_to_mp4(video_path, target_file, data_range)
+
+            elif output_format == "gif":
+                target_file = os.path.join(target_dir, f"{name_no_ext}.gif")
+                with self.member_input(livp_path, zip_ref, video_member) as (video_path, data_range):
+                    success = self.convert_to_gif(video_path, target_file, data_range)
+
+            elif output_format == "webp":
+                target_file = os.path.join(target_dir, f"{name_no_ext}.webp")
+                with self.member_input(livp_path, zip_ref, video_member) as (video_path, data_range):
+                    success = self.convert_to_webp(video_path, target_file, data_range)
+
+            elif output_format == "jpg":
+                target_file = os.path.join(target_dir, f"{name_no_ext}.jpg")
+
+                # 如果原图是HEIC，需要转换为JPG
+                if image_member.lower().endswith('.heic'):
+                    success = self.convert_heic_member_to_jpg(livp_path, zip_ref, image_member, target_file)
+                else:
+                    with stage('zip'):
+                        extract_member(zip_ref, image_member, target_file)
+                    success = True
+
+            else:
+                return False
+
+            if success:
+                outputs.append(target_file)
+            return success
+
+        except Exception as e:
+            self.log(f"处理 Live Photo 时出错: {str(e)}")
+            return False
+
+    @contextmanager
+    def member_input(self, livp_path, zip_ref, member):
+        """为ffmpeg提供.livp成员的输入，返回 (路径, 字节范围)
+
+        未压缩的成员直接按字节范围读取.livp文件；压缩或加密的成员才解压到临时文件，此时字节范围为None。
+        """
+        data_range = member_data_range(livp_path, zip_ref.getinfo(member))
+        if data_range is not None:
+            yield livp_path, data_range
+            return
+
+        fd, temp_path = tempfile.mkstemp(prefix="livp_", suffix=os.path.splitext(member)[1])
+        os.close(fd)
+        try:
+            with stage('zip'):
+                extract_member(zip_ref, member, temp_path)
+            yield temp_path, None
+        finally:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def can_remux(self, video_path, data_range=None):
+        """判断视频能否不经重新编码直接封装为MP4"""
+        with stage('probe'):
+            codecs = probe_codecs(video_path, self.ffprobe_path, data_range, self.media_backend)
+        if codecs is None:
+            return None
+        if codecs['video'] in REMUX_VIDEO_CODECS and codecs['audio'] in REMUX_AUDIO_CODECS:
+            return codecs
+        return None
+
+    def remux_to_mp4(self, video_path, output_file, codecs):
+        """直接复制音视频流封装为MP4（不重新编码）"""
+        args = ["-c", "copy"]
+        if codecs['video'] == 'hevc':
+            # 苹果设备只识别hvc1标签的HEVC
+            args.extend(["-tag:v", "hvc1"])
+        args.extend(["-movflags", "+faststart"])
+
+        if self.run_in_process(lambda path, threads: self.media_backend.remux(video_path, path, codecs),
+                               output_file, video_path):
+            return True
+        return self.run_clip(video_path, args, output_file, MP4_STREAMS)
+
+    def count_conversion(self, kind):
+        """统计MP4直接封装与重新编码的数量"""
+        with self.stats_lock:
+            self.conversion_stats[kind] += 1
+
+    def convert_to_mp4(self, video_path, output_file, data_range=None):
+        """将视频文件转换为MP4格式（data_range不为None时只读取文件中的这段字节）"""
+        try:
+            input_path = subfile_url(video_path, data_range) if data_range else video_path
+
+            # 编码已兼容时直接封装，失败则回退到重新编码（需要缩小分辨率时只能重新编码）
+            if self.mp4_remux and not self.mp4_max_resolution:
+                codecs = self.can_remux(video_path, data_range)
+                if codecs and self.remux_to_mp4(input_path, output_file, codecs):
+                    self.count_conversion('remux')
+                    return True
+
+            success = self.transcode_to_mp4(input_path, output_file)
+            if success:
+                self.count_conversion('transcode')
+            return success
+
+        except Exception as e:
+            return False
+
+    def ffmpeg_command(self, clips, threads):
+        """构建限定线程数的ffmpeg命令，clips 为 [(ClipRequest, 输出路径)]
+
+        每段视频的解码、滤镜和编码均使用 threads 个线程。多段视频时每个输出只映射对应输入的流、
+        元数据和章节，与单独转换时的默认行为相同，因此输出与单独转换完全一致。
+        """
+        cmd = [self.ffmpeg_path]
+        for request, _ in clips:
+            cmd.extend(["-threads", str(threads), "-i", request.input_path])
+        cmd.extend(["-filter_threads", str(threads)])
+
+        for index, (request, output_path) in enumerate(clips):
+            if request.streams is not None:
+                for spec in request.streams:
+                    cmd.extend(["-map", f"{index}:{spec}"])
+                cmd.extend(["-map_metadata", str(index), "-map_chapters", str(index)])
+            cmd.extend([*request.output_args, "-threads", str(threads), "-y", output_path])
+        return cmd
+
+    def run_ffmpeg(self, input_path, output_args, output_file, streams=None):
+        """在CPU预算内运行ffmpeg，返回是否成功（输出先写入临时文件，成功后才重命名为output_file）"""
+        request = ClipRequest(input_path, output_args, output_file, streams)
+        self.execute_clips([request])
+        add_stage('cpu_wait', request.cpu_wait)
+        add_stage('ffmpeg', request.ffmpeg_seconds)
+        return request.success
+
+    def run_clip(self, input_path, output_args, output_file, streams):
+        """转换一段视频；启用合并转换时与其他处理线程的视频交给同一个ffmpeg进程"""
+        if self.batcher is None:
+            return self.run_ffmpeg(input_path, output_args, output_file, streams)
+
+        request = ClipRequest(input_path, output_args, output_file, streams)
+        success = self.batcher.run(request)
+        add_stage('batch_wait', request.batch_wait)
+        add_stage('cpu_wait', request.cpu_wait)
+        add_stage('ffmpeg', request.ffmpeg_seconds)
+        return success
+
+    def run_clip_batch(self, batch):
+        """用一个ffmpeg进程转换一批视频；失败时逐个重新转换，只把出错的视频记为失败"""
+        if self.execute_clips(batch) or len(batch) == 1:
+            return
+
+        self.log(f"合并转换 {len(batch)} 个视频失败，逐个重新转换以确定出错的文件")
+        for request in batch:
+            self.execute_clips([request])
+
+    def execute_clips(self, batch):
+        """在CPU预算内运行一个ffmpeg进程转换 batch 中的视频，设置各请求的结果和耗时
+
+        每段视频按单独转换时的方式分配线程。全部成功时返回True；
+        ffmpeg失败时这一批的输出都不保留，各请求的 success 为False。
+        """
+        waiting = time.perf_counter()
+        with self.cpu_budget.allocate(len(batch)) as threads, ExitStack() as stack:
+            started = time.perf_counter()
+            outputs = [stack.enter_context(AtomicOutput(request.output_file)) for request in batch]
+
+            cmd = self.ffmpeg_command(list(zip(batch, [output.path for output in outputs])), threads)
+            success = run_command(cmd).returncode == 0
+
+            # 进程耗时平均分摊到这一批的各段视频，其余时间是在等待同一进程中的其他视频，计入等待合批
+            elapsed = time.perf_counter() - started
+            share = elapsed / len(batch)
+            for request, output in zip(batch, outputs):
+                request.cpu_wait += started - waiting
+                request.ffmpeg_seconds += share
+                request.batch_wait += elapsed - share
+                request.success = False
+                if success:
+                    try:
+                        output.commit()
+                        request.success = True
+                    except OSError:
+                        pass
+        return all(request.success for request in batch)
+
+    def run_in_process(self, operation, output_file, source):
+        """在CPU预算内用进程内媒体后端生成 output_file，成功时返回True
+
+        operation(临时输出路径, 线程数) 执行实际处理。没有进程内后端、后端不支持该操作或处理失败时
+        返回False，由调用方改用ffmpeg子进程；失败原因（libav的错误信息）写入日志。
+        """
+        if self.media_backend is None:
+            return False
+
+        waiting = time.perf_counter()
+        try:
+            with self.cpu_budget.allocate() as threads, AtomicOutput(output_file) as output:
+                add_stage('cpu_wait', time.perf_counter() - waiting)
+                with stage('ffmpeg'):
+                    operation(output.path, threads)
+                output.commit()
+                return True
+        except UnsupportedOperation:
+            return False
+        except Exception as e:
+            self.log(f"{self.media_backend.name} 处理 {os.path.basename(source)} 失败，改用ffmpeg: {str(e)}")
+            return False
+
+    def software_encoder(self):
+        """返回MP4配置中第一个已编译的软件编码器及其参数（都未编译时返回第一个，由ffmpeg报告错误）"""
+        encoders = MP4_PROFILES[self.mp4_profile]['encoders']
+        for encoder, args in encoders:
+            if self.capabilities.has_encoder(encoder):
+                return encoder, args
+        return encoders[0]
+
+    def gpu_encoder(self):
+        """返回可用的H.264硬件编码器；未启用GPU或MP4配置不使用硬件编码时返回None"""
+        if not self.use_gpu or not MP4_PROFILES[self.mp4_profile]['gpu']:
+            return None
+        # 只使用测试编码成功且运行中没有失败过的硬件编码器
+        return self.capabilities.pick_encoder(GPU_H264_ENCODERS)
+
+    def log_mp4_settings(self):
+        """输出MP4编码配置和实际使用的编码器"""
+        encoder, _ = self.software_encoder()
+        if not self.capabilities.has_encoder(encoder):
+            self.log(f"警告: 当前FFmpeg不支持MP4配置 {self.mp4_profile} 所需的编码器 {encoder}，转换将会失败")
+
+        gpu_encoder = self.gpu_encoder()
+        if gpu_encoder:
+            encoder = gpu_encoder
+        elif self.use_gpu and MP4_PROFILES[self.mp4_profile]['gpu']:
+            self.log(f"没有可用的硬件编码器，使用CPU编码({encoder})")
+        elif self.use_gpu:
+            self.log(f"MP4配置 {self.mp4_profile} 不使用硬件编码器")
+
+        resolution = f"，最大分辨率 {self.mp4_max_resolution}p" if self.mp4_max_resolution else ""
+        self.log(f"MP4编码配置: {self.mp4_profile}（{encoder}）{resolution}")
+
+    def transcode_to_mp4(self, video_path, output_file):
+        """按MP4配置重新编码视频"""
+        try:
+            profile = MP4_PROFILES[self.mp4_profile]
+            scale_args = max_resolution_args(self.mp4_max_resolution)
+
+            encoder = self.gpu_encoder()
+            if encoder:
+                gpu_args = [
+                    *scale_args,
+                    "-c:v", encoder, *GPU_ENCODER_ARGS[encoder],
+                    *profile['audio'], "-movflags", "+faststart"
+                ]
+                # 硬件编码器的并发会话数有限，不参与合并转换
+                if self.run_ffmpeg(video_path, gpu_args, output_file, MP4_STREAMS):
+                    return True
+                # 如果GPU加速失败，回退到CPU
+
+            # 软件编码优先在进程内完成
+            success = self.run_in_process(
+                lambda path, threads: self.media_backend.transcode(video_path, path, profile,
+                                                                   self.mp4_max_resolution, threads),
+                output_file, video_path)
+            if not success:
+                cpu_encoder, encoder_args = self.software_encoder()
+                cpu_args = [
+                    *scale_args,
+                    "-c:v", cpu_encoder, *encoder_args,
+                    *profile['audio'], "-movflags", "+faststart"
+                ]
+                success = self.run_clip(video_path, cpu_args, output_file, MP4_STREAMS)
+
+            # CPU编码成功说明是硬件编码器的问题（而非输入文件），后续任务不再尝试
+            if encoder and success and self.capabilities.mark_failed(encoder):
+                self.log(f"硬件编码器 {encoder} 运行失败，后续任务改用CPU编码")
+            return success
+
+        except Exception as e:
+            return False
+
+    def convert_to_gif(self, video_path, output_file, data_range=None):
+        """将视频文件转换为GIF格式（data_range不为None时只读取文件中的这段字节）"""
+        try:
+            input_path = subfile_url(video_path, data_range) if data_range else video_path
+
+            # 按动图配置选择帧率、尺寸、调色板和抖动方式
+            profile = ANIMATION_PROFILES[self.animation_profile]
+            if self.run_in_process(lambda path, threads: self.media_backend.animate(input_path, path, "gif",
+                                                                                    profile, threads),
+                                   output_file, video_path):
+                return True
+            return self.run_clip(input_path, gif_args(profile), output_file, VIDEO_STREAMS)
+
+        except Exception as e:
+            return False
+
+    def convert_to_webp(self, video_path, output_file, data_range=None):
+        """将视频文件转换为WebP动图（data_range不为None时只读取文件中的这段字节）"""
+        try:
+            input_path = subfile_url(video_path, data_range) if data_range else video_path
+            profile = ANIMATION_PROFILES[self.animation_profile]
+            if self.run_in_process(lambda path, threads: self.media_backend.animate(input_path, path, "webp",
+                                                                                    profile, threads),
+                                   output_file, video_path):
+                return True
+            return self.run_clip(input_path, webp_args(profile), output_file, VIDEO_STREAMS)
+
+        except Exception as e:
+            return False
+
+    def convert_heic_member_to_jpg(self, livp_path, zip_ref, member, jpg_path):
+        """将.livp中的HEIC成员转换为JPG格式（Pillow直接读取成员，不解压到临时目录）"""
+        try:
+            with stage('heic'), zip_ref.open(member) as source, AtomicOutput(jpg_path) as output:
+                img = Image.open(source)
+                img.save(output.path, "JPEG", quality=95)
+                output.commit()
+            return True
+
+        except Exception as e:
+            try:
+                # 如果PIL失败，由ffmpeg读取成员
+                with self.member_input(livp_path, zip_ref, member) as (heic_path, data_range):
+                    input_path = subfile_url(heic_path, data_range) if data_range else heic_path
+                    if self.extract_jpg_in_process(input_path, jpg_path, livp_path):
+                        return True
+                    return self.run_ffmpeg(input_path, ["-q:v", "2"], jpg_path)
+
+            except Exception as e2:
+                return False
+
+    def convert_heic_to_jpg(self, heic_path, jpg_path):
+        """将HEIC文件转换为JPG格式"""
+        try:
+            # 尝试使用PIL/Pillow转换
+            with stage('heic'), AtomicOutput(jpg_path) as output:
+                img = Image.open(heic_path)
+                img.save(output.path, "JPEG", quality=95)
+                output.commit()
+            return True
+
+        except Exception as e:
+            try:
+                # 如果PIL失败，尝试使用进程内媒体后端或ffmpeg
+                # 如果ffmpeg也失败，记录错误但不抛出异常
+                if self.extract_jpg_in_process(heic_path, jpg_path, heic_path):
+                    return True
+                return self.run_ffmpeg(heic_path, ["-q:v", "2"], jpg_path)
+
+            except Exception as e2:
+                # 如果所有方法都失败，记录错误
+                return False
+
+    def extract_jpg_in_process(self, input_path, jpg_path, source):
+        """用进程内媒体后端解码图像并保存为JPG（与Pillow转换的质量相同），成功时返回True"""
+        def save_frame(path, threads):
+            self.media_backend.extract_frame(input_path).save(path, "JPEG", quality=95)
+
+        return self.run_in_process(save_frame, jpg_path, source)
@@ -0,0 +1,155 @@
+"""任务日志 - 保存在输出目录中的SQLite数据库，用于中断后继续处理
+
+记录最近一次运行（作业）的设置以及每个任务的状态：planned（已计划）、running（处理中）、
+done（已完成）、failed（失败）。扫描完成后还会标记作业的任务列表已完整。
+程序被关闭、终止或取消后，继续运行只处理上次未完成或失败的任务；任务列表完整时无需重新扫描目录树。
+数据库使用WAL模式并按时间间隔提交，进程被终止时最多丢失最近一两秒的状态，这些任务会被重新处理。
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+
+JOURNAL_NAME = ".livephoto_journal.sqlite"
+
+# 两次提交之间的最长间隔（秒）
+COMMIT_SECONDS = 1.0
+# 继续作业时每次读取的任务数
+READ_BATCH = 1000
+
+PLANNED = "planned"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobJournal:
+    """任务日志（可在多个处理线程中同时更新）"""
+
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, JOURNAL_NAME)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY,"
+            " settings TEXT NOT NULL,"
+            " scan_complete INTEGER NOT NULL DEFAULT 0,"
+            " started REAL NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            " job INTEGER NOT NULL,"
+            " source TEXT NOT NULL,"
+            " task TEXT NOT NULL,"
+            " state TEXT NOT NULL,"
+            " updated REAL NOT NULL,"
+            " PRIMARY KEY (job, source))"
+        )
+        self.conn.commit()
+        self.job_id = None
+        self.last_commit = time.monotonic()
+
+    def find_resumable(self, settings):
+        """查找设置相同且尚未全部完成的上一个作业，返回 {'id', 'scan_complete', 'states'} 或None
+
+        states 为各状态的任务数。
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT id, settings, scan_complete FROM jobs ORDER BY id DESC LIMIT 1"
+            ).fetchone()
+            if row is None or row[1] != settings:
+                return None
+
+            states = dict(self.conn.execute(
+                "SELECT state, COUNT(*) FROM tasks WHERE job = ? GROUP BY state", (row[0],)
+            ).fetchall())
+
+        unfinished = sum(count for state, count in states.items() if state != DONE)
+        if row[2] and not unfinished:
+            return None
+        return {'id': row[0], 'scan_complete': bool(row[2]), 'states': states}
+
+    def start_job(self, settings):
+        """开始新的作业（只保留最近一个作业的记录）"""
+        with self.lock:
+            self.conn.execute("DELETE FROM tasks")
+            self.conn.execute("DELETE FROM jobs")
+            cursor = self.conn.execute(
+                "INSERT INTO jobs (settings, started) VALUES (?, ?)", (settings, time.time())
+            )
+            self.job_id = cursor.lastrowid
+            self.commit_locked()
+
+    def resume_job(self, job_id):
+        """继续之前的作业"""
+        with self.lock:
+            self.job_id = job_id
+
+    def plan(self, source, task):
+        """登记计划处理的任务（已登记的任务保持原状态）"""
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO tasks (job, source, task, state, updated) VALUES (?, ?, ?, ?, ?)",
+                (self.job_id, os.path.abspath(source), json.dumps(task), PLANNED, time.time())
+            )
+            self.maybe_commit()
+
+    def mark(self, source, state):
+        """更新任务状态"""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE tasks SET state = ?, updated = ? WHERE job = ? AND source = ?",
+                (state, time.time(), self.job_id, os.path.abspath(source))
+            )
+            self.maybe_commit()
+
+    def is_done(self, source):
+        """任务在当前作业中是否已完成"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT state FROM tasks WHERE job = ? AND source = ?",
+                (self.job_id, os.path.abspath(source))
+            ).fetchone()
+        return row is not None and row[0] == DONE
+
+    def iter_unfinished(self):
+        """按计划顺序逐个返回当前作业中未完成或失败的任务（分批读取）"""
+        last_rowid = 0
+        while True:
+            with self.lock:
+                rows = self.conn.execute(
+                    "SELECT rowid, task FROM tasks WHERE job = ? AND state != ? AND rowid > ?"
+                    " ORDER BY rowid LIMIT ?",
+                    (self.job_id, DONE, last_rowid, READ_BATCH)
+                ).fetchall()
+            if not rows:
+                return
+            for last_rowid, task in rows:
+                yield json.loads(task)
+
+    def finish_scan(self):
+        """作业的任务列表已完整（目录树已全部扫描）"""
+        with self.lock:
+            self.conn.execute("UPDATE jobs SET scan_complete = 1 WHERE id = ?", (self.job_id,))
+            self.commit_locked()
+
+    def maybe_commit(self):
+        if time.monotonic() - self.last_commit >= COMMIT_SECONDS:
+            self.commit_locked()
+
+    def commit_locked(self):
+        self.conn.commit()
+        self.last_commit = time.monotonic()
+
+    def close(self):
+        """提交并关闭数据库"""
+        with self.lock:
+            try:
+                self.commit_locked()
+            finally:
+                self.conn.close()
@@ -0,0 +1,115 @@
+"""LIVP文件读写 - LIVP实际上是包含图片、视频和metadata.json的ZIP文件
+
+写入时源文件直接流式写入ZIP（ZIP_STORED，媒体本身已压缩），不经过临时目录，
+先写入同目录下的临时文件，完成后原子替换为目标文件。
+读取时不解压到临时目录：未压缩的成员可按字节范围直接交给ffmpeg，其余成员以文件对象流式读取。
+"""
+import os
+import json
+import time
+import shutil
+import struct
+import zipfile
+
+from outputs import AtomicOutput
+
+LIVP_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.heic', '.png')
+LIVP_VIDEO_EXTENSIONS = ('.mov',)
+
+# 流式复制的缓冲区大小
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def add_file_to_zip(zipf, source_file, arcname):
+    """把源文件流式写入ZIP（不压缩）"""
+    info = zipfile.ZipInfo.from_file(source_file, arcname)
+    info.compress_type = zipfile.ZIP_STORED
+    force_zip64 = info.file_size > zipfile.ZIP64_LIMIT
+
+    with open(source_file, 'rb') as source, zipf.open(info, 'w', force_zip64=force_zip64) as target:
+        shutil.copyfileobj(source, target, COPY_BUFFER_SIZE)
+
+
+def add_member_to_zip(zipf, source_zip, member, arcname):
+    """把另一个ZIP中的成员流式写入ZIP（不压缩）"""
+    source_info = source_zip.getinfo(member)
+    info = zipfile.ZipInfo(arcname, date_time=source_info.date_time)
+    info.compress_type = zipfile.ZIP_STORED
+    info.external_attr = source_info.external_attr
+    info.file_size = source_info.file_size
+    force_zip64 = info.file_size > zipfile.ZIP64_LIMIT
+
+    with source_zip.open(member) as source, zipf.open(info, 'w', force_zip64=force_zip64) as target:
+        shutil.copyfileobj(source, target, COPY_BUFFER_SIZE)
+
+
+def find_livp_members(zip_ref):
+    """查找LIVP中的图片和视频成员，返回 (图片成员名, 视频成员名)，不存在时为None"""
+    image_member = None
+    video_member = None
+    for name in zip_ref.namelist():
+        lower_name = name.lower()
+        if lower_name.endswith(LIVP_IMAGE_EXTENSIONS):
+            image_member = name
+        elif lower_name.endswith(LIVP_VIDEO_EXTENSIONS):
+            video_member = name
+    return image_member, video_member
+
+
+def member_data_range(livp_path, info):
+    """返回未压缩成员数据在LIVP文件中的 (偏移, 长度)；压缩或加密的成员返回None"""
+    if info.compress_type != zipfile.ZIP_STORED or info.flag_bits & 0x1:
+        return None
+
+    # 本地文件头中的文件名和扩展字段长度可能与中央目录不同，需要读取本地文件头
+    with open(livp_path, 'rb') as f:
+        f.seek(info.header_offset)
+        header = f.read(zipfile.sizeFileHeader)
+    if len(header) != zipfile.sizeFileHeader:
+        return None
+    fields = struct.unpack(zipfile.structFileHeader, header)
+    if fields[0] != zipfile.stringFileHeader:
+        return None
+
+    name_length, extra_length = fields[10], fields[11]
+    offset = info.header_offset + zipfile.sizeFileHeader + name_length + extra_length
+    return offset, info.file_size
+
+
+def extract_member(zip_ref, member, target_file):
+    """把成员直接流式写入目标文件（不经过临时目录，写完后原子重命名）"""
+    with AtomicOutput(target_file) as output:
+        with zip_ref.open(member) as source, open(output.path, 'wb') as target:
+            shutil.copyfileobj(source, target, COPY_BUFFER_SIZE)
+        output.commit()
+
+
+def write_livp(image_file, video_file, output_livp, source_zip=None):
+    """从图片和视频创建LIVP文件（原子写入）
+
+    source_zip 不为None时，image_file 和 video_file 是该ZIP中的成员名。
+    """
+    image_filename = os.path.basename(image_file)
+    video_filename = os.path.basename(video_file)
+
+    # metadata.json（简化版）
+    metadata = {
+        "version": "1.0",
+        "photoFile": image_filename,
+        "videoFile": video_filename,
+        "creationDate": time.strftime("%Y-%m-%dT%H:%M:%SZ")
+    }
+
+    # 在目标目录中创建临时文件，保证最终的重命名是原子操作
+    with AtomicOutput(output_livp) as output:
+        with open(output.path, 'wb') as f:
+            with zipfile.ZipFile(f, 'w', compression=zipfile.ZIP_STORED) as zipf:
+                zipf.writestr("metadata.json", json.dumps(metadata))
+                if source_zip is not None:
+                    add_member_to_zip(zipf, source_zip, image_file, image_filename)
+                    add_member_to_zip(zipf, source_zip, video_file, video_filename)
+                else:
+                    add_file_to_zip(zipf, image_file, image_filename)
+                    add_file_to_zip(zipf, video_file, video_filename)
+
+        output.commit()
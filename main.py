@@ -1,20 +1,25 @@
 import os
 import sys
-import shutil
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
-import subprocess
 import threading
 import time
 from PIL import Image, ImageTk
-import re
-import zipfile
-import tempfile
 import ctypes
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import queue
+import logging
 import multiprocessing
-import json
+from logging.handlers import RotatingFileHandler
+
+from engine import LivePhotoEngine, OUTPUT_FORMATS, detect_ffmpeg
+from pairing import IMAGE_EXTENSIONS, LIVE_IMAGE_EXTENSIONS, VIDEO_EXTENSIONS, pair_live_photos
+from scanner import scan_tree
+from profiles import (ANIMATION_PROFILES, DEFAULT_ANIMATION_PROFILE, MP4_PROFILES, DEFAULT_MP4_PROFILE,
+                      MAX_RESOLUTIONS)
+from batching import DEFAULT_BATCH_SIZE
+from backends import MEDIA_BACKENDS, DEFAULT_MEDIA_BACKEND, is_backend_available, create_media_backend
+from thumbnails import ThumbnailCache, PreviewScheduler, user_cache_dir
+from widgets import VirtualListbox
 
 # 尝试导入HEIC支持
 try:
@@ -24,6 +29,20 @@ try:
 except ImportError:
     pass  # 如果没有安装pillow_heif，则使用备用方法
 
+# 后台线程发往界面的消息的处理间隔（毫秒）
+UI_DRAIN_INTERVAL_MS = 100
+# 文件夹树每批加入的最大节点数和最长间隔（秒）
+TREE_BATCH_SIZE = 500
+TREE_BATCH_INTERVAL = 0.1
+# 打开文件夹后等待列表稳定再预览首个文件（毫秒）
+FIRST_PREVIEW_DELAY_MS = 250
+# 日志区域最多保留的行数，完整日志写入日志文件
+LOG_MAX_LINES = 1000
+LOG_FILE_MAX_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUPS = 3
+# MP4最大分辨率选项中表示不缩小的值
+ORIGINAL_RESOLUTION = "原始"
+
 class LivePhotoBackupTool:
     """LivePhoto备份与转换工具 - 支持LivePhoto和普通图片的备份与转换"""
     
@@ -54,7 +73,16 @@ class LivePhotoBackupTool:
         self.preserve_structure = tk.BooleanVar(value=True)
         self.preserve_livp = tk.BooleanVar(value=False)
         self.thread_count = tk.IntVar(value=multiprocessing.cpu_count())
+        self.batch_size = tk.IntVar(value=DEFAULT_BATCH_SIZE)
+        self.media_backend = tk.StringVar(value=DEFAULT_MEDIA_BACKEND)
         self.use_gpu = tk.BooleanVar(value=False)
+        self.incremental = tk.BooleanVar(value=True)
+        self.deduplicate = tk.BooleanVar(value=False)
+        self.resume = tk.BooleanVar(value=False)
+        self.animation_profile = tk.StringVar(value=DEFAULT_ANIMATION_PROFILE)
+        self.mp4_profile = tk.StringVar(value=DEFAULT_MP4_PROFILE)
+        self.mp4_max_resolution = tk.StringVar(value=ORIGINAL_RESOLUTION)
+        self.mp4_remux = tk.BooleanVar(value=False)
         
         # 高DPI支持
         if sys.platform == "win32":
@@ -78,20 +106,37 @@ class LivePhotoBackupTool:
         self.file_queue = queue.Queue()
         self.preview_queue = queue.Queue()
         
+        # 后台线程发往界面的消息队列，由UI线程定时批量处理
+        self.ui_queue = queue.Queue()
+        self.file_logger = self.create_file_logger()
+        
         # 预览相关
         self.current_preview_file = None
         self.preview_image = None
         self.thumbnail_size = (300, 300)
+        self.thumbnail_cache = ThumbnailCache()
+        self.preview_prefetch_count = 3  # 选中文件前后各预取的文件数
         
         # 设置UI
         self.setup_ui()
+        self.root.after(UI_DRAIN_INTERVAL_MS, self.drain_ui_queue)
         
         # 检查依赖
         self.check_ffmpeg()
         
+        # 预览调度器（ffmpeg路径在检查依赖后确定）
+        self.preview_scheduler = PreviewScheduler(self.thumbnail_cache, self.thumbnail_size,
+                                                  self.ffmpeg_path, on_ready=self.on_preview_ready,
+                                                  media_backend=create_media_backend(self.media_backend.get()))
+        
         # 设置文件夹浏览线程
         self.folder_scan_thread = None
         self.folder_tree_data = {}
+        self.scan_index = None  # 文件夹扫描结果，处理时若仍有效则直接复用
+        # 文件夹树：父节点ID -> [(节点ID, 名称, 文件数)]，已创建子节点的文件夹，当前扫描编号
+        self.tree_children = {}
+        self.populated_nodes = {""}
+        self.scan_generation = 0
 
     def get_app_path(self):
         """获取应用程序路径"""
@@ -213,6 +258,7 @@ class LivePhotoBackupTool:
         
         # 绑定事件
         self.folder_tree.bind("<<TreeviewSelect>>", self.on_folder_selected)
+        self.folder_tree.bind("<<TreeviewOpen>>", self.on_folder_opened)
     
     def create_preview_area(self, parent):
         """创建预览区域"""
@@ -234,21 +280,13 @@ class LivePhotoBackupTool:
         # 文件列表标题
         ttk.Label(files_frame, text="文件列表:").pack(anchor=tk.W, pady=(0, 5))
         
-        # 文件列表和滚动条
-        files_list_frame = ttk.Frame(files_frame)
-        files_list_frame.pack(fill=tk.BOTH, expand=True)
-        
-        self.files_listbox = tk.Listbox(files_list_frame, background="#FFFFFF", 
-                                        font=self.normal_font, activestyle='none',
-                                        highlightthickness=1, highlightbackground="#CCCCCC")
-        self.files_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        
-        scrollbar = ttk.Scrollbar(files_list_frame, orient=tk.VERTICAL, command=self.files_listbox.yview)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.files_listbox.config(yscrollcommand=scrollbar.set)
-        
-        # 绑定事件
-        self.files_listbox.bind('<<ListboxSelect>>', self.on_file_selected)
+        # 文件列表（只创建可见行，带滚动条）
+        self.files_listbox = VirtualListbox(files_frame, on_select=self.on_file_selected,
+                                            background="#FFFFFF", font=self.normal_font,
+                                            activestyle='none', highlightthickness=1,
+                                            highlightbackground="#CCCCCC")
+        self.files_listbox.pack(fill=tk.BOTH, expand=True)
+        self.first_preview_job = None
         
         # 文件信息区域
         info_frame = ttk.Frame(preview_frame)
@@ -273,16 +311,51 @@ class LivePhotoBackupTool:
         
         ttk.Label(format_frame, text="LivePhoto输出格式:").pack(anchor=tk.W, pady=(0, 5))
         format_combo = ttk.Combobox(format_frame, textvariable=self.output_format, 
-                                values=["original", "mp4", "gif", "jpg"], 
+                                values=OUTPUT_FORMATS, 
                                 state="readonly", width=15)
         format_combo.pack(anchor=tk.W)
         format_combo.current(1)  # 默认选择mp4
         
+        # GIF/WebP动图配置
+        ttk.Label(format_frame, text="动图配置(GIF/WebP):").pack(anchor=tk.W, pady=(5, 0))
+        animation_combo = ttk.Combobox(format_frame, textvariable=self.animation_profile, 
+                                   values=list(ANIMATION_PROFILES), 
+                                   state="readonly", width=15)
+        animation_combo.pack(anchor=tk.W)
+        
+        # MP4编码配置和最大分辨率
+        ttk.Label(format_frame, text="MP4编码配置:").pack(anchor=tk.W, pady=(5, 0))
+        mp4_frame = ttk.Frame(format_frame)
+        mp4_frame.pack(anchor=tk.W)
+        mp4_combo = ttk.Combobox(mp4_frame, textvariable=self.mp4_profile, 
+                             values=list(MP4_PROFILES), 
+                             state="readonly", width=9)
+        mp4_combo.pack(side=tk.LEFT)
+        resolution_combo = ttk.Combobox(mp4_frame, textvariable=self.mp4_max_resolution, 
+                                    values=[ORIGINAL_RESOLUTION] + [f"{height}p" for height in MAX_RESOLUTIONS], 
+                                    state="readonly", width=8)
+        resolution_combo.pack(side=tk.LEFT, padx=(5, 0))
+        
         # 添加LIVP保留选项
         livp_check = ttk.Checkbutton(format_frame, text="保留LIVP文件", 
                                 variable=self.preserve_livp)
         livp_check.pack(anchor=tk.W, pady=(5, 0))
         
+        # 增量备份选项
+        incremental_check = ttk.Checkbutton(format_frame, text="跳过已备份且未变化的文件", 
+                                       variable=self.incremental)
+        incremental_check.pack(anchor=tk.W, pady=(5, 0))
+        
+        # 重复文件选项
+        dedup_check = ttk.Checkbutton(format_frame, text="重复文件只处理一次(硬链接)", 
+                                 variable=self.deduplicate)
+        dedup_check.pack(anchor=tk.W, pady=(5, 0))
+        
+        # 继续上次中断的作业
+        resume_check = ttk.Checkbutton(format_frame, text="继续上次中断的任务", 
+                                  variable=self.resume)
+        resume_check.pack(anchor=tk.W, pady=(5, 0))
+        
         # 保留选项
         preserve_frame = ttk.Frame(options_content)
         preserve_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(10, 10))
@@ -301,9 +374,33 @@ class LivePhotoBackupTool:
                                     textvariable=self.thread_count, width=5)
         thread_spinbox.pack(side=tk.LEFT, padx=(5, 0))
         
+        batch_frame = ttk.Frame(perf_frame)
+        batch_frame.pack(anchor=tk.W, fill=tk.X, pady=(5, 0))
+        
+        ttk.Label(batch_frame, text="合并转换:").pack(side=tk.LEFT)
+        batch_spinbox = ttk.Spinbox(batch_frame, from_=1, to=16, 
+                                   textvariable=self.batch_size, width=5)
+        batch_spinbox.pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Label(batch_frame, text="个视频/进程").pack(side=tk.LEFT, padx=(5, 0))
+        
+        backend_frame = ttk.Frame(perf_frame)
+        backend_frame.pack(anchor=tk.W, fill=tk.X, pady=(5, 0))
+        
+        # 只列出已安装所需库的媒体后端
+        ttk.Label(backend_frame, text="媒体后端:").pack(side=tk.LEFT)
+        backend_combo = ttk.Combobox(backend_frame, textvariable=self.media_backend, 
+                                    values=[name for name in MEDIA_BACKENDS if is_backend_available(name)],
+                                    state="readonly", width=8)
+        backend_combo.pack(side=tk.LEFT, padx=(5, 0))
+        backend_combo.bind("<<ComboboxSelected>>", self.on_media_backend_changed)
+        
         gpu_check = ttk.Checkbutton(perf_frame, text="使用GPU加速(如果可用)", 
                                    variable=self.use_gpu)
         gpu_check.pack(anchor=tk.W)
+        
+        remux_check = ttk.Checkbutton(perf_frame, text="MP4直接封装(兼容时不重新编码)", 
+                                     variable=self.mp4_remux)
+        remux_check.pack(anchor=tk.W)
     
     def create_progress_area(self, parent):
         """创建进度区域"""
@@ -400,68 +497,33 @@ class LivePhotoBackupTool:
         self.log("检查FFmpeg依赖...")
         
         try:
-            # 优先检查本地依赖目录中的ffmpeg
-            if os.path.exists(self.ffmpeg_path):
-                result = subprocess.run([self.ffmpeg_path, "-version"], 
-                                     stdout=subprocess.PIPE, 
-                                     stderr=subprocess.PIPE, 
-                                     text=True,
-                                     creationflags=subprocess.CREATE_NO_WINDOW if hasattr(subprocess, 'CREATE_NO_WINDOW') else 0)
-                
-                ffmpeg_version = re.search(r"ffmpeg version ([^\s]+)", result.stdout)
-                if ffmpeg_version:
-                    self.log(f"已找到本地FFmpeg: {ffmpeg_version.group(1)}")
-                else:
-                    self.log(f"已找到本地FFmpeg")
-                
-                # 检查GPU支持
-                gpu_support = re.search(r"--enable-nvenc|--enable-cuda|--enable-cuvid", result.stdout)
-                if gpu_support:
-                    self.log("FFmpeg具有GPU加速支持")
-                    self.use_gpu.set(True)
-                else:
-                    self.log("FFmpeg不支持GPU加速")
-                    self.use_gpu.set(False)
-                
-                # 确保启用开始处理按钮（如果已设置输入目录）
-                if self.input_dir.get():
-                    self.update_button_states()
-                
-                return True
-                
-            else:
+            if not os.path.exists(os.path.join(self.dependencies_path, 'ffmpeg.exe')):
                 # 如果本地依赖目录中没有ffmpeg，尝试使用系统安装的版本
                 self.log("本地FFmpeg未找到，尝试使用系统FFmpeg...")
-                result = subprocess.run(["ffmpeg", "-version"], 
-                                     stdout=subprocess.PIPE, 
-                                     stderr=subprocess.PIPE, 
-                                     text=True,
-                                     creationflags=subprocess.CREATE_NO_WINDOW if hasattr(subprocess, 'CREATE_NO_WINDOW') else 0)
-                
-                ffmpeg_version = re.search(r"ffmpeg version ([^\s]+)", result.stdout)
-                if ffmpeg_version:
-                    self.log(f"已找到系统FFmpeg: {ffmpeg_version.group(1)}")
-                else:
-                    self.log(f"已找到系统FFmpeg")
-                
-                # 检查GPU支持
-                gpu_support = re.search(r"--enable-nvenc|--enable-cuda|--enable-cuvid", result.stdout)
-                if gpu_support:
-                    self.log("FFmpeg具有GPU加速支持")
-                    self.use_gpu.set(True)
-                else:
-                    self.log("FFmpeg不支持GPU加速")
-                    self.use_gpu.set(False)
-                
-                # 使用系统FFmpeg
-                self.ffmpeg_path = "ffmpeg"
-                self.ffprobe_path = "ffprobe"
-                
-                # 确保启用开始处理按钮（如果已设置输入目录）
-                if self.input_dir.get():
-                    self.update_button_states()
-                
-                return True
+            
+            ffmpeg_info = detect_ffmpeg(self.dependencies_path)
+            self.ffmpeg_path = ffmpeg_info['ffmpeg_path']
+            self.ffprobe_path = ffmpeg_info['ffprobe_path']
+            
+            source = "本地" if ffmpeg_info['local'] else "系统"
+            if ffmpeg_info['version']:
+                self.log(f"已找到{source}FFmpeg: {ffmpeg_info['version']}")
+            else:
+                self.log(f"已找到{source}FFmpeg")
+            
+            # 检查GPU支持
+            if ffmpeg_info['gpu_support']:
+                self.log(f"FFmpeg具有GPU加速支持: {', '.join(ffmpeg_info['gpu_encoders'])}")
+                self.use_gpu.set(True)
+            else:
+                self.log("FFmpeg不支持GPU加速")
+                self.use_gpu.set(False)
+            
+            # 确保启用开始处理按钮（如果已设置输入目录）
+            if self.input_dir.get():
+                self.update_button_states()
+            
+            return True
                 
         except FileNotFoundError:
             self.log("错误: 未找到FFmpeg。如需处理LivePhoto视频部分，请确保安装FFmpeg。")
@@ -473,22 +535,84 @@ class LivePhotoBackupTool:
             self.log(f"检查FFmpeg时出错: {str(e)}")
             return False
     
+    def create_file_logger(self):
+        """创建写入完整日志的文件记录器，日志目录不可写时返回None"""
+        try:
+            log_dir = user_cache_dir("logs")
+            os.makedirs(log_dir, exist_ok=True)
+            handler = RotatingFileHandler(os.path.join(log_dir, "livephoto_backup.log"),
+                                          maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS,
+                                          encoding="utf-8")
+        except OSError:
+            return None
+        
+        handler.setFormatter(logging.Formatter("%(asctime)s - %(message)s"))
+        logger = logging.getLogger("livephoto_backup")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.handlers = [handler]
+        return logger
+    
     def log(self, message):
-        """添加消息到日志区域"""
+        """添加消息到日志（任意线程均可调用）"""
+        if self.file_logger is not None:
+            self.file_logger.info(message)
+        
+        timestamp = time.strftime("%H:%M:%S")
+        self.ui_queue.put(('log', f"{timestamp} - {message}"))
+    
+    def post_to_ui(self, callback):
+        """在UI线程中执行回调（任意线程均可调用）"""
+        self.ui_queue.put(('call', callback))
+    
+    def drain_ui_queue(self):
+        """批量处理后台线程发来的消息：合并日志行，进度只显示最新值"""
+        lines = []
+        progress = None
         try:
-            timestamp = time.strftime("%H:%M:%S")
-            self.log_text.insert(tk.END, f"{timestamp} - {message}\n")
-            self.log_text.see(tk.END)
-            
-            # 同时更新状态栏
-            self.status_label.config(text=message)
-            
-            # 更新界面
-            self.root.update_idletasks()
-        except:
-            # 防止在对象销毁后调用
+            while True:
+                kind, payload = self.ui_queue.get_nowait()
+                if kind == 'log':
+                    lines.append(payload)
+                elif kind == 'progress':
+                    progress = payload
+                else:
+                    # 先显示之前的日志和进度，保持消息顺序
+                    self.flush_log_lines(lines)
+                    lines = []
+                    if progress is not None:
+                        self.show_progress(*progress)
+                        progress = None
+                    payload()
+        except queue.Empty:
+            pass
+        
+        try:
+            self.flush_log_lines(lines)
+            if progress is not None:
+                self.show_progress(*progress)
+            self.root.after(UI_DRAIN_INTERVAL_MS, self.drain_ui_queue)
+        except tk.TclError:
+            # 窗口已销毁
             pass
     
+    def flush_log_lines(self, lines):
+        """把日志行一次性写入日志区域，只保留最近的 LOG_MAX_LINES 行"""
+        if not lines:
+            return
+        
+        lines = lines[-LOG_MAX_LINES:]
+        self.log_text.insert(tk.END, "\n".join(lines) + "\n")
+        
+        # Text末尾总有一个空行，因此行数为 end-1c 所在行
+        line_count = int(self.log_text.index("end-1c").split(".")[0]) - 1
+        if line_count > LOG_MAX_LINES:
+            self.log_text.delete("1.0", f"{line_count - LOG_MAX_LINES + 1}.0")
+        self.log_text.see(tk.END)
+        
+        # 同时更新状态栏
+        self.status_label.config(text=lines[-1].split(" - ", 1)[-1])
+    
     def clear_log(self):
         """清空日志区域"""
         self.log_text.delete(1.0, tk.END)
@@ -538,9 +662,12 @@ class LivePhotoBackupTool:
         """清空文件夹树"""
         for item in self.folder_tree.get_children():
             self.folder_tree.delete(item)
+        self.tree_children = {}
+        self.populated_nodes = {""}
         
         # 清空文件列表
-        self.files_listbox.delete(0, tk.END)
+        self.cancel_first_preview()
+        self.files_listbox.clear()
         
         # 清空预览
         self.clear_preview()
@@ -550,6 +677,7 @@ class LivePhotoBackupTool:
         self.preview_panel.config(image="")
         self.preview_panel.image = None
         self.current_preview_file = None
+        self.preview_scheduler.cancel()
         self.file_info_label.config(text="")
     
     def start_folder_scan(self):
@@ -563,21 +691,34 @@ class LivePhotoBackupTool:
         
         self.log(f"正在扫描文件夹: {input_dir}")
         self.folder_tree_data = {}
+        self.scan_index = None
+        self.tree_children = {}
+        self.populated_nodes = {""}
+        self.scan_generation += 1
         
         # 启动扫描线程
-        self.folder_scan_thread = threading.Thread(target=self.scan_folder_structure, args=(input_dir,))
+        self.folder_scan_thread = threading.Thread(target=self.scan_folder_structure,
+                                                   args=(input_dir, self.scan_generation))
         self.folder_scan_thread.daemon = True
         self.folder_scan_thread.start()
     
-    def scan_folder_structure(self, root_dir):
-        """扫描文件夹结构并填充文件夹树"""
+    def scan_folder_structure(self, root_dir, generation):
+        """扫描文件夹结构，分批把新文件夹交给UI线程加入文件夹树"""
         try:
-            # 添加根目录
             folder_name = os.path.basename(root_dir)
-            self.root.after(0, lambda: self.folder_tree.insert("", "end", folder_name, text=folder_name, values=("扫描中...")))
-            
-            # 递归扫描子目录
-            for root, dirs, files in os.walk(root_dir):
+            batch = []
+            last_flush = 0.0
+            total_files = 0
+            
+            def flush():
+                nonlocal batch, last_flush
+                nodes, batch = batch, []
+                last_flush = time.monotonic()
+                self.post_to_ui(lambda: self.add_tree_nodes(generation, nodes, total_files, False))
+            
+            # 每扫描完一个目录，生成其文件列表并登记到批次中
+            def add_folder(root, files):
+                nonlocal total_files
                 rel_path = os.path.relpath(root, os.path.dirname(root_dir))
                 if rel_path == ".":
                     rel_path = folder_name
@@ -594,20 +735,13 @@ class LivePhotoBackupTool:
                         'pair': lp['video']
                     })
                 
-                # 添加其他图片文件
-                image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.heic'}
+                # 添加其他图片文件（已作为LivePhoto一部分的图片除外）
+                paired_images = {lp['image'] for lp in live_photos}
                 for file in files:
                     ext = os.path.splitext(file)[1].lower()
-                    if ext in image_extensions:
+                    if ext in IMAGE_EXTENSIONS:
                         file_path = os.path.join(root, file)
-                        # 检查该文件是否已经作为LivePhoto的一部分
-                        is_part_of_livephoto = False
-                        for lp in live_photos:
-                            if file_path == lp['image']:
-                                is_part_of_livephoto = True
-                                break
-                        
-                        if not is_part_of_livephoto:
+                        if file_path not in paired_images:
                             file_list.append({
                                 'path': file_path,
                                 'type': 'image'
@@ -623,41 +757,78 @@ class LivePhotoBackupTool:
                 
                 # 保存文件列表到文件夹树数据
                 self.folder_tree_data[rel_path] = file_list
+                total_files += len(file_list)
                 
-                # 更新UI
-                parent = ""
-                parts = rel_path.split(os.sep)
+                # 父目录总是先于子目录扫描，节点ID即相对路径
+                parent = os.path.dirname(rel_path) if rel_path != folder_name else ""
+                batch.append((rel_path, parent, os.path.basename(rel_path), len(file_list)))
                 
-                # 构建树的层次结构
-                for i, part in enumerate(parts):
-                    if i == 0:
-                        current_path = part
-                        parent = ""
-                    else:
-                        current_path = os.path.join(parts[0], *parts[1:i+1])
-                        parent = os.path.join(parts[0], *parts[1:i])
-                    
-                    # 检查节点是否已存在
-                    if not self.folder_tree.exists(current_path):
-                        # 如果是当前处理的文件夹，添加正确的文件计数
-                        if i == len(parts) - 1:
-                            file_count = len(file_list)
-                            self.root.after(0, lambda p=parent, c=current_path, n=part, fc=file_count: 
-                                          self.folder_tree.insert(p, "end", c, text=n, values=(fc,)))
-                        else:
-                            # 对于中间文件夹，先用占位符添加
-                            self.root.after(0, lambda p=parent, c=current_path, n=part: 
-                                          self.folder_tree.insert(p, "end", c, text=n, values=("...")))
+                # 首个目录立即显示，之后按时间和数量分批
+                if len(batch) >= TREE_BATCH_SIZE or time.monotonic() - last_flush >= TREE_BATCH_INTERVAL:
+                    flush()
             
-            # 完成扫描后更新根目录的文件计数
-            total_files = sum(len(files) for files in self.folder_tree_data.values())
-            self.root.after(0, lambda: self.folder_tree.item(folder_name, values=(total_files,)))
+            # 递归扫描子目录（os.scandir单次遍历，结果供处理时复用）
+            self.scan_index = scan_tree(root_dir, on_folder=add_folder)
+            
+            nodes = batch
+            self.post_to_ui(lambda: self.add_tree_nodes(generation, nodes, total_files, True))
             
             # 日志更新
-            self.root.after(0, lambda: self.log(f"扫描完成，共找到 {total_files} 个文件"))
+            self.log(f"扫描完成，共找到 {total_files} 个文件")
             
         except Exception as e:
-            self.root.after(0, lambda: self.log(f"扫描文件夹结构时出错: {str(e)}"))
+            self.log(f"扫描文件夹结构时出错: {str(e)}")
+    
+    def add_tree_nodes(self, generation, nodes, total_files, finished):
+        """在UI线程中加入一批文件夹节点：只创建已展开文件夹的子节点，其余在展开时创建"""
+        if generation != self.scan_generation:
+            return
+        
+        for node_id, parent, name, file_count in nodes:
+            self.tree_children.setdefault(parent, []).append((node_id, name, file_count))
+            
+            if parent in self.populated_nodes:
+                self.insert_tree_node(parent, node_id, name, file_count)
+            elif self.folder_tree.exists(parent) and not self.folder_tree.exists(self.placeholder_id(parent)):
+                # 父节点尚未展开，加入占位子节点以显示展开标记
+                self.folder_tree.insert(parent, "end", self.placeholder_id(parent), text="...")
+        
+        # 根节点显示已扫描到的文件总数
+        root_nodes = self.tree_children.get("", [])
+        if root_nodes and self.folder_tree.exists(root_nodes[0][0]):
+            self.folder_tree.item(root_nodes[0][0], values=(total_files if finished else f"{total_files}...",))
+    
+    def insert_tree_node(self, parent, node_id, name, file_count):
+        """插入文件夹节点，已知有子文件夹时加入占位子节点"""
+        is_root = parent == ""
+        self.folder_tree.insert(parent, "end", node_id, text=name, values=(file_count,), open=is_root)
+        if is_root:
+            # 根节点默认展开
+            self.populate_tree_node(node_id)
+        elif node_id in self.tree_children:
+            self.folder_tree.insert(node_id, "end", self.placeholder_id(node_id), text="...")
+    
+    def populate_tree_node(self, node_id):
+        """创建文件夹的子节点（展开时调用）"""
+        if node_id in self.populated_nodes:
+            return
+        self.populated_nodes.add(node_id)
+        
+        placeholder = self.placeholder_id(node_id)
+        if self.folder_tree.exists(placeholder):
+            self.folder_tree.delete(placeholder)
+        for child_id, name, file_count in self.tree_children.get(node_id, []):
+            self.insert_tree_node(node_id, child_id, name, file_count)
+    
+    def placeholder_id(self, node_id):
+        """未展开文件夹的占位子节点ID"""
+        return f"\0placeholder:{node_id}"
+    
+    def on_folder_opened(self, event):
+        """展开文件夹时创建其子节点"""
+        node_id = self.folder_tree.focus()
+        if node_id:
+            self.populate_tree_node(node_id)
     
     def detect_live_photos(self, directory, files):
         """在目录中检测Live Photos（图片+视频对）"""
@@ -667,51 +838,17 @@ class LivePhotoBackupTool:
         image_files = []
         video_files = []
         
-        image_extensions = {'.jpg', '.jpeg', '.png', '.heic'}
-        video_extensions = {'.mov', '.mp4'}
-        
         for file in files:
             file_path = os.path.join(directory, file)
             ext = os.path.splitext(file)[1].lower()
             
-            if ext in image_extensions:
+            if ext in LIVE_IMAGE_EXTENSIONS:
                 image_files.append(file_path)
-            elif ext in video_extensions:
+            elif ext in VIDEO_EXTENSIONS:
                 video_files.append(file_path)
         
         # 配对Live Photos
-        for image_path in image_files:
-            base_name = os.path.splitext(image_path)[0]
-            dir_name = os.path.dirname(image_path)
-            file_name = os.path.basename(image_path)
-            name_no_ext = os.path.splitext(file_name)[0]
-            
-            # 检查常规配对
-            possible_videos = [
-                base_name + ".mov",
-                base_name + ".MOV",
-            ]
-            
-            # 检查特殊命名格式 (iPhone Live Photos)
-            if name_no_ext.startswith("IMG_") and not name_no_ext.startswith("IMG_E"):
-                e_name = "IMG_E" + name_no_ext[4:] + ".MOV"
-                possible_videos.append(os.path.join(dir_name, e_name))
-            
-            # 或者反过来
-            if name_no_ext.startswith("IMG_E"):
-                regular_name = "IMG_" + name_no_ext[5:] + ".MOV"
-                possible_videos.append(os.path.join(dir_name, regular_name))
-            
-            # 查找匹配的视频文件
-            for video_path in possible_videos:
-                if video_path in video_files:
-                    # 找到Live Photo
-                    live_photos.append({
-                        'image': image_path,
-                        'video': video_path
-                    })
-                    break
-                    
+        live_photos, _, _ = pair_live_photos(image_files, video_files)
         return live_photos
     
     def on_folder_selected(self, event):
@@ -721,48 +858,62 @@ class LivePhotoBackupTool:
             return
             
         # 清空文件列表和预览
-        self.files_listbox.delete(0, tk.END)
+        self.cancel_first_preview()
         self.clear_preview()
         
-        # 获取选中文件夹的文件列表
-        if selected_id in self.folder_tree_data:
-            files = self.folder_tree_data[selected_id]
-            
-            # 填充文件列表
-            for i, file_info in enumerate(files):
-                file_path = file_info['path']
-                file_type = file_info['type']
-                file_name = os.path.basename(file_path)
-                
-                # 为不同类型的文件添加图标前缀
-                if file_type == 'livephoto':
-                    display_name = "🎞️ " + file_name
-                elif file_type == 'livp':
-                    display_name = "📱 " + file_name
-                else:
-                    display_name = "🖼️ " + file_name
-                
-                self.files_listbox.insert(tk.END, display_name)
-            
-            # 如果有文件，选中第一个并显示预览
-            if self.files_listbox.size() > 0:
-                self.files_listbox.selection_set(0)
-                self.on_file_selected(None)
+        # 获取选中文件夹的文件列表（列表只生成可见行的文本）
+        files = self.folder_tree_data.get(selected_id, [])
+        self.files_listbox.set_items(files, self.format_file_row)
+        
+        # 如果有文件，等列表稳定后选中第一个并显示预览（快速切换文件夹时不预览）
+        if files:
+            self.first_preview_job = self.root.after(FIRST_PREVIEW_DELAY_MS, self.show_first_preview)
+    
+    def format_file_row(self, file_info):
+        """文件列表中一行的显示文本"""
+        file_type = file_info['type']
+        file_name = os.path.basename(file_info['path'])
+        
+        # 为不同类型的文件添加图标前缀
+        if file_type == 'livephoto':
+            return "🎞️ " + file_name
+        elif file_type == 'livp':
+            return "📱 " + file_name
+        else:
+            return "🖼️ " + file_name
     
-    def on_file_selected(self, event):
+    def show_first_preview(self):
+        """选中并预览文件列表的第一个文件（用户尚未选择时）"""
+        self.first_preview_job = None
+        if self.files_listbox.curselection() is None:
+            self.files_listbox.select(0)
+    
+    def cancel_first_preview(self):
+        """取消尚未执行的首个文件预览"""
+        if self.first_preview_job is not None:
+            self.root.after_cancel(self.first_preview_job)
+            self.first_preview_job = None
+    
+    def on_file_selected(self, index):
         """当在文件列表中选择一个文件时触发"""
-        if self.files_listbox.curselection():
-            index = self.files_listbox.curselection()[0]
+        if index is not None:
             selected_id = self.folder_tree.focus()
             
             if selected_id in self.folder_tree_data and index < len(self.folder_tree_data[selected_id]):
-                file_info = self.folder_tree_data[selected_id][index]
-                file_path = file_info['path']
+                files = self.folder_tree_data[selected_id]
+                file_info = files[index]
+                
+                # 相邻文件按距离由近到远排列，后一个优先于前一个
+                neighbors = []
+                for offset in range(1, self.preview_prefetch_count + 1):
+                    for neighbor_index in (index + offset, index - offset):
+                        if 0 <= neighbor_index < len(files):
+                            neighbors.append(files[neighbor_index])
                 
                 # 异步加载预览
-                self.load_preview(file_info)
+                self.load_preview(file_info, neighbors)
     
-    def load_preview(self, file_info):
+    def load_preview(self, file_info, neighbors=()):
         """加载文件预览"""
         # 防止重复加载相同文件
         if self.current_preview_file == file_info['path']:
@@ -789,8 +940,8 @@ class LivePhotoBackupTool:
         
         self.file_info_label.config(text=info_text)
         
-        # 启动线程加载预览图像
-        threading.Thread(target=self.generate_preview, args=(file_info,), daemon=True).start()
+        # 交给预览调度器加载预览图像，并预取相邻文件
+        self.preview_scheduler.request(file_info, neighbors)
     
     def get_file_type_display(self, file_type):
         """获取文件类型的显示名称"""
@@ -803,134 +954,22 @@ class LivePhotoBackupTool:
         else:
             return "未知类型"
     
-    def generate_preview(self, file_info):
-        """生成文件预览"""
-        try:
-            file_path = file_info['path']
-            file_type = file_info['type']
-            
-            # 创建缩略图
-            if file_type == 'livephoto' or file_type == 'image':
-                # 处理HEIC文件
-                if file_path.lower().endswith('.heic'):
-                    try:
-                        # 使用临时文件转换HEIC为预览
-                        temp_jpg = tempfile.NamedTemporaryFile(suffix='.jpg', delete=False)
-                        temp_jpg.close()
-                        
-                        # 先尝试使用PIL
-                        try:
-                            img = Image.open(file_path)
-                            img.thumbnail(self.thumbnail_size)
-                            img.save(temp_jpg.name, "JPEG")
-                            img = Image.open(temp_jpg.name)
-                        except:
-                            # 如果PIL失败，使用ffmpeg
-                            cmd = [
-                                self.ffmpeg_path, "-i", file_path,
-                                "-vf", f"scale={self.thumbnail_size[0]}:{self.thumbnail_size[1]}:force_original_aspect_ratio=decrease",
-                                "-y", temp_jpg.name
-                            ]
-                            
-                            subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                         text=True, creationflags=subprocess.CREATE_NO_WINDOW if hasattr(subprocess, 'CREATE_NO_WINDOW') else 0)
-                            
-                            img = Image.open(temp_jpg.name)
-                        
-                        photo = ImageTk.PhotoImage(img)
-                        
-                        # 更新UI
-                        self.root.after(0, lambda: self.update_preview(photo))
-                        
-                        # 清理临时文件
-                        try:
-                            os.unlink(temp_jpg.name)
-                        except:
-                            pass
-                            
-                    except Exception as e:
-                        self.root.after(0, lambda: self.log(f"HEIC预览生成失败: {str(e)}"))
-                        self.root.after(0, lambda: self.show_default_preview("HEIC格式文件"))
-                
-                # 处理普通图片
-                else:
-                    try:
-                        img = Image.open(file_path)
-                        img.thumbnail(self.thumbnail_size)
-                        photo = ImageTk.PhotoImage(img)
-                        
-                        # 更新UI
-                        self.root.after(0, lambda: self.update_preview(photo))
-                    except:
-                        self.root.after(0, lambda: self.show_default_preview("图片预览失败"))
-                
-            elif file_type == 'livp':
-                # 尝试从.livp中提取图片预览
-                try:
-                    temp_dir = tempfile.mkdtemp(prefix="livp_preview_")
-                    try:
-                        with zipfile.ZipFile(file_path, 'r') as zip_ref:
-                            # 查找图片文件
-                            image_file = None
-                            for file in zip_ref.namelist():
-                                if file.lower().endswith(('.jpg', '.jpeg', '.png')):
-                                    image_file = file
-                                    break
-                                elif file.lower().endswith('.heic'):
-                                    # 如果只找到HEIC，也使用它
-                                    image_file = file
-                                    break
-                            
-                            if image_file:
-                                # 提取图片到临时目录
-                                extracted_path = os.path.join(temp_dir, os.path.basename(image_file))
-                                with zip_ref.open(image_file) as source, open(extracted_path, 'wb') as target:
-                                    shutil.copyfileobj(source, target)
-                                
-                                # 如果是HEIC格式，需要转换
-                                if extracted_path.lower().endswith('.heic'):
-                                    temp_jpg = os.path.join(temp_dir, "preview.jpg")
-                                    try:
-                                        # 尝试用PIL转换
-                                        img = Image.open(extracted_path)
-                                        img.save(temp_jpg, "JPEG")
-                                        extracted_path = temp_jpg
-                                    except:
-                                        # 如果PIL失败，使用ffmpeg
-                                        cmd = [
-                                            self.ffmpeg_path, "-i", extracted_path,
-                                            "-y", temp_jpg
-                                        ]
-                                        
-                                        subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                                     text=True, creationflags=subprocess.CREATE_NO_WINDOW if hasattr(subprocess, 'CREATE_NO_WINDOW') else 0)
-                                        
-                                        extracted_path = temp_jpg
-                                
-                                # 创建缩略图
-                                img = Image.open(extracted_path)
-                                img.thumbnail(self.thumbnail_size)
-                                photo = ImageTk.PhotoImage(img)
-                                
-                                # 更新UI
-                                self.root.after(0, lambda: self.update_preview(photo))
-                                return
-                    finally:
-                        # 清理临时目录
-                        shutil.rmtree(temp_dir, ignore_errors=True)
-                except Exception as e:
-                    self.root.after(0, lambda: self.log(f"LIVP预览生成失败: {str(e)}"))
-                
-                # 如果无法提取预览，显示默认图标
-                self.root.after(0, lambda: self.show_default_preview("LIVP文件"))
-                
-            else:
-                # 其他文件类型显示默认图标
-                self.root.after(0, lambda: self.show_default_preview("未知文件类型"))
-                
-        except Exception as e:
-            self.root.after(0, lambda: self.log(f"生成预览时出错: {str(e)}"))
-            self.root.after(0, lambda: self.show_default_preview("预览生成失败"))
+    def on_preview_ready(self, generation, file_info, img, error):
+        """预览生成完成（后台线程调用），转到UI线程显示"""
+        self.post_to_ui(lambda: self.show_preview_result(generation, file_info, img, error))
+
+    def show_preview_result(self, generation, file_info, img, error):
+        """显示预览结果，选择已变化时忽略"""
+        if not self.preview_scheduler.is_current(generation):
+            return
+
+        if error is not None:
+            self.log(f"生成预览时出错: {str(error)}")
+            self.show_default_preview("预览生成失败")
+        elif img is None:
+            self.show_default_preview("LIVP文件" if file_info['type'] == 'livp' else "未知文件类型")
+        else:
+            self.update_preview(ImageTk.PhotoImage(img))
     
     def update_preview(self, photo):
         """更新预览面板的图像"""
@@ -979,13 +1018,21 @@ class LivePhotoBackupTool:
                 messagebox.showerror("错误", f"无法创建输出目录: {str(e)}")
                 return
         
-        # 设置处理状态和取消标志
-        self.is_processing = True
+        # 界面变量只能在UI线程中读取，处理引擎在启动线程前创建
         self.cancel_flag.clear()
+        try:
+            engine = self.create_engine()
+        except Exception as e:
+            messagebox.showerror("错误", f"无法创建处理引擎: {str(e)}")
+            return
+        
+        # 设置处理状态
+        self.is_processing = True
         self.update_button_states()
         
         # 开始处理线程
-        thread = threading.Thread(target=self.processing_thread, args=(input_dir, output_dir))
+        thread = threading.Thread(target=self.processing_thread,
+                                  args=(engine, input_dir, output_dir, self.scan_index))
         thread.daemon = True
         thread.start()
     
@@ -996,647 +1043,86 @@ class LivePhotoBackupTool:
             self.log("正在取消操作...")
             self.progress_label.config(text="正在取消...")
     
-    def processing_thread(self, input_dir, output_dir):
-        """在单独的线程中执行处理"""
-        try:
-            # 查找所有文件
-            self.log("正在扫描文件...")
-            
-            # 扫描所有文件
-            all_files = self.scan_all_files(input_dir)
-            
-            # 分类文件
-            file_types = self.classify_files(all_files)
-            
-            total_files = len(all_files)
-            self.log(f"找到 {total_files} 个文件")
-            
-            if file_types['live_photos']:
-                self.log(f"其中包含 {len(file_types['live_photos'])} 组Live Photos")
-            if file_types['livp_files']:
-                self.log(f"其中包含 {len(file_types['livp_files'])} 个.livp文件")
-            if file_types['images']:
-                self.log(f"其中包含 {len(file_types['images'])} 个普通图片")
-            if file_types['others']:
-                self.log(f"其中包含 {len(file_types['others'])} 个其他文件")
-            
-            # 设置进度条
-            self.progress["maximum"] = total_files
-            self.progress["value"] = 0
-            
-            # 创建处理队列
-            task_queue = []
-            
-            # 添加Live Photos处理任务
-            for live_photo in file_types['live_photos']:
-                task_queue.append({
-                    'type': 'livephoto',
-                    'data': live_photo,
-                    'input_dir': input_dir
-                })
-            
-            # 添加.livp文件处理任务
-            for livp_file in file_types['livp_files']:
-                task_queue.append({
-                    'type': 'livp',
-                    'data': livp_file,
-                    'input_dir': input_dir
-                })
-            
-            # 添加普通图片处理任务
-            for image_file in file_types['images']:
-                task_queue.append({
-                    'type': 'image',
-                    'data': image_file,
-                    'input_dir': input_dir
-                })
-            
-            # 添加其他文件处理任务
-            for other_file in file_types['others']:
-                task_queue.append({
-                    'type': 'other',
-                    'data': other_file,
-                    'input_dir': input_dir
-                })
-            
-            # 使用线程池处理文件
-            max_workers = self.thread_count.get()
-            processed_count = 0
-            error_count = 0
-            result_queue = queue.Queue()
-            
-            self.log(f"使用 {max_workers} 个线程进行处理")
-            
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                # 提交所有任务
-                future_to_task = {}
-                for task in task_queue:
-                    if self.cancel_flag.is_set():
-                        break
-                    
-                    future = executor.submit(
-                        self.process_file_task, 
-                        task['type'], 
-                        task['data'], 
-                        task['input_dir'], 
-                        output_dir
-                    )
-                    future_to_task[future] = task
-                
-                # 处理完成的任务
-                for i, future in enumerate(as_completed(future_to_task)):
-                    if self.cancel_flag.is_set():
-                        break
-                    
-                    task = future_to_task[future]
-                    try:
-                        result = future.result()
-                        if result['success']:
-                            processed_count += 1
-                        else:
-                            error_count += 1
-                            self.log(f"处理失败: {result['message']}")
-                    except Exception as e:
-                        error_count += 1
-                        self.log(f"处理任务时出错: {str(e)}")
-                    
-                    # 更新进度
-                    self.progress["value"] = i + 1
-                    progress_percent = ((i + 1) / len(task_queue)) * 100
-                    self.progress_label.config(text=f"处理中... {i+1}/{len(task_queue)} ({progress_percent:.1f}%)")
-                    self.root.update_idletasks()
-            
-            # 完成处理
-            if self.cancel_flag.is_set():
-                # 在取消时保持当前进度，但更新文本
-                self.progress_label.config(text=f"已取消 - 处理了 {processed_count}/{len(task_queue)} 个文件")
-                self.log(f"操作已取消。已处理 {processed_count} 个文件，{error_count} 个错误。")
-            else:
-                # 正常完成时设置进度条达到100%
-                self.progress["value"] = self.progress["maximum"]
-                self.progress_label.config(text=f"处理完成 {len(task_queue)}/{len(task_queue)} (100%)")
-                self.root.update_idletasks()
-                self.log(f"处理完成！已处理 {processed_count} 个文件，{error_count} 个错误。")
-                messagebox.showinfo("完成", f"已处理 {processed_count} 个文件，{error_count} 个错误。")
-        
-        except Exception as e:
-            self.log(f"处理过程中出错: {str(e)}")
-            messagebox.showerror("错误", f"处理过程中出错: {str(e)}")
-        
-        finally:
-            self.is_processing = False
-            self.progress_label.config(text="就绪")
-            self.update_button_states()
+    def create_engine(self):
+        """根据界面设置创建处理引擎"""
+        return LivePhotoEngine(
+            ffmpeg_path=self.ffmpeg_path,
+            ffprobe_path=self.ffprobe_path,
+            output_format=self.output_format.get(),
+            preserve_structure=self.preserve_structure.get(),
+            preserve_livp=self.preserve_livp.get(),
+            thread_count=self.thread_count.get(),
+            use_gpu=self.use_gpu.get(),
+            incremental=self.incremental.get(),
+            deduplicate=self.deduplicate.get(),
+            mp4_remux=self.mp4_remux.get(),
+            resume=self.resume.get(),
+            animation_profile=self.animation_profile.get(),
+            mp4_profile=self.mp4_profile.get(),
+            mp4_max_resolution=self.get_max_resolution(),
+            batch_size=max(1, self.batch_size.get()),
+            media_backend=self.media_backend.get(),
+            log_callback=self.log,
+            progress_callback=self.update_progress,
+            cancel_flag=self.cancel_flag
+        )
     
-    def process_file_task(self, file_type, file_data, input_dir, output_dir):
-        """处理单个文件任务（在线程池中执行）"""
-        try:
-            if self.cancel_flag.is_set():
-                return {'success': False, 'message': "操作已取消"}
-            
-            if file_type == 'livephoto':
-                # 处理Live Photo
-                image_file = file_data['image']
-                video_file = file_data['video']
-                
-                # 确定目标路径
-                rel_path = os.path.relpath(os.path.dirname(image_file), input_dir) if self.preserve_structure.get() else ""
-                target_dir = os.path.join(output_dir, rel_path)
-                os.makedirs(target_dir, exist_ok=True)
-                
-                # 处理Live Photo
-                success = self.process_live_photo(image_file, video_file, target_dir)
-                if success:
-                    return {'success': True}
-                else:
-                    return {'success': False, 'message': f"处理Live Photo失败: {os.path.basename(image_file)}"}
-            
-            elif file_type == 'livp':
-                # 处理.livp文件
-                livp_file = file_data
-                
-                # 确定目标路径
-                rel_path = os.path.relpath(os.path.dirname(livp_file), input_dir) if self.preserve_structure.get() else ""
-                target_dir = os.path.join(output_dir, rel_path)
-                os.makedirs(target_dir, exist_ok=True)
-                
-                # 处理.livp文件
-                success = self.process_livp_file(livp_file, target_dir)
-                if success:
-                    return {'success': True}
-                else:
-                    return {'success': False, 'message': f"处理.livp文件失败: {os.path.basename(livp_file)}"}
-            
-            elif file_type == 'image':
-                # 处理普通图片
-                image_file = file_data
-                
-                # 确定目标路径
-                rel_path = os.path.relpath(os.path.dirname(image_file), input_dir) if self.preserve_structure.get() else ""
-                target_dir = os.path.join(output_dir, rel_path)
-                os.makedirs(target_dir, exist_ok=True)
-                
-                # 复制图片文件
-                target_file = os.path.join(target_dir, os.path.basename(image_file))
-                shutil.copy2(image_file, target_file)
-                return {'success': True}
-            
-            elif file_type == 'other':
-                # 处理其他文件
-                other_file = file_data
-                
-                # 确定目标路径
-                rel_path = os.path.relpath(os.path.dirname(other_file), input_dir) if self.preserve_structure.get() else ""
-                target_dir = os.path.join(output_dir, rel_path)
-                os.makedirs(target_dir, exist_ok=True)
-                
-                # 复制文件
-                target_file = os.path.join(target_dir, os.path.basename(other_file))
-                shutil.copy2(other_file, target_file)
-                return {'success': True}
-            
-            return {'success': False, 'message': f"未知文件类型: {file_type}"}
-            
-        except Exception as e:
-            return {'success': False, 'message': str(e)}
+    def on_media_backend_changed(self, event=None):
+        """预览也使用选择的媒体后端"""
+        self.preview_scheduler.media_backend = create_media_backend(self.media_backend.get())
     
-    def scan_all_files(self, directory):
-        """递归扫描目录中的所有文件"""
-        all_files = []
-        
-        for root, _, files in os.walk(directory):
-            for file in files:
-                file_path = os.path.join(root, file)
-                all_files.append(file_path)
-        
-        return all_files
+    def get_max_resolution(self):
+        """界面选择的MP4最大分辨率（短边像素数），原始分辨率时返回None"""
+        value = self.mp4_max_resolution.get()
+        if value == ORIGINAL_RESOLUTION:
+            return None
+        return int(value.rstrip("p"))
     
-    def classify_files(self, files):
-        """将文件分为Live Photos、.livp文件、普通图片和其他文件"""
-        image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.heic'}
-        video_extensions = {'.mov', '.mp4'}
-        
-        # 初始化结果分类
-        result = {
-            'live_photos': [],  # 包含图片和视频路径的字典列表
-            'livp_files': [],   # .livp文件路径列表
-            'images': [],       # 普通图片路径列表
-            'others': []        # 其他文件路径列表
-        }
-        
-        # 先收集所有图片和视频文件
-        images = []
-        videos = []
-        
-        for file_path in files:
-            ext = os.path.splitext(file_path)[1].lower()
-            
-            if ext == '.livp':
-                result['livp_files'].append(file_path)
-            elif ext in image_extensions:
-                images.append(file_path)
-            elif ext in video_extensions:
-                videos.append(file_path)
-            else:
-                result['others'].append(file_path)
-        
-        # 配对Live Photos
-        matched_images = set()
-        
-        for image_path in images:
-            base_name = os.path.splitext(image_path)[0]
-            dir_name = os.path.dirname(image_path)
-            file_name = os.path.basename(image_path)
-            name_no_ext = os.path.splitext(file_name)[0]
-            
-            # 检查常规配对
-            possible_videos = [
-                base_name + ".mov",
-                base_name + ".MOV",
-            ]
-            
-            # 检查特殊命名格式
-            if name_no_ext.startswith("IMG_") and not name_no_ext.startswith("IMG_E"):
-                e_name = "IMG_E" + name_no_ext[4:] + ".MOV"
-                possible_videos.append(os.path.join(dir_name, e_name))
-            
-            # 或者反过来
-            if name_no_ext.startswith("IMG_E"):
-                regular_name = "IMG_" + name_no_ext[5:] + ".MOV"
-                possible_videos.append(os.path.join(dir_name, regular_name))
-            
-            # 查找匹配的视频文件
-            matched_video = None
-            for video_path in possible_videos:
-                if video_path in videos:
-                    matched_video = video_path
-                    break
-            
-            if matched_video:
-                # 找到Live Photo
-                result['live_photos'].append({
-                    'image': image_path,
-                    'video': matched_video
-                })
-                matched_images.add(image_path)
-            else:
-                # 普通图片
-                result['images'].append(image_path)
-        
-        # 添加未匹配的视频到其他文件
-        for video_path in videos:
-            # 检查这个视频是否已经被用于Live Photo
-            is_matched = False
-            for live_photo in result['live_photos']:
-                if live_photo['video'] == video_path:
-                    is_matched = True
-                    break
-            
-            if not is_matched:
-                result['others'].append(video_path)
-        
-        return result
+    def update_progress(self, done, total):
+        """登记处理进度（任意线程均可调用，界面定时显示最新值）"""
+        self.ui_queue.put(('progress', (done, total)))
     
-    def process_live_photo(self, image_file, video_file, target_dir):
-        """处理单个Live Photo"""
-        try:
-            output_format = self.output_format.get()
-            preserve_livp = self.preserve_livp.get()
-            filename = os.path.basename(image_file)
-            name_no_ext = os.path.splitext(filename)[0]
-            
-            # 如果需要保留/创建LIVP文件
-            if preserve_livp:
-                livp_file = os.path.join(target_dir, f"{name_no_ext}.livp")
-                self.create_livp_file(image_file, video_file, livp_file)
-            
-            if output_format == "original":
-                # 仅复制原始文件
-                target_image = os.path.join(target_dir, filename)
-                target_video = os.path.join(target_dir, os.path.basename(video_file))
-                
-                shutil.copy2(image_file, target_image)
-                shutil.copy2(video_file, target_video)
-                
-                return True
-            
-            elif output_format == "mp4":
-                # 转换为MP4
-                target_file = os.path.join(target_dir, f"{name_no_ext}.mp4")
-                return self.convert_to_mp4(video_file, target_file)
-            
-            elif output_format == "gif":
-                # 转换为GIF
-                target_file = os.path.join(target_dir, f"{name_no_ext}.gif")
-                return self.convert_to_gif(video_file, target_file)
-            
-            elif output_format == "jpg":
-                # 仅保存静态图像
-                target_file = os.path.join(target_dir, f"{name_no_ext}.jpg")
-                
-                # 如果原图是HEIC，需要转换为JPG
-                if image_file.lower().endswith('.heic'):
-                    return self.convert_heic_to_jpg(image_file, target_file)
-                else:
-                    shutil.copy2(image_file, target_file)
-                    return True
-            
-            return False
-        
-        except Exception as e:
-            self.log(f"处理 Live Photo 时出错: {str(e)}")
-            return False
-
-    def create_livp_file(self, image_file, video_file, output_livp):
-        """从图片和视频创建LIVP文件"""
-        try:
-            # 创建临时目录
-            temp_dir = tempfile.mkdtemp(prefix="create_livp_")
-            
-            try:
-                # 准备LIVP所需文件
-                image_filename = os.path.basename(image_file)
-                video_filename = os.path.basename(video_file)
-                
-                # 创建metadata.json文件（简化版）
-                metadata = {
-                    "version": "1.0",
-                    "photoFile": image_filename,
-                    "videoFile": video_filename,
-                    "creationDate": time.strftime("%Y-%m-%dT%H:%M:%SZ")
-                }
-                
-                metadata_path = os.path.join(temp_dir, "metadata.json")
-                with open(metadata_path, 'w') as f:
-                    json.dump(metadata, f)
-                
-                # 复制图片和视频到临时目录
-                temp_image = os.path.join(temp_dir, image_filename)
-                temp_video = os.path.join(temp_dir, video_filename)
-                
-                shutil.copy2(image_file, temp_image)
-                shutil.copy2(video_file, temp_video)
-                
-                # 创建ZIP文件（LIVP实际上是ZIP格式）
-                with zipfile.ZipFile(output_livp, 'w') as zipf:
-                    zipf.write(metadata_path, "metadata.json")
-                    zipf.write(temp_image, image_filename)
-                    zipf.write(temp_video, video_filename)
-                
-                self.log(f"已创建LIVP文件: {os.path.basename(output_livp)}")
-                return True
-                
-            finally:
-                # 清理临时目录
-                shutil.rmtree(temp_dir, ignore_errors=True)
-        
-        except Exception as e:
-            self.log(f"创建LIVP文件时出错: {str(e)}")
-            return False
+    def show_progress(self, done, total):
+        """更新进度条和进度标签"""
+        self.progress["maximum"] = max(total, 1)
+        self.progress["value"] = done
+        if total:
+            progress_percent = (done / total) * 100
+            self.progress_label.config(text=f"处理中... {done}/{total} ({progress_percent:.1f}%)")
     
-    def process_livp_file(self, livp_path, target_dir):
-        """处理.livp文件，提取并处理其内容"""
+    def processing_thread(self, engine, input_dir, output_dir, scan_index):
+        """在单独的线程中执行处理，界面更新都交给UI线程"""
         try:
-            # 创建临时目录
-            temp_dir = tempfile.mkdtemp(prefix="livp_")
-            
-            try:
-                # 尝试以ZIP格式打开.livp文件
-                with zipfile.ZipFile(livp_path, 'r') as zip_ref:
-                    # 列出.livp内的所有文件
-                    files = zip_ref.namelist()
-                    
-                    # 查找关键文件
-                    image_file = None
-                    video_file = None
-                    metadata_file = None
-                    
-                    for file in files:
-                        lower_file = file.lower()
-                        if lower_file.endswith(('.jpg', '.jpeg', '.heic', '.png')):
-                            image_file = file
-                        elif lower_file.endswith('.mov'):
-                            video_file = file
-                        elif lower_file == 'metadata.json' or lower_file.endswith('.json'):
-                            metadata_file = file
-                    
-                    # 提取找到的文件
-                    if image_file:
-                        image_path = os.path.join(temp_dir, os.path.basename(image_file))
-                        with zip_ref.open(image_file) as source, open(image_path, 'wb') as target:
-                            shutil.copyfileobj(source, target)
-                    
-                    if video_file:
-                        video_path = os.path.join(temp_dir, os.path.basename(video_file))
-                        with zip_ref.open(video_file) as source, open(video_path, 'wb') as target:
-                            shutil.copyfileobj(source, target)
-                    
-                    # 如果找到了图片和视频，则按照Live Photo处理
-                    if image_file and video_file:
-                        name_no_ext = os.path.splitext(os.path.basename(livp_path))[0]
-                        output_format = self.output_format.get()
-                        
-                        if output_format == "original":
-                            # 复制原始.livp文件
-                            target_file = os.path.join(target_dir, os.path.basename(livp_path))
-                            shutil.copy2(livp_path, target_file)
-                            
-                        else:
-                            # 按照指定格式处理
-                            self.process_live_photo(image_path, video_path, target_dir)
-                        
-                        return True
-                    else:
-                        # 如果只找到了图片
-                        if image_file:
-                            target_file = os.path.join(target_dir, os.path.basename(image_file))
-                            shutil.copy2(image_path, target_file)
-                            return True
-                        else:
-                            # 无法提取内容，只复制原始文件
-                            target_file = os.path.join(target_dir, os.path.basename(livp_path))
-                            shutil.copy2(livp_path, target_file)
-                            return True
-            
-            except zipfile.BadZipFile:
-                # 如果不是ZIP格式，复制原始文件
-                target_file = os.path.join(target_dir, os.path.basename(livp_path))
-                shutil.copy2(livp_path, target_file)
-                return True
-                
+            summary = engine.run(input_dir, output_dir, scan_index=scan_index)
+            self.post_to_ui(lambda: self.show_summary(summary))
+        
         except Exception as e:
-            return False
+            message = f"处理过程中出错: {str(e)}"
+            self.log(message)
+            self.post_to_ui(lambda: messagebox.showerror("错误", message))
         
         finally:
-            # 清理临时文件
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
+            self.post_to_ui(self.finish_processing)
     
-    def convert_to_mp4(self, video_path, output_file):
-        """将视频文件转换为MP4格式"""
-        try:
-            # 构建基本命令
-            cmd = [
-                self.ffmpeg_path, "-i", video_path,
-                "-c:v", "libx264", "-crf", "23", 
-                "-preset", "medium", "-c:a", "aac", 
-                "-movflags", "+faststart"
-            ]
-            
-            # 如果启用GPU加速，添加相应参数
-            if self.use_gpu.get():
-                # 尝试使用NVIDIA GPU加速
-                cmd = [
-                    self.ffmpeg_path, "-i", video_path,
-                    "-c:v", "h264_nvenc", "-preset", "medium", 
-                    "-c:a", "aac", "-movflags", "+faststart"
-                ]
-            
-            # 添加输出文件
-            cmd.extend(["-y", output_file])
-            
-            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                 text=True,
-                                 creationflags=subprocess.CREATE_NO_WINDOW if hasattr(subprocess, 'CREATE_NO_WINDOW') else 0)
-            
-            if result.returncode != 0:
-                # 如果GPU加速失败，尝试回退到CPU
-                if self.use_gpu.get():
-                    cmd = [
-                        self.ffmpeg_path, "-i", video_path,
-                        "-c:v", "libx264", "-crf", "23", 
-                        "-preset", "medium", "-c:a", "aac", 
-                        "-movflags", "+faststart", 
-                        "-y", output_file
-                    ]
-                    
-                    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                         text=True,
-                                         creationflags=subprocess.CREATE_NO_WINDOW if hasattr(subprocess, 'CREATE_NO_WINDOW') else 0)
-                    
-                    if result.returncode != 0:
-                        return False
-                else:
-                    return False
-            
-            return True
-        
-        except Exception as e:
-            return False
-    
-    def convert_to_gif(self, video_path, output_file):
-        """将视频文件转换为GIF格式"""
-        try:
-            # 使用较高质量设置创建GIF
-            cmd = [
-                self.ffmpeg_path, "-i", video_path,
-                "-vf", "fps=10,scale=480:-1:flags=lanczos,split[s0][s1];[s0]palettegen[p];[s1][p]paletteuse", 
-                "-y", output_file
-            ]
-            
-            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                 text=True,
-                                 creationflags=subprocess.CREATE_NO_WINDOW if hasattr(subprocess, 'CREATE_NO_WINDOW') else 0)
-            
-            if result.returncode != 0:
-                return False
-            
-            return True
-        
-        except Exception as e:
-            return False
+    def show_summary(self, summary):
+        """显示处理结果"""
+        if summary['cancelled']:
+            # 在取消时保持当前进度，但更新文本
+            self.progress_label.config(text=f"已取消 - 处理了 {summary['processed']}/{summary['total']} 个文件")
+        else:
+            # 正常完成时设置进度条达到100%
+            self.progress["value"] = self.progress["maximum"]
+            self.progress_label.config(text=f"处理完成 {summary['total']}/{summary['total']} (100%)")
+            self.root.update_idletasks()
+            messagebox.showinfo("完成", f"已处理 {summary['processed']} 个文件，跳过 {summary['skipped']} 个未变化的文件，"
+                                      f"{summary['errors']} 个错误。\n"
+                                      f"用时 {summary['timing']['wall_seconds']:.1f} 秒，各阶段耗时见日志和输出目录中的耗时报告。")
     
-    def convert_heic_to_jpg(self, heic_path, jpg_path):
-        """将HEIC文件转换为JPG格式"""
-        try:
-            # 尝试使用PIL/Pillow转换
-            img = Image.open(heic_path)
-            img.save(jpg_path, "JPEG", quality=95)
-            return True
-        
-        except Exception as e:
-            try:
-                # 如果PIL失败，尝试使用ffmpeg
-                cmd = [
-                    self.ffmpeg_path, "-i", heic_path,
-                    "-q:v", "2", 
-                    "-y", jpg_path
-                ]
-                
-                result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                     text=True,
-                                     creationflags=subprocess.CREATE_NO_WINDOW if hasattr(subprocess, 'CREATE_NO_WINDOW') else 0)
-                
-                if result.returncode != 0:
-                    # 如果ffmpeg也失败，记录错误但不抛出异常
-                    return False
-                
-                return True
-            
-            except Exception as e2:
-                # 如果所有方法都失败，记录错误
-                return False
-                
-    def load_preview_heic(self, file_path):
-        """专门处理HEIC文件的预览"""
-        try:
-            # 创建临时JPG文件
-            with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_file:
-                temp_jpg_path = temp_file.name
-            
-            # 尝试使用PIL转换HEIC到JPG
-            try:
-                img = Image.open(file_path)
-                img.thumbnail(self.thumbnail_size)
-                img.save(temp_jpg_path, "JPEG", quality=90)
-                
-                # 加载JPG预览
-                preview_img = Image.open(temp_jpg_path)
-                photo = ImageTk.PhotoImage(preview_img)
-                
-                # 清理临时文件
-                try:
-                    os.unlink(temp_jpg_path)
-                except:
-                    pass
-                
-                return photo
-                
-            except Exception as e:
-                # PIL失败，尝试ffmpeg
-                cmd = [
-                    self.ffmpeg_path, "-i", file_path,
-                    "-vf", f"scale={self.thumbnail_size[0]}:{self.thumbnail_size[1]}:force_original_aspect_ratio=decrease",
-                    "-y", temp_jpg_path
-                ]
-                
-                result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                                     text=True,
-                                     creationflags=subprocess.CREATE_NO_WINDOW if hasattr(subprocess, 'CREATE_NO_WINDOW') else 0)
-                
-                if result.returncode == 0 and os.path.exists(temp_jpg_path):
-                    # 加载JPG预览
-                    preview_img = Image.open(temp_jpg_path)
-                    photo = ImageTk.PhotoImage(preview_img)
-                    
-                    # 清理临时文件
-                    try:
-                        os.unlink(temp_jpg_path)
-                    except:
-                        pass
-                    
-                    return photo
-                else:
-                    # 清理临时文件
-                    try:
-                        os.unlink(temp_jpg_path)
-                    except:
-                        pass
-                    
-                    return None
-                    
-        except Exception as e:
-            return None
+    def finish_processing(self):
+        """处理结束后恢复界面状态"""
+        self.is_processing = False
+        self.progress_label.config(text="就绪")
+        self.update_button_states()
     
     def show_help(self):
         """显示使用说明"""
@@ -1659,12 +1145,20 @@ class LivePhotoBackupTool:
    - original: 保持原始格式
    - mp4: 将动态部分转为MP4
    - gif: 将动态部分转为GIF
+   - webp: 将动态部分转为WebP动图（比GIF小得多）
    - jpg: 仅保留静态图片部分
+   GIF/WebP可选择动图配置: fast（最快）、balanced（默认）、small（文件最小）、quality（质量最高）
+   MP4可选择编码配置: archive（存档画质）、standard（默认）、fast/fastest（快速）、
+   hevc/av1（更小的文件，编码较慢），并可限制最大分辨率
 4. 设置处理选项和性能参数
 5. 点击"开始处理"按钮
 
 性能选项:
 - 线程数: 设置并行处理的线程数量，通常设置为CPU核心数
+- 合并转换: 每个ffmpeg进程同时转换的视频数，大于1时减少进程启动开销，每个视频的线程数不变，
+  输出与线程数相同时逐个转换的结果相同
+- 媒体后端: ffmpeg 为每个文件启动ffmpeg进程；pyav（需安装PyAV）在程序内处理视频，省去进程开销，
+  不支持的操作（如GPU编码）仍使用ffmpeg
 - GPU加速: 如果系统支持，可启用GPU加速视频转码
 
 注意:
@@ -0,0 +1,101 @@
+"""增量备份清单 - 保存在输出目录中的SQLite数据库
+
+每条记录以源文件路径为键，保存源文件指纹（路径、大小、修改时间）、转换设置和输出文件列表。
+再次运行时，指纹和设置都未变化且输出文件仍然完整的任务会被跳过。
+"""
+import os
+import json
+import time
+import sqlite3
+
+MANIFEST_NAME = ".livephoto_manifest.sqlite"
+
+# 每累计多少条记录提交一次事务
+COMMIT_INTERVAL = 500
+
+
+def file_fingerprint(paths, stat_lookup=None):
+    """计算源文件指纹：[[路径, 大小, 修改时间], ...] 的JSON字符串
+
+    stat_lookup(path) 可返回扫描时已记录的 (大小, 修改时间)，避免重复stat。
+    """
+    parts = []
+    for path in paths:
+        stat = stat_lookup(path) if stat_lookup else None
+        if stat is None:
+            st = os.stat(path)
+            stat = (st.st_size, st.st_mtime)
+        parts.append([os.path.abspath(path), stat[0], stat[1]])
+    return json.dumps(parts)
+
+
+class BackupManifest:
+    """增量备份清单"""
+
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " source TEXT PRIMARY KEY,"
+            " fingerprint TEXT NOT NULL,"
+            " settings TEXT NOT NULL,"
+            " outputs TEXT NOT NULL,"
+            " updated REAL NOT NULL)"
+        )
+        self.conn.commit()
+        self.pending = 0
+
+    def is_current(self, source, fingerprint, settings):
+        """判断源文件是否已按相同设置处理过，且输出文件仍然完整"""
+        row = self.conn.execute(
+            "SELECT fingerprint, settings, outputs FROM entries WHERE source = ?",
+            (os.path.abspath(source),)
+        ).fetchone()
+        if row is None or row[0] != fingerprint or row[1] != settings:
+            return False
+
+        # 检查记录的输出文件是否都还存在且大小一致
+        for output_path, size in json.loads(row[2]):
+            try:
+                if os.path.getsize(output_path) != size:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def record(self, source, fingerprint, settings, outputs):
+        """记录一次成功处理的结果"""
+        output_list = []
+        for output_path in outputs:
+            try:
+                output_list.append([os.path.abspath(output_path), os.path.getsize(output_path)])
+            except OSError:
+                # 输出文件缺失时不记录，下次运行会重新处理
+                self.forget(source)
+                return
+
+        self.conn.execute(
+            "INSERT OR REPLACE INTO entries (source, fingerprint, settings, outputs, updated) VALUES (?, ?, ?, ?, ?)",
+            (os.path.abspath(source), fingerprint, settings, json.dumps(output_list), time.time())
+        )
+        self.pending += 1
+        if self.pending >= COMMIT_INTERVAL:
+            self.commit()
+
+    def forget(self, source):
+        """删除源文件的记录"""
+        self.conn.execute("DELETE FROM entries WHERE source = ?", (os.path.abspath(source),))
+        self.pending += 1
+
+    def commit(self):
+        """提交未保存的记录"""
+        self.conn.commit()
+        self.pending = 0
+
+    def close(self):
+        """提交并关闭数据库"""
+        try:
+            self.commit()
+        finally:
+            self.conn.close()
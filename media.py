@@ -0,0 +1,168 @@
+"""媒体探测 - 读取MOV/MP4文件的视频、音频编码
+
+优先使用轻量的QuickTime/ISO-BMFF原子解析器（只读取原子头，不读取媒体数据），
+解析失败时回退到进程内媒体后端或ffprobe。
+"""
+import json
+import struct
+import subprocess
+
+# Windows下隐藏子进程控制台窗口
+CREATE_NO_WINDOW = subprocess.CREATE_NO_WINDOW if hasattr(subprocess, 'CREATE_NO_WINDOW') else 0
+
+# 原子解析时需要深入的容器原子
+CONTAINER_BOXES = {b'moov', b'trak', b'mdia', b'minf', b'stbl'}
+
+# 采样描述中的四字符码 -> 编码名称（与ffprobe的codec_name一致）
+FOURCC_CODECS = {
+    b'avc1': 'h264', b'avc3': 'h264',
+    b'hvc1': 'hevc', b'hev1': 'hevc',
+    b'mp4a': 'aac',
+    b'mp4v': 'mpeg4',
+    b'ac-3': 'ac3', b'ec-3': 'eac3',
+    b'alac': 'alac',
+    b'lpcm': 'pcm', b'sowt': 'pcm', b'twos': 'pcm',
+    b'jpeg': 'mjpeg',
+    b'apch': 'prores', b'apcn': 'prores', b'apcs': 'prores', b'apco': 'prores', b'ap4h': 'prores',
+}
+
+
+def run_command(cmd, text=True, input=None):
+    """运行外部命令并返回结果（text=False时输出为字节）"""
+    return subprocess.run(cmd, input=input, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          text=text, creationflags=CREATE_NO_WINDOW)
+
+
+def iter_boxes(f, start, end):
+    """遍历 [start, end) 范围内的原子，返回 (类型, 内容起始位置, 内容结束位置)"""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack(">I4s", header)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - pos
+        if size < header_size:
+            return
+        yield box_type, pos + header_size, min(pos + size, end)
+        pos += size
+
+
+def subfile_url(path, data_range):
+    """构建ffmpeg的subfile协议地址，直接读取文件中的一段字节（例如LIVP中未压缩的成员）"""
+    offset, size = data_range
+    return f"subfile,,start,{offset},end,{offset + size},,:{path}"
+
+
+def parse_tracks(path, data_range=None):
+    """解析文件中各轨道的类型和编码，返回 [(处理类型, 四字符码), ...]
+
+    data_range 为 (偏移, 长度) 时只解析文件中的这段字节。
+    """
+    tracks = []
+    with open(path, 'rb') as f:
+        if data_range:
+            start, end = data_range[0], data_range[0] + data_range[1]
+        else:
+            f.seek(0, 2)
+            start, end = 0, f.tell()
+
+        def walk(start, end, parent, track):
+            for box_type, body_start, body_end in iter_boxes(f, start, end):
+                if box_type == b'trak':
+                    track = {'handler': None, 'format': None}
+                    walk(body_start, body_end, box_type, track)
+                    tracks.append((track['handler'], track['format']))
+                elif box_type in CONTAINER_BOXES:
+                    walk(body_start, body_end, box_type, track)
+                elif box_type == b'hdlr' and parent == b'mdia' and track is not None:
+                    # 只读取mdia下的媒体处理器（QuickTime的minf下还有数据处理器）
+                    # 版本/标志(4) + 组件类型(4) + 处理类型(4)
+                    f.seek(body_start + 8)
+                    track['handler'] = f.read(4)
+                elif box_type == b'stsd' and track is not None:
+                    # 版本/标志(4) + 条目数(4) + 首个条目: 大小(4) + 格式(4)
+                    f.seek(body_start + 12)
+                    track['format'] = f.read(4)
+
+        walk(start, end, None, None)
+    return tracks
+
+
+def probe_codecs_native(path, data_range=None):
+    """使用原子解析器探测编码，返回 {'video': ..., 'audio': ...}，无法解析时返回None"""
+    try:
+        tracks = parse_tracks(path, data_range)
+    except (OSError, struct.error):
+        return None
+
+    result = {'video': None, 'audio': None}
+    for handler, fourcc in tracks:
+        if fourcc is None:
+            continue
+        codec = FOURCC_CODECS.get(fourcc, fourcc.decode('latin-1').strip())
+        if handler == b'vide' and result['video'] is None:
+            result['video'] = codec
+        elif handler == b'soun' and result['audio'] is None:
+            result['audio'] = codec
+
+    if result['video'] is None:
+        return None
+    return result
+
+
+def probe_codecs_ffprobe(path, ffprobe_path):
+    """使用ffprobe探测编码，失败时返回None"""
+    try:
+        result = run_command([
+            ffprobe_path, "-v", "error",
+            "-show_entries", "stream=codec_type,codec_name",
+            "-of", "json", path
+        ])
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+
+    try:
+        streams = json.loads(result.stdout).get('streams', [])
+    except ValueError:
+        return None
+
+    codecs = {'video': None, 'audio': None}
+    for stream in streams:
+        codec_type = stream.get('codec_type')
+        if codec_type in codecs and codecs[codec_type] is None:
+            codecs[codec_type] = stream.get('codec_name')
+
+    if codecs['video'] is None:
+        return None
+    return codecs
+
+
+def probe_codecs(path, ffprobe_path=None, data_range=None, backend=None):
+    """探测视频文件的视频和音频编码
+
+    data_range 为 (偏移, 长度) 时只探测文件中的这段字节。原子解析失败时优先使用进程内媒体后端
+    backend（backends.MediaBackend），没有后端或后端失败时使用ffprobe。
+    返回 {'video': 编码名称, 'audio': 编码名称或None}，无法识别时返回None。
+    """
+    codecs = probe_codecs_native(path, data_range)
+    if codecs is not None:
+        return codecs
+
+    input_path = subfile_url(path, data_range) if data_range else path
+    if backend is not None:
+        try:
+            return backend.probe(input_path)
+        except Exception:
+            pass
+    if ffprobe_path:
+        codecs = probe_codecs_ffprobe(input_path, ffprobe_path)
+    return codecs
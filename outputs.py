@@ -0,0 +1,113 @@
+"""输出文件 - 先写入临时文件，完成后原子重命名
+
+进程被终止或ffmpeg中途失败时，只会留下带 .partial 标记的隐藏临时文件，不会出现看似完整的半截输出。
+临时文件位于目标目录中（同一文件系统），保证重命名是原子操作；扩展名保持不变，ffmpeg可据此选择封装格式。
+临时文件名中包含进程号，之后的运行只清理已退出进程留下的临时文件，
+同时写入同一输出目录的其他运行（如图形界面和命令行）的临时文件不受影响。
+"""
+import os
+import re
+import shutil
+import threading
+
+# 临时文件名: .<目标文件名>.<进程号>-<线程号>.partial<扩展名>
+PARTIAL_NAME = re.compile(r"^\..+\.(\d+)-\d+\.partial(\.[^.]*)?$")
+
+
+def partial_path(target_file):
+    """目标文件对应的临时文件路径"""
+    directory, name = os.path.split(target_file)
+    ext = os.path.splitext(name)[1]
+    return os.path.join(directory, f".{name}.{os.getpid()}-{threading.get_ident()}.partial{ext}")
+
+
+class AtomicOutput:
+    """写入临时文件 path，调用 commit() 后重命名为目标文件；未提交的临时文件在退出时删除
+
+    用法:
+        with AtomicOutput(target_file) as output:
+            if write(output.path):
+                output.commit()
+    """
+
+    def __init__(self, target_file):
+        self.target_file = target_file
+        self.path = partial_path(target_file)
+        self.committed = False
+
+    def __enter__(self):
+        return self
+
+    def commit(self):
+        os.replace(self.path, self.target_file)
+        self.committed = True
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.committed:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+        return False
+
+
+def atomic_copy(source, target):
+    """复制文件（保留修改时间等元数据），复制完成后才出现在目标位置"""
+    with AtomicOutput(target) as output:
+        shutil.copy2(source, output.path)
+        output.commit()
+
+
+def is_process_running(pid):
+    """进程是否仍在运行（无法确定时视为仍在运行）"""
+    if pid == os.getpid():
+        return True
+
+    if os.name == 'nt':
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        # PROCESS_QUERY_LIMITED_INFORMATION
+        handle = kernel32.OpenProcess(0x1000, False, pid)
+        if not handle:
+            # 进程不存在时参数无效（ERROR_INVALID_PARAMETER），其他错误（如拒绝访问）说明进程存在
+            return kernel32.GetLastError() != 87
+        try:
+            exit_code = ctypes.c_ulong()
+            if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+                return True
+            # STILL_ACTIVE
+            return exit_code.value == 259
+        finally:
+            kernel32.CloseHandle(handle)
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # 进程存在但属于其他用户
+        return True
+    return True
+
+
+def remove_stale_partials(directory):
+    """删除目录中已退出的进程（被终止的运行）留下的临时文件，返回删除的数量
+
+    仍在运行的进程（包括当前进程）的临时文件可能正在写入，不会删除。
+    """
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return 0
+
+    removed = 0
+    for name in names:
+        match = PARTIAL_NAME.match(name)
+        if match is None or is_process_running(int(match.group(1))):
+            continue
+        try:
+            os.remove(os.path.join(directory, name))
+            removed += 1
+        except OSError:
+            pass
+    return removed
@@ -0,0 +1,89 @@
+"""Live Photo配对索引 - 扫描器与处理引擎共用
+
+以(目录, 文件名主干)为键建立视频索引，每张图片只需常数次字典查找，
+整体配对时间与文件数量成线性关系。
+"""
+import os
+
+# 可作为普通图片备份的扩展名
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.heic'}
+# 可作为Live Photo静态部分的扩展名（文件夹预览使用）
+LIVE_IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.heic'}
+VIDEO_EXTENSIONS = {'.mov', '.mp4'}
+
+# 常规配对时依次尝试的视频扩展名
+PAIR_VIDEO_EXTENSIONS = (".mov", ".MOV")
+
+
+def split_key(file_path):
+    """拆分文件路径为 ((目录, 文件名主干), 扩展名)"""
+    dir_name, file_name = os.path.split(file_path)
+    stem, ext = os.path.splitext(file_name)
+    return (dir_name, stem), ext
+
+
+class LivePhotoIndex:
+    """Live Photo配对索引"""
+
+    def __init__(self):
+        # (目录, 主干) -> {扩展名: 视频路径}
+        self.videos = {}
+
+    def add_video(self, video_path):
+        """将视频加入索引"""
+        key, ext = split_key(video_path)
+        self.videos.setdefault(key, {})[ext] = video_path
+
+    def find_video(self, image_path):
+        """查找与图片配对的视频，未找到返回None
+
+        依次尝试: 同名 .mov / .MOV，然后是 IMG_xxxx 与 IMG_Exxxx 互相对应的 .MOV。
+        """
+        (dir_name, stem), _ = split_key(image_path)
+
+        # 检查常规配对
+        candidates = self.videos.get((dir_name, stem))
+        if candidates:
+            for ext in PAIR_VIDEO_EXTENSIONS:
+                if ext in candidates:
+                    return candidates[ext]
+
+        # 检查特殊命名格式 (iPhone Live Photos)
+        if stem.startswith("IMG_E"):
+            other_stem = "IMG_" + stem[5:]
+        elif stem.startswith("IMG_"):
+            other_stem = "IMG_E" + stem[4:]
+        else:
+            return None
+
+        candidates = self.videos.get((dir_name, other_stem))
+        if candidates:
+            return candidates.get(".MOV")
+        return None
+
+
+def pair_live_photos(images, videos):
+    """配对图片和视频
+
+    返回 (live_photos, unpaired_images, unpaired_videos)，
+    live_photos 为 {'image': ..., 'video': ...} 字典列表，均保持输入顺序。
+    """
+    index = LivePhotoIndex()
+    for video_path in videos:
+        index.add_video(video_path)
+
+    live_photos = []
+    unpaired_images = []
+    matched_videos = set()
+
+    for image_path in images:
+        video_path = index.find_video(image_path)
+        if video_path:
+            live_photos.append({'image': image_path, 'video': video_path})
+            matched_videos.add(video_path)
+        else:
+            unpaired_images.append(image_path)
+
+    unpaired_videos = [v for v in videos if v not in matched_videos]
+
+    return live_photos, unpaired_images, unpaired_videos
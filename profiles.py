@@ -0,0 +1,147 @@
+"""输出配置 - 动图（GIF/WebP）和MP4的速度、质量与大小取舍
+
+每个配置给出帧率、最大宽度和缩放算法；GIF另有调色板统计方式（palettegen stats_mode）、
+颜色数和抖动方式（paletteuse dither），WebP另有质量和压缩等级
+（libwebp的压缩等级6比5慢几十倍而文件几乎不变小，因此最高只用到5）。
+balanced 沿用之前固定的设置（10帧/秒、宽度480、全局调色板），但不再放大较小的视频。
+MP4配置选择编码器和速度预设，另可限制最大分辨率；standard 与之前固定的 libx264 -crf 23 -preset medium 相同。
+"""
+
+ANIMATION_PROFILES = {
+    # 最快：低帧率、小尺寸、双线性缩放，有序抖动比误差扩散快得多
+    "fast": {
+        "fps": 8, "max_width": 320, "scaler": "bilinear",
+        "max_colors": 128, "stats_mode": "diff", "dither": "bayer", "bayer_scale": 2, "diff_mode": None,
+        "webp_quality": 70, "webp_compression": 0,
+    },
+    # 默认
+    "balanced": {
+        "fps": 10, "max_width": 480, "scaler": "lanczos",
+        "max_colors": 256, "stats_mode": "full", "dither": "sierra2_4a", "bayer_scale": None, "diff_mode": None,
+        "webp_quality": 75, "webp_compression": 3,
+    },
+    # 最小文件：更低帧率和更少颜色，调色板侧重变化区域，只重绘变化的矩形，有序抖动压缩率更高
+    "small": {
+        "fps": 6, "max_width": 320, "scaler": "lanczos",
+        "max_colors": 64, "stats_mode": "diff", "dither": "bayer", "bayer_scale": 5, "diff_mode": "rectangle",
+        "webp_quality": 60, "webp_compression": 5,
+    },
+    # 最高质量：更高帧率和分辨率，Floyd-Steinberg抖动
+    "quality": {
+        "fps": 15, "max_width": 720, "scaler": "lanczos",
+        "max_colors": 256, "stats_mode": "diff", "dither": "floyd_steinberg", "bayer_scale": None, "diff_mode": None,
+        "webp_quality": 85, "webp_compression": 4,
+    },
+}
+
+DEFAULT_ANIMATION_PROFILE = "balanced"
+
+
+# 滤镜以 (名称, 参数) 表示，命令行参数和进程内滤镜图（backends.py）使用相同的定义
+
+def filter_chain(filters):
+    """把 [(名称, 参数)] 连接为ffmpeg滤镜链字符串"""
+    return ",".join(f"{name}={args}" for name, args in filters)
+
+
+def animation_filters(profile):
+    """帧率和缩放滤镜（只缩小，不放大）"""
+    return [
+        ("fps", str(profile['fps'])),
+        ("scale", f"'min({profile['max_width']},iw)':-2:flags={profile['scaler']}"),
+    ]
+
+
+def animation_scale_filter(profile):
+    """帧率和缩放滤镜链"""
+    return filter_chain(animation_filters(profile))
+
+
+def palette_filters(profile):
+    """GIF调色板滤镜的参数：(palettegen参数, paletteuse参数)"""
+    palettegen = f"max_colors={profile['max_colors']}:stats_mode={profile['stats_mode']}"
+    paletteuse = f"dither={profile['dither']}"
+    if profile['bayer_scale'] is not None:
+        paletteuse += f":bayer_scale={profile['bayer_scale']}"
+    if profile['diff_mode']:
+        paletteuse += f":diff_mode={profile['diff_mode']}"
+    return palettegen, paletteuse
+
+
+def gif_args(profile):
+    """GIF输出参数：单次滤镜图内生成调色板并映射"""
+    palettegen, paletteuse = palette_filters(profile)
+    return [
+        "-vf",
+        f"{animation_scale_filter(profile)},split[s0][s1];"
+        f"[s0]palettegen={palettegen}[p];"
+        f"[s1][p]paletteuse={paletteuse}"
+    ]
+
+
+def webp_args(profile):
+    """WebP动图输出参数（有损编码，无限循环）"""
+    return [
+        "-vf", animation_scale_filter(profile),
+        "-c:v", "libwebp_anim", "-lossless", "0",
+        "-q:v", str(profile['webp_quality']),
+        "-compression_level", str(profile['webp_compression']),
+        "-loop", "0", "-an"
+    ]
+
+
+# MP4编码配置：encoders 按顺序选用第一个已编译的软件编码器及其参数；
+# gpu 为True时，启用GPU加速后改用可用的H.264硬件编码器（画质优先或非H.264的配置不使用）
+MP4_PROFILES = {
+    # 存档：较低的CRF和较慢的预设，画质最好
+    "archive": {
+        "encoders": [("libx264", ["-crf", "18", "-preset", "slow"])],
+        "audio": ["-c:a", "aac", "-b:a", "192k"], "gpu": False,
+    },
+    # 默认，与之前固定的参数相同
+    "standard": {
+        "encoders": [("libx264", ["-crf", "23", "-preset", "medium"])],
+        "audio": ["-c:a", "aac"], "gpu": True,
+    },
+    # 快速：适合先快速跑一遍
+    "fast": {
+        "encoders": [("libx264", ["-crf", "23", "-preset", "veryfast"])],
+        "audio": ["-c:a", "aac"], "gpu": True,
+    },
+    "fastest": {
+        "encoders": [("libx264", ["-crf", "26", "-preset", "ultrafast"])],
+        "audio": ["-c:a", "aac"], "gpu": True,
+    },
+    # HEVC/AV1：编码慢得多，文件明显更小，适合夜间压缩存档
+    "hevc": {
+        "encoders": [("libx265", ["-crf", "26", "-preset", "medium", "-tag:v", "hvc1",
+                                  "-x265-params", "log-level=error"])],
+        "audio": ["-c:a", "aac"], "gpu": False,
+    },
+    "av1": {
+        "encoders": [
+            ("libsvtav1", ["-crf", "35", "-preset", "8"]),
+            ("libaom-av1", ["-crf", "32", "-b:v", "0", "-cpu-used", "6", "-row-mt", "1"]),
+        ],
+        "audio": ["-c:a", "aac"], "gpu": False,
+    },
+}
+
+DEFAULT_MP4_PROFILE = "standard"
+
+# 可选的最大分辨率（短边像素数）
+MAX_RESOLUTIONS = [2160, 1440, 1080, 720, 480]
+
+
+def max_resolution_filters(max_resolution):
+    """把视频短边缩小到不超过 max_resolution 的滤镜（None表示保持原始分辨率，不放大）"""
+    if not max_resolution:
+        return []
+    limit = int(max_resolution)
+    return [("scale", f"'if(gte(iw,ih),-2,min({limit},iw))':'if(gte(iw,ih),min({limit},ih),-2)'")]
+
+
+def max_resolution_args(max_resolution):
+    """把视频短边缩小到不超过 max_resolution 的参数"""
+    filters = max_resolution_filters(max_resolution)
+    return ["-vf", filter_chain(filters)] if filters else []
@@ -0,0 +1,274 @@
+"""目录扫描 - 基于os.scandir的单次扫描，结果可在预览与处理之间复用
+
+扫描结果(ScanIndex)记录每个目录的文件名、文件大小/修改时间以及目录自身的修改时间。
+处理开始前只需检查各目录的修改时间即可判断索引是否仍然有效，无需再次遍历整个目录树。
+网络文件系统上每次列目录都是一次往返，遍历时可由多个线程提前列出即将访问的目录，
+返回顺序仍与单线程遍历完全相同。
+"""
+import os
+import time
+import heapq
+import threading
+
+# 目录修改时间距扫描开始不足此秒数时，无法确定扫描期间是否有变动，视为失效
+RACY_MTIME_WINDOW = 2.0
+
+# 默认同时列出的目录数
+DEFAULT_SCAN_WORKERS = 4
+# 每个线程最多提前列出的目录数（已列出但尚未返回的目录会占用内存）
+SCAN_LOOKAHEAD_PER_WORKER = 8
+
+
+class ScanIndex:
+    """一次目录树扫描的结果"""
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self.scan_started = time.time()
+        self.complete = False
+
+        # 目录路径列表，顺序与os.walk自顶向下的遍历顺序一致
+        self.folder_order = []
+        # 目录路径 -> {'mtime': 目录修改时间, 'files': {文件名: (大小, 修改时间)}}
+        self.folders = {}
+
+    def add_folder(self, dir_path, dir_mtime, files):
+        """记录一个目录的扫描结果"""
+        self.folder_order.append(dir_path)
+        self.folders[dir_path] = {'mtime': dir_mtime, 'files': files}
+
+    def iter_folders(self):
+        """按遍历顺序返回 (目录路径, 文件名列表)"""
+        for dir_path in self.folder_order:
+            yield dir_path, list(self.folders[dir_path]['files'])
+
+    def all_files(self):
+        """返回所有文件的完整路径，顺序与os.walk一致"""
+        all_files = []
+        for dir_path in self.folder_order:
+            for name in self.folders[dir_path]['files']:
+                all_files.append(os.path.join(dir_path, name))
+        return all_files
+
+    def file_count(self):
+        """返回文件总数"""
+        return sum(len(folder['files']) for folder in self.folders.values())
+
+    def get_stat(self, file_path):
+        """返回扫描时记录的 (大小, 修改时间)，未记录时返回None"""
+        dir_path, name = os.path.split(file_path)
+        folder = self.folders.get(dir_path)
+        if folder:
+            return folder['files'].get(name)
+        return None
+
+    def matches(self, root_dir):
+        """判断索引是否对应给定的根目录"""
+        return os.path.normcase(os.path.abspath(root_dir)) == os.path.normcase(os.path.abspath(self.root_dir))
+
+    def is_valid(self, root_dir=None):
+        """检查索引是否仍然有效
+
+        只对目录执行stat：新增、删除或重命名文件都会改变所在目录的修改时间。
+        """
+        if not self.complete:
+            return False
+        if root_dir is not None and not self.matches(root_dir):
+            return False
+
+        for dir_path in self.folder_order:
+            try:
+                dir_mtime = os.stat(dir_path).st_mtime
+            except OSError:
+                return False
+            if dir_mtime != self.folders[dir_path]['mtime']:
+                return False
+            # 修改时间与扫描时间过于接近，可能在扫描期间发生了变动
+            if dir_mtime >= self.scan_started - RACY_MTIME_WINDOW:
+                return False
+
+        return True
+
+
+def list_directory(dir_path):
+    """列出单个目录，返回 (目录修改时间, 文件列表, 子目录列表)
+
+    文件列表为 {文件名: (大小, 修改时间)}，保持目录列出顺序；无法访问的目录返回None。
+    子目录判定规则与os.walk相同：指向目录的符号链接计入子目录但不会被遍历。
+    """
+    try:
+        dir_mtime = os.stat(dir_path).st_mtime
+        scandir_it = os.scandir(dir_path)
+    except OSError:
+        return None
+
+    files = {}
+    subdirs = []
+    with scandir_it:
+        for entry in scandir_it:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+
+            if is_dir:
+                try:
+                    is_symlink = entry.is_symlink()
+                except OSError:
+                    is_symlink = False
+                if not is_symlink:
+                    subdirs.append(entry.path)
+                continue
+
+            # Windows下DirEntry自带stat信息，其他平台需要一次stat调用
+            try:
+                st = entry.stat()
+                files[entry.name] = (st.st_size, st.st_mtime)
+            except OSError:
+                files[entry.name] = (0, 0.0)
+
+    return dir_mtime, files, subdirs
+
+
+def iter_tree(root_dir, cancel_flag=None, workers=DEFAULT_SCAN_WORKERS):
+    """使用os.scandir逐个目录遍历目录树，返回 (目录路径, 目录修改时间, 文件列表)
+
+    顺序与os.walk自顶向下的遍历一致；调用方可边遍历边处理，无需等待整棵树扫描完成。
+    workers 大于1时由多个线程提前列出目录，返回顺序不变。
+    """
+    if not workers or workers <= 1:
+        yield from iter_tree_serial(root_dir, cancel_flag)
+        return
+
+    walker = ParallelWalker(root_dir, workers)
+    try:
+        # 使用栈实现与os.walk相同的自顶向下遍历顺序
+        stack = [root_dir]
+        while stack:
+            if cancel_flag is not None and cancel_flag.is_set():
+                return
+
+            dir_path = stack.pop()
+            listing = walker.take(dir_path)
+            if listing is None:
+                continue
+
+            dir_mtime, files, subdirs = listing
+            yield dir_path, dir_mtime, files
+
+            stack.extend(reversed(subdirs))
+    finally:
+        walker.close()
+
+
+class ParallelWalker:
+    """多线程列目录
+
+    每个目录以其在先序遍历中的位置（各级在父目录中的序号组成的元组）为优先级，
+    线程总是先列出离遍历位置最近的目录；列出一个目录后立即登记其子目录。
+    已列出但尚未取走的目录数不超过上限，但遍历正在等待的目录不受上限限制。
+    """
+
+    def __init__(self, root_dir, workers):
+        self.limit = workers * SCAN_LOOKAHEAD_PER_WORKER
+        self.cond = threading.Condition()
+        # 待列出的目录堆：(先序位置, 目录路径)
+        self.pending = [((), root_dir)]
+        # 目录路径 -> (列目录结果, 异常)
+        self.results = {}
+        self.in_progress = 0
+        self.needed = None
+        self.closed = False
+
+        for _ in range(workers):
+            threading.Thread(target=self.worker, daemon=True).start()
+
+    def can_start(self):
+        if not self.pending:
+            return False
+        if self.pending[0][1] == self.needed:
+            return True
+        return len(self.results) + self.in_progress < self.limit
+
+    def worker(self):
+        while True:
+            with self.cond:
+                while not self.closed and not self.can_start():
+                    self.cond.wait()
+                if self.closed:
+                    return
+                position, dir_path = heapq.heappop(self.pending)
+                self.in_progress += 1
+
+            try:
+                listing, error = list_directory(dir_path), None
+            except Exception as e:
+                listing, error = None, e
+
+            with self.cond:
+                self.in_progress -= 1
+                self.results[dir_path] = (listing, error)
+                if listing is not None:
+                    for i, subdir in enumerate(listing[2]):
+                        heapq.heappush(self.pending, (position + (i,), subdir))
+                self.cond.notify_all()
+
+    def take(self, dir_path):
+        """等待并取走目录的列出结果"""
+        with self.cond:
+            self.needed = dir_path
+            self.cond.notify_all()
+            while dir_path not in self.results:
+                self.cond.wait()
+            listing, error = self.results.pop(dir_path)
+            self.needed = None
+            self.cond.notify_all()
+
+        if error is not None:
+            raise error
+        return listing
+
+    def close(self):
+        """停止所有线程"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+def iter_tree_serial(root_dir, cancel_flag=None):
+    """单线程遍历目录树（本地磁盘或workers为1时）"""
+    # 使用栈实现与os.walk相同的自顶向下遍历顺序
+    stack = [root_dir]
+    while stack:
+        if cancel_flag is not None and cancel_flag.is_set():
+            return
+
+        dir_path = stack.pop()
+        listing = list_directory(dir_path)
+        if listing is None:
+            continue
+
+        dir_mtime, files, subdirs = listing
+        yield dir_path, dir_mtime, files
+
+        stack.extend(reversed(subdirs))
+
+
+def scan_tree(root_dir, cancel_flag=None, on_folder=None, workers=DEFAULT_SCAN_WORKERS):
+    """使用os.scandir扫描目录树并返回ScanIndex
+
+    on_folder(目录路径, 文件名列表) 在每个目录扫描完成后调用，可用于逐步更新界面。
+    workers 为同时列出目录的线程数。
+    被取消时返回的索引 complete 为 False，不会被复用。
+    """
+    index = ScanIndex(root_dir)
+
+    for dir_path, dir_mtime, files in iter_tree(root_dir, cancel_flag, workers):
+        index.add_folder(dir_path, dir_mtime, files)
+
+        if on_folder:
+            on_folder(dir_path, list(files))
+
+    if cancel_flag is None or not cancel_flag.is_set():
+        index.complete = True
+    return index
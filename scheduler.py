@@ -0,0 +1,52 @@
+"""CPU预算调度 - 协调线程池与ffmpeg内部线程
+
+每个工作线程启动的ffmpeg默认会按核心数创建编码线程，多个任务并行时线程总数远超核心数。
+CpuBudget 维护全局核心预算：每个ffmpeg任务固定使用 总核心数 // 处理线程数 个线程，
+没有足够的空闲核心时等待。编码器的线程数会改变输出的码流（x264把 threads= 写入视频），
+因此线程数不随运行时的负载变化，相同的输入和设置总是得到相同的输出。
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+
+class CpuBudget:
+    """全局CPU核心预算"""
+
+    def __init__(self, total_cores=None, workers=1):
+        self.total = max(1, total_cores or os.cpu_count() or 1)
+        self.available = self.total
+        # 每个任务固定使用的线程数
+        self.job_threads = max(1, self.total // max(1, workers or 1))
+        self.cond = threading.Condition()
+
+    def reserved(self, jobs):
+        """jobs 个任务占用的核心数（不超过总核心数）"""
+        return min(self.total, jobs * self.job_threads)
+
+    def acquire(self, jobs=1):
+        """申请线程预算，没有足够的空闲核心时等待；返回每个任务使用的线程数
+
+        jobs 为同一个ffmpeg进程中同时转换的任务数（合并转换），每个任务的线程数与单独转换时相同。
+        """
+        needed = self.reserved(jobs)
+        with self.cond:
+            while self.available < needed:
+                self.cond.wait()
+            self.available -= needed
+            return self.job_threads
+
+    def release(self, jobs=1):
+        """归还线程预算"""
+        with self.cond:
+            self.available += self.reserved(jobs)
+            self.cond.notify_all()
+
+    @contextmanager
+    def allocate(self, jobs=1):
+        """在上下文中持有线程预算，返回每个任务使用的线程数"""
+        threads = self.acquire(jobs)
+        try:
+            yield threads
+        finally:
+            self.release(jobs)
@@ -0,0 +1,357 @@
+"""预览缩略图 - 生成缩略图并缓存
+
+缓存分两级：内存中的LRU保存最近使用的缩略图，磁盘缓存跨会话保存已生成的缩略图。
+缓存键由文件路径、大小、修改时间和缩略图尺寸组成，文件变化后自动失效。
+两级缓存都按占用大小淘汰最久未使用的条目。
+预览由单个后台线程生成：选择变化时丢弃过期请求，空闲时预取相邻文件的缩略图。
+"""
+import io
+import os
+import sys
+import hashlib
+import zipfile
+import threading
+from collections import OrderedDict, deque
+
+from PIL import Image
+
+from media import run_command, subfile_url
+from livp import member_data_range
+
+try:
+    import pillow_heif
+except ImportError:
+    pillow_heif = None
+
+# 内存缓存上限（按解码后的像素数据计算）
+MEMORY_CACHE_BYTES = 64 * 1024 * 1024
+# 磁盘缓存上限
+DISK_CACHE_BYTES = 256 * 1024 * 1024
+DISK_CACHE_SUFFIX = ".jpg"
+
+
+def user_cache_dir(*parts):
+    """应用的用户缓存目录（缩略图、日志等）"""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "LivePhotoBackup", *parts)
+
+
+def default_cache_dir():
+    """缩略图磁盘缓存的默认目录"""
+    return user_cache_dir("thumbnails")
+
+
+def image_bytes(img):
+    """估算图像在内存中占用的字节数"""
+    return img.width * img.height * len(img.getbands())
+
+
+class ThumbnailCache:
+    """两级缩略图缓存（内存LRU + 磁盘）"""
+
+    def __init__(self, cache_dir=None, memory_bytes=MEMORY_CACHE_BYTES, disk_bytes=DISK_CACHE_BYTES):
+        self.cache_dir = cache_dir if cache_dir is not None else default_cache_dir()
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()
+        self.memory_used = 0
+        # 磁盘缓存占用，首次写入时才统计
+        self.disk_used = None
+
+    def make_key(self, path, size):
+        """由文件路径、大小、修改时间和缩略图尺寸计算缓存键，文件不存在时返回None"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        raw = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}|{size[0]}x{size[1]}"
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=20).hexdigest()
+
+    def disk_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + DISK_CACHE_SUFFIX)
+
+    def get(self, key):
+        """查找缩略图，先查内存再查磁盘；未命中返回None"""
+        with self.lock:
+            img = self.memory.get(key)
+            if img is not None:
+                self.memory.move_to_end(key)
+                return img
+
+        path = self.disk_path(key)
+        try:
+            with Image.open(path) as cached:
+                img = cached.copy()
+            # 更新修改时间，磁盘淘汰时视为最近使用
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+
+        self.remember(key, img)
+        return img
+
+    def put(self, key, img):
+        """保存缩略图到内存和磁盘"""
+        self.remember(key, img)
+        self.store(key, img)
+
+    def remember(self, key, img):
+        """放入内存LRU，超出上限时淘汰最久未使用的条目"""
+        with self.lock:
+            old = self.memory.pop(key, None)
+            if old is not None:
+                self.memory_used -= image_bytes(old)
+            self.memory[key] = img
+            self.memory_used += image_bytes(img)
+
+            while self.memory_used > self.memory_bytes and len(self.memory) > 1:
+                _, evicted = self.memory.popitem(last=False)
+                self.memory_used -= image_bytes(evicted)
+
+    def store(self, key, img):
+        """写入磁盘缓存（失败时忽略，只影响下次会话）"""
+        path = self.disk_path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            img.convert("RGB").save(temp_path, "JPEG", quality=85)
+            os.replace(temp_path, path)
+            written = os.path.getsize(path)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return
+
+        with self.lock:
+            if self.disk_used is None:
+                self.disk_used = sum(size for _, size, _ in self.iter_disk_entries())
+            else:
+                self.disk_used += written
+            over_limit = self.disk_used > self.disk_bytes
+
+        if over_limit:
+            self.evict_disk()
+
+    def iter_disk_entries(self):
+        """遍历磁盘缓存文件，返回 (路径, 大小, 修改时间)"""
+        try:
+            subdirs = list(os.scandir(self.cache_dir))
+        except OSError:
+            return
+        for subdir in subdirs:
+            if not subdir.is_dir():
+                continue
+            try:
+                entries = list(os.scandir(subdir.path))
+            except OSError:
+                continue
+            for entry in entries:
+                if not entry.name.endswith(DISK_CACHE_SUFFIX):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                yield entry.path, st.st_size, st.st_mtime
+
+    def evict_disk(self):
+        """磁盘缓存超出上限时，删除最久未使用的文件直到降到上限的90%"""
+        entries = sorted(self.iter_disk_entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.disk_bytes * 0.9
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+        with self.lock:
+            self.disk_used = total
+
+
+class PreviewScheduler:
+    """单线程预览调度器
+
+    每次选择变化只保留最新的请求，尚未开始的旧请求直接丢弃；
+    正在生成的旧请求完成后结果也会被丢弃（由请求编号判断）。
+    没有当前请求时，按顺序为相邻文件预取缩略图。
+    """
+
+    def __init__(self, cache, size, ffmpeg_path="ffmpeg", on_ready=None, media_backend=None):
+        self.cache = cache
+        self.size = size
+        self.ffmpeg_path = ffmpeg_path
+        # 进程内媒体后端（backends.MediaBackend），Pillow无法解码时优先使用，None时只用ffmpeg
+        self.media_backend = media_backend
+        # on_ready(请求编号, 文件信息, 缩略图或None, 错误或None)，在后台线程中调用
+        self.on_ready = on_ready
+        self.cond = threading.Condition()
+        self.generation = 0
+        self.current = None
+        self.prefetch = deque()
+        self.thread = None
+
+    def request(self, file_info, neighbors=()):
+        """请求预览文件，并登记需要预取的相邻文件；返回请求编号"""
+        with self.cond:
+            self.generation += 1
+            self.current = (self.generation, file_info)
+            self.prefetch = deque(neighbors)
+            self.ensure_thread()
+            self.cond.notify()
+            return self.generation
+
+    def cancel(self):
+        """丢弃所有未完成的请求和预取"""
+        with self.cond:
+            self.generation += 1
+            self.current = None
+            self.prefetch.clear()
+
+    def is_current(self, generation):
+        """判断请求是否仍是最新的"""
+        with self.cond:
+            return generation == self.generation
+
+    def ensure_thread(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.worker, daemon=True)
+            self.thread.start()
+
+    def worker(self):
+        while True:
+            with self.cond:
+                while self.current is None and not self.prefetch:
+                    self.cond.wait()
+                if self.current is not None:
+                    request, self.current = self.current, None
+                    prefetch_info = None
+                else:
+                    request = None
+                    prefetch_info = self.prefetch.popleft()
+
+            if request is not None:
+                generation, file_info = request
+                try:
+                    img, error = self.load(file_info), None
+                except Exception as e:
+                    img, error = None, e
+                if self.on_ready is not None and self.is_current(generation):
+                    self.on_ready(generation, file_info, img, error)
+            else:
+                # 预取失败不影响界面，选中该文件时会重新生成并报告错误
+                try:
+                    self.load(prefetch_info)
+                except Exception:
+                    pass
+
+    def load(self, file_info):
+        """从缓存读取缩略图，未命中时生成并写入缓存"""
+        key = self.cache.make_key(file_info['path'], self.size)
+        img = self.cache.get(key) if key else None
+        if img is None:
+            img = render_thumbnail(file_info, self.size, self.ffmpeg_path, self.media_backend)
+            if img is not None and key:
+                self.cache.put(key, img)
+        return img
+
+
+def render_thumbnail(file_info, size, ffmpeg_path="ffmpeg", media_backend=None):
+    """为文件生成缩略图（PIL图像），无法生成时返回None"""
+    file_path = file_info['path']
+    file_type = file_info['type']
+
+    if file_type in ('livephoto', 'image'):
+        if file_path.lower().endswith('.heic'):
+            try:
+                return decode_thumbnail(file_path, size)
+            except Exception:
+                return ffmpeg_thumbnail(file_path, size, ffmpeg_path, media_backend=media_backend)
+        return decode_thumbnail(file_path, size)
+
+    if file_type == 'livp':
+        return render_livp(file_path, size, ffmpeg_path, media_backend)
+
+    return None
+
+
+def decode_thumbnail(source, size):
+    """以降低的分辨率解码图片并缩放为缩略图
+
+    JPEG按DCT缩放直接解码为接近目标尺寸的图像；HEIC优先使用文件内嵌的缩略图。
+    source 可以是路径或可定位的文件对象。
+    """
+    with Image.open(source) as img:
+        if pillow_heif is not None and img.format == 'HEIF' and hasattr(pillow_heif, 'thumbnail'):
+            # 返回不小于目标尺寸的最小内嵌缩略图，没有时返回原图
+            reduced = pillow_heif.thumbnail(img, max(size))
+        else:
+            img.draft('RGB', size)
+            reduced = img
+        reduced.thumbnail(size)
+        # 缩小后的图像与源文件无关，可以在关闭文件后使用
+        return reduced if reduced is not img else img.copy()
+
+
+def ffmpeg_thumbnail(input_path, size, ffmpeg_path, input_data=None, media_backend=None):
+    """使用ffmpeg生成缩略图，缩放后的帧以PPM格式写入管道，不产生临时文件
+
+    input_data 不为None时通过标准输入传给ffmpeg（input_path 应为 "pipe:0"）。
+    media_backend 不为None时先在进程内解码，不支持或失败时再启动ffmpeg。
+    """
+    if media_backend is not None:
+        try:
+            source = io.BytesIO(input_data) if input_data is not None else input_path
+            return media_backend.extract_frame(source, size)
+        except Exception:
+            pass
+
+    result = run_command([
+        ffmpeg_path, "-v", "error", "-i", input_path,
+        "-frames:v", "1",
+        "-vf", f"scale={size[0]}:{size[1]}:force_original_aspect_ratio=decrease",
+        "-f", "image2pipe", "-c:v", "ppm", "pipe:1"
+    ], text=False, input=input_data)
+    if result.returncode != 0 or not result.stdout:
+        return None
+
+    img = Image.open(io.BytesIO(result.stdout))
+    img.load()
+    return img
+
+
+def render_livp(file_path, size, ffmpeg_path, media_backend=None):
+    """从.livp中的图片生成缩略图（直接读取ZIP成员），没有图片时返回None"""
+    with zipfile.ZipFile(file_path, 'r') as zip_ref:
+        # 查找图片文件
+        image_file = None
+        for name in zip_ref.namelist():
+            if name.lower().endswith(('.jpg', '.jpeg', '.png', '.heic')):
+                image_file = name
+                break
+        if image_file is None:
+            return None
+
+        try:
+            with zip_ref.open(image_file) as source:
+                return decode_thumbnail(source, size)
+        except Exception:
+            if not image_file.lower().endswith('.heic'):
+                raise
+
+        # Pillow无法读取HEIC时由ffmpeg读取：未压缩的成员按字节范围读取，否则通过标准输入传入
+        data_range = member_data_range(file_path, zip_ref.getinfo(image_file))
+        if data_range is not None:
+            return ffmpeg_thumbnail(subfile_url(file_path, data_range), size, ffmpeg_path,
+                                    media_backend=media_backend)
+        return ffmpeg_thumbnail("pipe:0", size, ffmpeg_path, input_data=zip_ref.read(image_file),
+                                media_backend=media_backend)
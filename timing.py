@@ -0,0 +1,247 @@
+"""处理耗时统计 - 记录每个任务各阶段的耗时并生成报告
+
+处理线程开始一个任务时在线程局部变量中登记计时器，引擎中读取ZIP、调用ffmpeg、解码HEIC、
+复制文件等步骤用 stage() 记录耗时，无需逐层传递计时器。扫描、分类等整体阶段单独累计。
+每个任务的耗时逐行写入CSV；汇总只保留各阶段的耗时数组和最慢的若干文件，内存占用与文件总数基本无关。
+运行结束后汇总为总计、百分位和最慢文件（按阶段和任务类型），保存为JSON。
+"""
+import csv
+import json
+import time
+import heapq
+import itertools
+import threading
+from array import array
+from contextlib import contextmanager
+
+# 报告文件名（保存在输出目录中，扩展名分别为.json和.csv）
+REPORT_NAME = "livephoto_timing"
+
+# 整体阶段：扫描目录、分类配对、检查清单、查找重复
+RUN_STAGES = ("scan", "classify", "manifest", "dedup")
+
+# 任务内的阶段；other 为任务总耗时中未归入其他阶段的部分
+TASK_STAGES = ("zip", "livp", "probe", "batch_wait", "cpu_wait", "ffmpeg", "heic", "copy", "link", "other")
+
+STAGE_LABELS = {
+    "scan": "扫描目录",
+    "classify": "分类配对",
+    "manifest": "检查清单",
+    "dedup": "查找重复",
+    "zip": "读取ZIP",
+    "livp": "写入LIVP",
+    "probe": "探测编码",
+    "batch_wait": "等待合批",
+    "cpu_wait": "等待CPU",
+    "ffmpeg": "ffmpeg",
+    "heic": "HEIC解码",
+    "copy": "复制文件",
+    "link": "链接重复",
+    "other": "其他",
+}
+
+PERCENTILES = (50, 90, 99)
+# 每个阶段和任务类型保留的最慢文件数
+SLOWEST_COUNT = 10
+
+_local = threading.local()
+
+
+@contextmanager
+def stage(name):
+    """记录当前线程正在处理的任务中一个阶段的耗时（没有进行中的任务时不记录）"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_stage(name, time.perf_counter() - start)
+
+
+def add_stage(name, seconds):
+    """为当前线程正在处理的任务累加阶段耗时"""
+    stages = getattr(_local, "stages", None)
+    if stages is not None:
+        stages[name] = stages.get(name, 0.0) + seconds
+
+
+def percentile(sorted_values, percent):
+    """最近秩法百分位，sorted_values 需已排序"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def describe(values, slowest):
+    """汇总一组耗时：次数、总计、平均、百分位、最大值和最慢文件"""
+    values = sorted(values)
+    total = sum(values)
+    summary = {
+        "count": len(values),
+        "total": round(total, 4),
+        "mean": round(total / len(values), 4) if values else 0.0,
+    }
+    for percent in PERCENTILES:
+        summary[f"p{percent}"] = round(percentile(values, percent), 4)
+    summary["max"] = round(values[-1], 4) if values else 0.0
+    summary["slowest"] = [
+        {"source": source, "seconds": round(seconds, 4)}
+        for seconds, _, source in sorted(slowest, reverse=True)
+    ]
+    return summary
+
+
+class TimingReport:
+    """一次处理运行的耗时统计（可在多个处理线程中同时记录）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.run_stages = dict.fromkeys(RUN_STAGES, 0.0)
+        # 阶段/任务类型 -> 每个任务的耗时
+        self.stage_times = {name: array("d") for name in TASK_STAGES}
+        self.type_times = {}
+        # 任务类型 -> {阶段: 总耗时}
+        self.type_stages = {}
+        # ("stage"|"type", 名称) -> 最慢文件的小顶堆 [(耗时, 序号, 源文件)]
+        self.slowest = {}
+        self.counter = itertools.count()
+        self.failed = 0
+        self.csv_file = None
+        self.csv_writer = None
+
+    def open_csv(self, path):
+        """开始把每个任务的耗时写入CSV文件"""
+        self.csv_file = open(path, "w", newline="", encoding="utf-8")
+        self.csv_writer = csv.writer(self.csv_file)
+        self.csv_writer.writerow(["source", "type", "success", "seconds", *TASK_STAGES])
+
+    def close(self):
+        """关闭CSV文件"""
+        with self.lock:
+            if self.csv_file is not None:
+                self.csv_file.close()
+                self.csv_file = None
+                self.csv_writer = None
+
+    @contextmanager
+    def run_stage(self, name):
+        """记录整体阶段的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.run_stages[name] += elapsed
+
+    def timed_iter(self, iterable, name):
+        """逐个返回 iterable 的元素，取下一个元素的耗时计入整体阶段 name"""
+        iterator = iter(iterable)
+        while True:
+            with self.run_stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    @contextmanager
+    def task(self, task_type, source):
+        """记录一个任务的耗时，返回的字典中 success 由调用方设置"""
+        record = {"success": False}
+        _local.stages = stages = {}
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            _local.stages = None
+            self.add_task(task_type, source, time.perf_counter() - start, stages, record["success"])
+
+    def add_task(self, task_type, source, seconds, stages, success):
+        """汇总一个已完成任务的耗时"""
+        stages = dict(stages)
+        stages["other"] = max(0.0, seconds - sum(stages.values()))
+
+        with self.lock:
+            order = next(self.counter)
+            if not success:
+                self.failed += 1
+
+            self.type_times.setdefault(task_type, array("d")).append(seconds)
+            self.remember_slowest(("type", task_type), seconds, order, source)
+            type_stages = self.type_stages.setdefault(task_type, dict.fromkeys(TASK_STAGES, 0.0))
+
+            for name, elapsed in stages.items():
+                self.stage_times[name].append(elapsed)
+                type_stages[name] += elapsed
+                if elapsed > 0:
+                    self.remember_slowest(("stage", name), elapsed, order, source)
+
+            if self.csv_writer is not None:
+                self.csv_writer.writerow([source, task_type, int(bool(success)), f"{seconds:.4f}",
+                                          *(f"{stages.get(name, 0.0):.4f}" for name in TASK_STAGES)])
+
+    def remember_slowest(self, key, seconds, order, source):
+        heap = self.slowest.setdefault(key, [])
+        if len(heap) < SLOWEST_COUNT:
+            heapq.heappush(heap, (seconds, order, source))
+        elif seconds > heap[0][0]:
+            heapq.heapreplace(heap, (seconds, order, source))
+
+    def summary(self):
+        """返回可序列化为JSON的汇总"""
+        with self.lock:
+            stages = {}
+            for name in TASK_STAGES:
+                # 只统计实际经过该阶段的任务（other 除外）
+                values = [value for value in self.stage_times[name] if value > 0 or name == "other"]
+                if values:
+                    stages[name] = describe(values, self.slowest.get(("stage", name), []))
+
+            task_types = {}
+            for task_type, values in self.type_times.items():
+                task_types[task_type] = describe(values, self.slowest.get(("type", task_type), []))
+                task_types[task_type]["stages"] = {
+                    name: round(total, 4) for name, total in self.type_stages[task_type].items() if total > 0
+                }
+
+            return {
+                "wall_seconds": round(time.perf_counter() - self.started, 4),
+                "tasks": sum(len(values) for values in self.type_times.values()),
+                "failed": self.failed,
+                "run_stages": {name: round(total, 4) for name, total in self.run_stages.items()},
+                "stages": stages,
+                "task_types": task_types,
+            }
+
+    def write_json(self, path, summary=None, extra=None):
+        """把汇总写入JSON文件，extra 中的字段一并写入"""
+        report = dict(extra or {})
+        report.update(summary if summary is not None else self.summary())
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def format_summary(summary):
+    """把汇总格式化为日志行"""
+    lines = [f"耗时统计：总计 {summary['wall_seconds']:.1f} 秒，{summary['tasks']} 个任务"]
+
+    run_stages = [f"{STAGE_LABELS[name]} {seconds:.1f} 秒"
+                  for name, seconds in summary['run_stages'].items() if seconds > 0]
+    if run_stages:
+        lines.append("  " + "，".join(run_stages))
+
+    def describe_line(label, item):
+        line = (f"  {label}: 共 {item['total']:.1f} 秒 / {item['count']} 次，"
+                f"P50 {item['p50']:.2f} 秒，P90 {item['p90']:.2f} 秒，最大 {item['max']:.2f} 秒")
+        if item['slowest']:
+            slowest = item['slowest'][0]
+            line += f"（{slowest['source']}）"
+        return line
+
+    for name, item in sorted(summary['stages'].items(), key=lambda entry: -entry[1]['total']):
+        lines.append(describe_line(STAGE_LABELS[name], item))
+    for task_type, item in sorted(summary['task_types'].items()):
+        lines.append(describe_line(f"类型 {task_type}", item))
+    return lines
@@ -0,0 +1,146 @@
+"""界面控件 - 虚拟化文件列表
+
+VirtualListbox 对外表现为一个带滚动条的列表，但内部的 tk.Listbox 只保存当前可见的几十行。
+滚动、调整大小或改变选择时才生成这些行的文本，包含数万个文件的文件夹也能立即显示。
+"""
+import tkinter as tk
+import tkinter.font as tkfont
+from tkinter import ttk
+
+# 鼠标滚轮每格滚动的行数
+WHEEL_SCROLL_ROWS = 3
+
+
+class VirtualListbox(ttk.Frame):
+    """只创建可见行的列表
+
+    items 为任意对象的列表，formatter(item) 返回显示文本。
+    on_select(index) 在用户改变选择时调用，index 为在 items 中的位置。
+    """
+
+    def __init__(self, parent, on_select=None, **listbox_options):
+        super().__init__(parent)
+        self.on_select = on_select
+        self.items = []
+        self.formatter = str
+        self.top = 0
+        self.visible_rows = 1
+        self.selected = None
+
+        listbox_options.setdefault('exportselection', False)
+        self.listbox = tk.Listbox(self, **listbox_options)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.listbox.bind('<Configure>', self.on_configure)
+        self.listbox.bind('<<ListboxSelect>>', self.on_listbox_select)
+        self.listbox.bind('<MouseWheel>', self.on_mouse_wheel)
+        self.listbox.bind('<Button-4>', lambda event: self.scroll_rows(-WHEEL_SCROLL_ROWS))
+        self.listbox.bind('<Button-5>', lambda event: self.scroll_rows(WHEEL_SCROLL_ROWS))
+        self.listbox.bind('<Up>', lambda event: self.move_selection(-1))
+        self.listbox.bind('<Down>', lambda event: self.move_selection(1))
+        self.listbox.bind('<Prior>', lambda event: self.move_selection(-self.visible_rows))
+        self.listbox.bind('<Next>', lambda event: self.move_selection(self.visible_rows))
+        self.listbox.bind('<Home>', lambda event: self.move_selection(-len(self.items)))
+        self.listbox.bind('<End>', lambda event: self.move_selection(len(self.items)))
+
+    def set_items(self, items, formatter=str):
+        """替换列表内容"""
+        self.items = items
+        self.formatter = formatter
+        self.top = 0
+        self.selected = None
+        self.refresh()
+
+    def clear(self):
+        """清空列表"""
+        self.set_items([])
+
+    def size(self):
+        return len(self.items)
+
+    def curselection(self):
+        """返回选中项在 items 中的位置，没有选中时返回None"""
+        return self.selected
+
+    def select(self, index, notify=True):
+        """选中指定项并滚动到可见位置"""
+        if not self.items:
+            return
+        index = max(0, min(index, len(self.items) - 1))
+        self.selected = index
+        if index < self.top:
+            self.top = index
+        elif index >= self.top + self.visible_rows:
+            self.top = index - self.visible_rows + 1
+        self.refresh()
+        if notify and self.on_select is not None:
+            self.on_select(index)
+
+    def refresh(self):
+        """重新生成可见行"""
+        count = len(self.items)
+        self.top = max(0, min(self.top, count - self.visible_rows))
+        end = min(count, self.top + self.visible_rows)
+
+        self.listbox.delete(0, tk.END)
+        if end > self.top:
+            self.listbox.insert(0, *(self.formatter(item) for item in self.items[self.top:end]))
+        if self.selected is not None and self.top <= self.selected < end:
+            self.listbox.selection_set(self.selected - self.top)
+            self.listbox.activate(self.selected - self.top)
+
+        if count:
+            self.scrollbar.set(self.top / count, end / count)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def row_height(self):
+        font = tkfont.Font(font=self.listbox.cget('font'))
+        return font.metrics('linespace') + 2 * int(self.listbox.cget('selectborderwidth')) + 1
+
+    def on_configure(self, event):
+        """控件大小变化时重新计算可见行数"""
+        border = 2 * (int(self.listbox.cget('borderwidth')) + int(self.listbox.cget('highlightthickness')))
+        rows = max(1, (event.height - border) // self.row_height())
+        if rows != self.visible_rows:
+            self.visible_rows = rows
+            self.refresh()
+
+    def on_listbox_select(self, event):
+        """点击选中可见行"""
+        selection = self.listbox.curselection()
+        if not selection:
+            return
+        index = self.top + selection[0]
+        if index != self.selected and index < len(self.items):
+            self.selected = index
+            if self.on_select is not None:
+                self.on_select(index)
+
+    def on_mouse_wheel(self, event):
+        # Windows下每格为120，macOS下为1
+        notches = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        return self.scroll_rows(-notches * WHEEL_SCROLL_ROWS)
+
+    def scroll_rows(self, rows):
+        self.top += rows
+        self.refresh()
+        return "break"
+
+    def move_selection(self, step):
+        """键盘移动选择"""
+        if self.items:
+            self.select(step if self.selected is None else self.selected + step)
+        return "break"
+
+    def yview(self, *args):
+        """滚动条回调（moveto 比例 / scroll 数量 units|pages）"""
+        if args[0] == 'moveto':
+            self.top = int(float(args[1]) * len(self.items))
+        elif args[0] == 'scroll':
+            amount = int(args[1])
+            self.top += amount * self.visible_rows if args[2] == 'pages' else amount
+        self.refresh()